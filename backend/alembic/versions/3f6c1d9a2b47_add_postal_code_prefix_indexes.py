@@ -0,0 +1,30 @@
+"""add_postal_code_prefix_indexes
+
+Revision ID: 3f6c1d9a2b47
+Revises: 5ec4c3702320
+Create Date: 2026-10-18 09:12:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f6c1d9a2b47'
+down_revision: Union[str, None] = '5ec4c3702320'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # varchar_pattern_ops : sert l'égalité (expansion des préfixes) ET le LIKE 'xx%'
+    op.create_index('ix_partner_quotes_origin_postal_code', 'partner_quotes', ['origin_postal_code'],
+                    unique=False, postgresql_ops={'origin_postal_code': 'varchar_pattern_ops'})
+    op.create_index('ix_partner_quotes_dest_postal_code', 'partner_quotes', ['dest_postal_code'],
+                    unique=False, postgresql_ops={'dest_postal_code': 'varchar_pattern_ops'})
+
+
+def downgrade() -> None:
+    op.drop_index('ix_partner_quotes_dest_postal_code', table_name='partner_quotes')
+    op.drop_index('ix_partner_quotes_origin_postal_code', table_name='partner_quotes')
@@ -0,0 +1,67 @@
+"""add_normalized_location_keys
+
+Revision ID: 8d2e5b7c4a19
+Revises: 3f6c1d9a2b47
+Create Date: 2026-10-18 10:05:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8d2e5b7c4a19'
+down_revision: Union[str, None] = '3f6c1d9a2b47'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+KEY_COLUMNS = {
+    'origin_postal_key': 'origin_postal_code',
+    'origin_city_key': 'origin_city',
+    'origin_country_code': 'origin_country',
+    'dest_postal_key': 'dest_postal_code',
+    'dest_city_key': 'dest_city',
+    'dest_country_code': 'dest_country',
+}
+
+
+def upgrade() -> None:
+    for key_column in KEY_COLUMNS:
+        op.add_column('partner_quotes', sa.Column(key_column, sa.String(), nullable=True))
+
+    # Backfill : même règle que DataNormalizer._location_key
+    assignments = ", ".join(
+        f"{key_column} = NULLIF(UPPER(TRIM({source})), '')" for key_column, source in KEY_COLUMNS.items()
+    )
+    op.execute(f"UPDATE partner_quotes SET {assignments}")
+
+    # Les index CP portent désormais sur les clés normalisées
+    op.drop_index('ix_partner_quotes_origin_postal_code', table_name='partner_quotes')
+    op.drop_index('ix_partner_quotes_dest_postal_code', table_name='partner_quotes')
+
+    op.create_index('ix_partner_quotes_lane', 'partner_quotes',
+                    ['origin_country_code', 'dest_country_code', 'transport_mode'], unique=False)
+    op.create_index('ix_partner_quotes_origin_postal_key', 'partner_quotes', ['origin_postal_key'],
+                    unique=False, postgresql_ops={'origin_postal_key': 'varchar_pattern_ops'})
+    op.create_index('ix_partner_quotes_dest_postal_key', 'partner_quotes', ['dest_postal_key'],
+                    unique=False, postgresql_ops={'dest_postal_key': 'varchar_pattern_ops'})
+    op.create_index('ix_partner_quotes_origin_city_key', 'partner_quotes', ['origin_city_key'], unique=False)
+    op.create_index('ix_partner_quotes_dest_city_key', 'partner_quotes', ['dest_city_key'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_partner_quotes_dest_city_key', table_name='partner_quotes')
+    op.drop_index('ix_partner_quotes_origin_city_key', table_name='partner_quotes')
+    op.drop_index('ix_partner_quotes_dest_postal_key', table_name='partner_quotes')
+    op.drop_index('ix_partner_quotes_origin_postal_key', table_name='partner_quotes')
+    op.drop_index('ix_partner_quotes_lane', table_name='partner_quotes')
+
+    op.create_index('ix_partner_quotes_origin_postal_code', 'partner_quotes', ['origin_postal_code'],
+                    unique=False, postgresql_ops={'origin_postal_code': 'varchar_pattern_ops'})
+    op.create_index('ix_partner_quotes_dest_postal_code', 'partner_quotes', ['dest_postal_code'],
+                    unique=False, postgresql_ops={'dest_postal_code': 'varchar_pattern_ops'})
+
+    for key_column in reversed(list(KEY_COLUMNS)):
+        op.drop_column('partner_quotes', key_column)
@@ -0,0 +1,36 @@
+"""add_lane_validity_index
+
+Revision ID: a7e3c95d1f02
+Revises: 8d2e5b7c4a19
+Create Date: 2026-10-18 11:20:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7e3c95d1f02'
+down_revision: Union[str, None] = '8d2e5b7c4a19'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Le matching ne retient que is_active = true : les NULL historiques valaient "actif"
+    op.execute("UPDATE partner_quotes SET is_active = TRUE WHERE is_active IS NULL")
+
+    # L'index de voie est remplacé par un index partiel voie + fenêtre de validité
+    op.drop_index('ix_partner_quotes_lane', table_name='partner_quotes')
+    op.create_index('ix_partner_quotes_lane_validity', 'partner_quotes',
+                    ['origin_country_code', 'dest_country_code', 'transport_mode', 'valid_until', 'valid_from'],
+                    unique=False, postgresql_where=sa.text('is_active'))
+
+
+def downgrade() -> None:
+    op.drop_index('ix_partner_quotes_lane_validity', table_name='partner_quotes',
+                  postgresql_where=sa.text('is_active'))
+    op.create_index('ix_partner_quotes_lane', 'partner_quotes',
+                    ['origin_country_code', 'dest_country_code', 'transport_mode'], unique=False)
@@ -0,0 +1,83 @@
+"""add_lane_best_prices
+
+Revision ID: b5d92e4f7a13
+Revises: e8c3a5f19b70
+Create Date: 2026-10-18 15:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b5d92e4f7a13'
+down_revision: Union[str, None] = 'e8c3a5f19b70'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Mêmes clés que app.services.best_price_service (CANDIDATE_KEY, VALIDITY_KEY, OFFER_COLUMNS)
+CANDIDATE_KEY = (
+    'transport_mode',
+    'origin_country_code', 'origin_postal_key', 'origin_city_key',
+    'dest_country_code', 'dest_postal_key', 'dest_city_key',
+    'weight_min', 'weight_max', 'volume_min', 'volume_max',
+    'pricing_type',
+)
+OFFER_COLUMNS = CANDIDATE_KEY + ('partner_id', 'cost', 'delivery_time', 'valid_from', 'valid_until')
+# Validité comparée à la date près
+PARTITION = ", ".join(CANDIDATE_KEY + ('date(valid_from)', 'date(valid_until)'))
+
+
+def upgrade() -> None:
+    op.create_table('lane_best_prices',
+    sa.Column('quote_id', sa.String(), nullable=False),
+    sa.Column('partner_id', sa.String(), nullable=False),
+    sa.Column('transport_mode', sa.String(), nullable=False),
+    sa.Column('origin_country_code', sa.String(), nullable=True),
+    sa.Column('origin_postal_key', sa.String(), nullable=True),
+    sa.Column('origin_city_key', sa.String(), nullable=True),
+    sa.Column('dest_country_code', sa.String(), nullable=True),
+    sa.Column('dest_postal_key', sa.String(), nullable=True),
+    sa.Column('dest_city_key', sa.String(), nullable=True),
+    sa.Column('weight_min', sa.Float(), nullable=True),
+    sa.Column('weight_max', sa.Float(), nullable=True),
+    sa.Column('volume_min', sa.Float(), nullable=True),
+    sa.Column('volume_max', sa.Float(), nullable=True),
+    sa.Column('cost', sa.Numeric(precision=10, scale=2), nullable=False),
+    sa.Column('pricing_type', sa.String(), nullable=True),
+    sa.Column('delivery_time', sa.String(), nullable=True),
+    sa.Column('valid_from', sa.DateTime(), nullable=True),
+    sa.Column('valid_until', sa.DateTime(), nullable=True),
+    sa.Column('refreshed_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['partner_id'], ['partners.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('quote_id')
+    )
+    op.create_index('ix_lane_best_prices_lane', 'lane_best_prices',
+                    ['origin_country_code', 'dest_country_code', 'transport_mode', 'weight_min', 'weight_max'],
+                    unique=False)
+    op.create_index('ix_lane_best_prices_partner', 'lane_best_prices', ['partner_id'], unique=False)
+
+    # Remplissage initial, tous partenaires (cf. BestPriceService._candidates_select)
+    columns = ", ".join(OFFER_COLUMNS)
+    op.execute(f"""
+        INSERT INTO lane_best_prices (quote_id, {columns}, refreshed_at)
+        SELECT id, {columns}, now() AT TIME ZONE 'utc'
+        FROM (
+            SELECT id, transport_mode::text AS transport_mode,
+                   {", ".join(OFFER_COLUMNS[1:])},
+                   row_number() OVER (PARTITION BY {PARTITION} ORDER BY cost, id) AS rank
+            FROM partner_quotes
+            WHERE is_active
+              AND weight_min IS NOT NULL AND weight_max IS NOT NULL
+              AND (valid_until IS NULL OR date(valid_until) >= current_date)
+        ) ranked
+        WHERE rank = 1
+    """)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_lane_best_prices_partner', table_name='lane_best_prices')
+    op.drop_index('ix_lane_best_prices_lane', table_name='lane_best_prices')
+    op.drop_table('lane_best_prices')
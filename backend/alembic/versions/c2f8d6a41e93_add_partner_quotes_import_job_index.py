@@ -0,0 +1,26 @@
+"""add_partner_quotes_import_job_index
+
+Revision ID: c2f8d6a41e93
+Revises: b5d92e4f7a13
+Create Date: 2026-10-18 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c2f8d6a41e93'
+down_revision: Union[str, None] = 'b5d92e4f7a13'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Bascule d'import : activation des tarifs préparés d'un import (cf. QuoteService.activate_import)
+    op.create_index('ix_partner_quotes_import_job', 'partner_quotes', ['import_job_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_partner_quotes_import_job', table_name='partner_quotes')
@@ -0,0 +1,56 @@
+"""normalize_city_keys
+
+Revision ID: d41b7e9c2a58
+Revises: a7e3c95d1f02
+Create Date: 2026-10-18 12:10:00.000000
+
+"""
+import re
+import unicodedata
+from typing import Optional, Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd41b7e9c2a58'
+down_revision: Union[str, None] = 'a7e3c95d1f02'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+CITY_COLUMNS = {
+    'origin_city_key': 'origin_city',
+    'dest_city_key': 'dest_city',
+}
+CITY_ABBREVIATIONS = {"ST": "SAINT", "STE": "SAINTE"}
+
+
+def _city_key(value: Optional[str]) -> Optional[str]:
+    # Copie figée de DataNormalizer.city_key (accents, ponctuation, abréviations)
+    if value is None:
+        return None
+    decomposed = unicodedata.normalize("NFKD", str(value).strip().upper())
+    ascii_key = "".join(c for c in decomposed if not unicodedata.combining(c))
+    words = re.sub(r"[^0-9A-Z]+", " ", ascii_key.upper()).split()
+    return " ".join(CITY_ABBREVIATIONS.get(word, word) for word in words) or None
+
+
+def upgrade() -> None:
+    # La normalisation n'est pas exprimable en SQL standard (sans extension unaccent) :
+    # une mise à jour par libellé distinct, calculée en Python
+    connection = op.get_bind()
+    for key_column, source in CITY_COLUMNS.items():
+        cities = connection.execute(sa.text(f"SELECT DISTINCT {source} FROM partner_quotes")).scalars().all()
+        for city in cities:
+            connection.execute(
+                sa.text(f"UPDATE partner_quotes SET {key_column} = :key WHERE {source} = :city"),
+                {"key": _city_key(city), "city": city},
+            )
+
+
+def downgrade() -> None:
+    assignments = ", ".join(
+        f"{key_column} = NULLIF(UPPER(TRIM({source})), '')" for key_column, source in CITY_COLUMNS.items()
+    )
+    op.execute(f"UPDATE partner_quotes SET {assignments}")
@@ -0,0 +1,30 @@
+"""add_volume_range_index
+
+Revision ID: e8c3a5f19b70
+Revises: d41b7e9c2a58
+Create Date: 2026-10-18 13:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e8c3a5f19b70'
+down_revision: Union[str, None] = 'd41b7e9c2a58'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Même expression que app.models.partner_quote.volume_range (bornes NULL ouvertes)
+    op.create_index('ix_partner_quotes_volume_range', 'partner_quotes',
+                    [sa.text("numrange(CAST(volume_min AS NUMERIC), CAST(volume_max AS NUMERIC), '[]')")],
+                    unique=False, postgresql_using='gist', postgresql_where=sa.text('is_active'))
+
+
+def downgrade() -> None:
+    op.drop_index('ix_partner_quotes_volume_range', table_name='partner_quotes',
+                  postgresql_using='gist', postgresql_where=sa.text('is_active'))
@@ -0,0 +1,27 @@
+"""add_import_job_warnings
+
+Revision ID: f3a9d2c7b164
+Revises: c2f8d6a41e93
+Create Date: 2026-10-18 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3a9d2c7b164'
+down_revision: Union[str, None] = 'c2f8d6a41e93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Avertissements d'import (tranches de poids), séparés des erreurs de ligne
+    op.add_column('import_jobs', sa.Column('warnings', sa.JSON(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column('import_jobs', 'warnings')
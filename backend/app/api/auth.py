@@ -8,7 +8,8 @@ from sqlalchemy.orm import Session
 from app.core import security
 from app.core.config import get_settings
 from app.core.database import get_db
-from app.core.deps import get_current_user, get_redis, oauth2_scheme
+from app.core.deps import get_current_user, oauth2_scheme
+from app.core.redis import get_redis
 from app.schemas.auth import LoginRequest, Token, UserResponse, UserCreate, RefreshRequest
 from app.services.auth_service import AuthService
 from app.models.user import User
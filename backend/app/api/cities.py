@@ -29,6 +29,20 @@ def suggest_cities(
     return CityService.suggest_cities(db, q, limit)
 
 
+@router.get("/closest", response_model=Optional[CitySuggestion])
+def closest_city(
+    country: str = Query(..., description="Pays de la ville"),
+    city: str = Query(..., min_length=2, description="Ville saisie"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Ville connue la plus proche d'une ville inconnue du pays ("Vouliez-vous dire ?").
+    Retourne null si la ville est connue ou si aucune ville n'est assez proche.
+    """
+    return CityService.closest_city(db, country, city)
+
+
 @router.get("/countries")
 def get_countries(
     db: Session = Depends(get_db),
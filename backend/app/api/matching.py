@@ -1,21 +1,120 @@
-from typing import List
-from fastapi import APIRouter, Depends, status
+from typing import List, Optional
+from fastapi import APIRouter, Depends, Query, Request, Response, status
+from pydantic import TypeAdapter
 from sqlalchemy.orm import Session
+from app.core.config import get_settings
 from app.core.database import get_db
+from app.core.metrics import StageTimer
+from app.core.streaming import ndjson_response, wants_ndjson
 from app.core.deps import get_current_user
+from app.models.partner_quote import TransportMode
 from app.models.user import User
-from app.schemas.matching import QuoteSearchRequest, QuoteMatchResult
+from app.schemas.matching import (
+    QuoteSearchRequest, QuoteBatchSearchRequest, QuoteMatchResult, RateCurveRequest, RateCurveResponse,
+    LaneCoverageResponse, BestPriceOffer,
+)
 from app.services.matching_service import MatchingService
+from app.services.match_cache import MatchCache
+from app.services.lane_coverage import lane_coverage
+from app.services.best_price_service import BestPriceService
 
+settings = get_settings()
 router = APIRouter()
 
+match_results_adapter = TypeAdapter(List[QuoteMatchResult])
+
 @router.post("/", response_model=List[QuoteMatchResult])
 def match_quotes(
     criteria: QuoteSearchRequest,
+    request: Request,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """
     Recherche des tarifs correspondants aux critères.
+    Avec MATCH_TIMING_ENABLED, la durée de chaque étape est renvoyée dans l'en-tête Server-Timing.
+    Avec `Accept: application/x-ndjson`, les résultats sont envoyés en flux au fil de la tarification
+    (sans passer par le cache).
+    Route synchrone : le matching (requêtes et calcul) s'exécute dans le pool de threads, hors de la boucle d'événements.
+    """
+    if wants_ndjson(request):
+        return ndjson_response(lambda stream_db: MatchingService.iter_quotes(stream_db, criteria))
+
+    timer = StageTimer(enabled=settings.match_timing_enabled)
+
+    with timer.stage("cache"):
+        cache_key = MatchCache.key_for(criteria)
+        results = MatchCache.get(cache_key)
+
+    if results is None:
+        results = MatchingService.search_quotes(db, criteria, timer)
+        with timer.stage("cache"):
+            MatchCache.set(cache_key, results)
+
+    if not timer.enabled:
+        return results
+
+    # Sérialisation explicite pour la chronométrer
+    with timer.stage("serialize"):
+        body = match_results_adapter.dump_json(results)
+    timer.record()
+    return Response(content=body, media_type="application/json", headers={"Server-Timing": timer.server_timing()})
+
+
+@router.post("/batch", response_model=List[List[QuoteMatchResult]])
+def match_quotes_batch(
+    batch: QuoteBatchSearchRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Recherche groupée (import tableur) : une liste de tarifs par envoi, dans l'ordre des envois.
+    """
+    return MatchingService.search_quotes_batch(db, batch.searches)
+
+
+@router.post("/rate-curve", response_model=RateCurveResponse)
+def rate_curve(
+    request: RateCurveRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Grille de prix d'une voie : prix de chaque partenaire pour une liste de poids
+    (ou pour chaque tranche de la voie si aucun poids n'est fourni).
+    """
+    return MatchingService.rate_curve(db, request)
+
+
+@router.post("/best", response_model=List[BestPriceOffer])
+def best_offers(
+    criteria: QuoteSearchRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Meilleures offres pour une voie et un poids, de la moins chère à la plus chère (une par partenaire).
+    Lit la table des meilleures offres (quelques candidats par voie et tranche, départagés au poids
+    et à la date demandés) au lieu de tarifer tous les tarifs de la voie ; `limit=1` renvoie
+    uniquement l'offre la moins chère.
+    """
+    return BestPriceService.best_offers(db, criteria)
+
+
+@router.get("/coverage", response_model=LaneCoverageResponse)
+def lane_destinations(
+    origin_country: str = Query(..., description="Code pays d'origine"),
+    origin_postal_code: Optional[str] = None,
+    transport_mode: Optional[TransportMode] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Destinations desservies depuis une origine (carte de couverture des voies, sans requête SQL
+    une fois construite) : le formulaire de recherche grise les destinations impossibles.
     """
-    return MatchingService.search_quotes(db, criteria)
+    lane_coverage.ensure_fresh(db)
+    return LaneCoverageResponse(
+        origin_country=origin_country.upper(),
+        destinations=lane_coverage.destinations(origin_country, origin_postal_code, transport_mode),
+    )
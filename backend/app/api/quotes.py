@@ -1,8 +1,9 @@
 from typing import List, Optional
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, Request, status, Query
 from sqlalchemy.orm import Session
 from app.core.database import get_db
 from app.core.deps import require_role
+from app.core.streaming import ndjson_response, wants_ndjson
 from app.models.user import User
 from app.models.partner_quote import TransportMode
 from app.schemas.partner_quote import PartnerQuoteCreate, PartnerQuoteResponse
@@ -17,10 +18,14 @@ def create_quote(
     current_user: User = Depends(require_role("ADMIN", "OPERATOR"))
 ):
     """Créer un nouveau tarif (ADMIN, OPERATOR)."""
-    return QuoteService.create_quote(db, quote_in)
+    quote = QuoteService.create_quote(db, quote_in)
+    # Pas dans QuoteService.create_quote : l'import propage ses changements une fois, en fin de job
+    QuoteService.publish_partner_changes(db, quote.partner_id)
+    return quote
 
 @router.get("/", response_model=List[PartnerQuoteResponse])
 def list_quotes(
+    request: Request,
     skip: int = 0,
     limit: int = 100,
     partner_id: Optional[str] = Query(None, description="Filtrer par partenaire"),
@@ -28,7 +33,18 @@ def list_quotes(
     db: Session = Depends(get_db),
     current_user: User = Depends(require_role("ADMIN", "COMMERCIAL", "OPERATOR", "VIEWER"))
 ):
-    """Lister les tarifs (avec filtres optionnels) (Authentifié)."""
+    """
+    Lister les tarifs (avec filtres optionnels) (Authentifié).
+    Avec `Accept: application/x-ndjson`, les tarifs sont envoyés en flux (une ligne JSON par tarif).
+    """
+    if wants_ndjson(request):
+        return ndjson_response(lambda stream_db: (
+            PartnerQuoteResponse.model_validate(quote)
+            for quote in QuoteService.iter_quotes(
+                stream_db, skip=skip, limit=limit, partner_id=partner_id, transport_mode=transport_mode
+            )
+        ))
+
     return QuoteService.list_quotes(
         db, 
         skip=skip, 
@@ -0,0 +1,32 @@
+import argparse
+import sys
+import os
+
+# Add parent directory to path to allow imports
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.core.database import SessionLocal
+from app.models.partner import Partner
+from app.services.tariff_snapshot import TariffSnapshot
+
+def publish_snapshots(partner_code: str = None):
+    """Publie les snapshots colonnaires (ex: première activation de TARIFF_SNAPSHOT_ENABLED)."""
+    db = SessionLocal()
+    try:
+        query = db.query(Partner)
+        if partner_code:
+            query = query.filter(Partner.code == partner_code)
+        for partner in query.all():
+            count = TariffSnapshot.publish(db, partner.id)
+            print(f"Snapshot published for {partner.code}: {count} rows")
+    except Exception as e:
+        print(f"Error publishing snapshots: {e}")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Publish columnar tariff snapshots")
+    parser.add_argument("--partner", required=False, help="Partner code (all partners by default)")
+    
+    args = parser.parse_args()
+    publish_snapshots(args.partner)
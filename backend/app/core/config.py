@@ -41,10 +41,23 @@ class Settings(BaseSettings):
     # File Upload
     upload_dir: str = Field("./uploads", env="UPLOAD_DIR")
     max_upload_size: int = 50 * 1024 * 1024  # 50 MB
+    import_batch_size: int = Field(1000, env="IMPORT_BATCH_SIZE")  # Tarifs par INSERT multi-lignes
+    import_sheet_workers: int = Field(4, env="IMPORT_SHEET_WORKERS")  # Feuilles multi_sheet en parallèle ; 1 : séquentiel
 
     # Partner Configs
     partner_configs_dir: str = Field("./configs/partners", env="PARTNER_CONFIGS_DIR")
 
+    # Matching
+    tariff_index_enabled: bool = Field(False, env="TARIFF_INDEX_ENABLED")
+    tariff_index_ttl_seconds: int = Field(300, env="TARIFF_INDEX_TTL_SECONDS")  # Rafraîchissement des autres workers
+    match_cache_enabled: bool = Field(False, env="MATCH_CACHE_ENABLED")  # Invalidation globale à chaque import (cf. MatchCache)
+    match_cache_ttl_seconds: int = Field(600, env="MATCH_CACHE_TTL_SECONDS")
+    match_timing_enabled: bool = Field(False, env="MATCH_TIMING_ENABLED")  # En-tête Server-Timing + /metrics
+    tariff_snapshot_enabled: bool = Field(False, env="TARIFF_SNAPSHOT_ENABLED")  # Nécessite TARIFF_INDEX_ENABLED
+    tariff_snapshot_dir: str = Field("./snapshots", env="TARIFF_SNAPSHOT_DIR")
+    lane_coverage_enabled: bool = Field(False, env="LANE_COVERAGE_ENABLED")  # Voies non desservies : résultat vide sans SQL
+    city_match_min_similarity: float = Field(0.6, env="CITY_MATCH_MIN_SIMILARITY")  # Ville inconnue -> ville proche proposée (/cities/closest) ; > 1 désactive
+
     class Config:
         env_file = ".env"
         env_file_encoding = 'utf-8'
@@ -1,14 +1,15 @@
 from typing import Generator, Optional
 from fastapi import Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer
 import jwt
 from sqlalchemy.orm import Session
-from redis import Redis
+from redis.asyncio import Redis
 
 from app.core import security
 from app.core.config import get_settings
 from app.core.database import get_db
-from app.core.redis import get_redis
+from app.core.redis import get_async_redis
 from app.models.user import User
 from app.schemas.auth import TokenPayload
 
@@ -21,7 +22,7 @@ oauth2_scheme = OAuth2PasswordBearer(
 async def get_authenticated_user(
     token: str = Depends(oauth2_scheme),
     db: Session = Depends(get_db),
-    redis: Redis = Depends(get_redis)
+    redis: Redis = Depends(get_async_redis)
 ) -> User:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -50,14 +51,15 @@ async def get_authenticated_user(
         raise credentials_exception
 
     # Vérifier blacklist Redis
-    if redis.exists(f"blacklist:{jti}"):
+    if await redis.exists(f"blacklist:{jti}"):
          raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Token revoked",
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    user = db.query(User).filter(User.id == user_id).first()
+    # Session de la requête (get_db), partagée avec la route ; lecture hors de la boucle d'événements
+    user = await run_in_threadpool(lambda: db.query(User).filter(User.id == user_id).first())
     if user is None:
         raise credentials_exception
     
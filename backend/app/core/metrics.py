@@ -0,0 +1,112 @@
+"""
+Métriques applicatives en mémoire (format texte Prometheus, endpoint /metrics).
+
+Chaque worker expose ses propres compteurs : l'agrégation se fait côté Prometheus.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Dict, List, Sequence, Tuple
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+COUNT_BUCKETS = (0, 1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class Histogram:
+    """Histogramme cumulatif (buckets fixes) avec une étiquette optionnelle."""
+
+    def __init__(self, name: str, description: str, buckets: Sequence[float], label: str = None):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(buckets)
+        self.label = label
+        # valeur d'étiquette -> (comptes par bucket, somme, total)
+        self._series: Dict[str, Tuple[List[int], float, int]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, label_value: str = ""):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total, count = self._series.get(label_value) or ([0] * len(self.buckets), 0.0, 0)
+            if index < len(counts):
+                counts[index] += 1
+            self._series[label_value] = (counts, total + value, count + 1)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted(self._series.items())
+        for label_value, (counts, total, count) in series:
+            labels = f'{self.label}="{label_value}",' if self.label else ""
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{labels}le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{labels}le="+Inf"}} {count}')
+            suffix = f"{{{labels.rstrip(',')}}}" if labels else ""
+            lines.append(f"{self.name}_sum{suffix} {total}")
+            lines.append(f"{self.name}_count{suffix} {count}")
+        return lines
+
+
+MATCH_STAGE_SECONDS = Histogram(
+    "match_stage_seconds", "Durée des étapes du matching (secondes)", LATENCY_BUCKETS, label="stage"
+)
+MATCH_ROWS = Histogram(
+    "match_rows", "Lignes traitées par recherche (candidats, écartés, résultats)", COUNT_BUCKETS, label="kind"
+)
+
+REGISTRY = (MATCH_STAGE_SECONDS, MATCH_ROWS)
+
+
+def render_metrics() -> str:
+    lines: List[str] = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+class StageTimer:
+    """
+    Chronométrage opt-in des étapes d'une requête (MATCH_TIMING_ENABLED).
+
+    Désactivé, stage() et count() ne font rien : le coût se limite à un appel de méthode.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.durations: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+
+    def stage(self, name: str):
+        if not self.enabled:
+            return nullcontext()
+        return self._measure(name)
+
+    @contextmanager
+    def _measure(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.durations[name] = self.durations.get(name, 0.0) + time.perf_counter() - start
+
+    def count(self, name: str, value: int):
+        if self.enabled:
+            self.counts[name] = self.counts.get(name, 0) + value
+
+    def server_timing(self) -> str:
+        """Valeur de l'en-tête Server-Timing (durées en millisecondes)."""
+        parts = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in self.durations.items()]
+        parts.extend(f'{name};desc="{value}"' for name, value in self.counts.items())
+        return ", ".join(parts)
+
+    def record(self):
+        """Reporte les mesures dans les histogrammes de /metrics."""
+        if not self.enabled:
+            return
+        for name, seconds in self.durations.items():
+            MATCH_STAGE_SECONDS.observe(seconds, name)
+        for name, value in self.counts.items():
+            MATCH_ROWS.observe(value, name)
@@ -1,4 +1,5 @@
 import redis
+import redis.asyncio
 from app.core.config import get_settings
 
 settings = get_settings()
@@ -11,5 +12,16 @@ redis_client = redis.Redis(
     decode_responses=True,
 )
 
+async_redis_client = redis.asyncio.Redis(
+    host=settings.redis_host,
+    port=settings.redis_port,
+    password=settings.redis_password,
+    db=0,
+    decode_responses=True,
+)
+
 def get_redis():
     return redis_client
+
+def get_async_redis():
+    return async_redis_client
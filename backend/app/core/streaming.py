@@ -0,0 +1,33 @@
+"""
+Réponses NDJSON en flux (un objet JSON par ligne), demandées via `Accept: application/x-ndjson`.
+
+Les dépendances à yield (get_db) sont fermées avant l'envoi d'une StreamingResponse :
+le générateur ouvre donc sa propre session, fermée en fin de flux.
+"""
+from typing import Callable, Iterable, Iterator
+
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+from sqlalchemy.orm import Session
+
+from app.core.database import SessionLocal
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def wants_ndjson(request: Request) -> bool:
+    return NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+def ndjson_response(produce: Callable[[Session], Iterable[BaseModel]]) -> StreamingResponse:
+    """Diffuse les objets produits par produce(session) au fur et à mesure de leur calcul."""
+    def lines() -> Iterator[bytes]:
+        db = SessionLocal()
+        try:
+            for item in produce(db):
+                yield item.model_dump_json().encode() + b"\n"
+        finally:
+            db.close()
+
+    return StreamingResponse(lines(), media_type=NDJSON_MEDIA_TYPE)
@@ -9,7 +9,9 @@ from app.core.rate_limit import limiter
 
 from app.core.logging import setup_logging
 from fastapi import Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
+from app.core.metrics import render_metrics
+from app.services.import_service import shutdown_sheet_pool
 import logging
 
 # Setup Logging
@@ -27,6 +29,14 @@ app = FastAPI(
 )
 
 app.state.limiter = limiter
+
+
+@app.on_event("shutdown")
+def stop_sheet_pool():
+    """Arrête les process du pool d'import multi_sheet avec le worker."""
+    shutdown_sheet_pool()
+
+
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 
 @app.exception_handler(Exception)
@@ -66,3 +76,9 @@ def root():
 def health():
     """Health check endpoint."""
     return {"status": "healthy"}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Métriques Prometheus du worker (non exposé par le reverse proxy, qui ne publie que /api)."""
+    return render_metrics()
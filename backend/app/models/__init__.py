@@ -1,6 +1,7 @@
 from app.models.user import User
 from app.models.partner import Partner
 from app.models.partner_quote import PartnerQuote, TransportMode
+from app.models.lane_best_price import LaneBestPrice
 from app.models.import_job import ImportJob, ImportStatus
 from app.models.customer import Customer
 from app.models.generated_quote import GeneratedQuote, QuoteStatus
@@ -16,6 +17,7 @@ __all__ = [
     "Partner",
     "PartnerQuote",
     "TransportMode",
+    "LaneBestPrice",
     "ImportJob",
     "ImportStatus",
     "Customer",
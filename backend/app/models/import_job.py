@@ -53,6 +53,8 @@ class ImportJob(Base):
     success_count = Column(Integer, default=0)
     error_count = Column(Integer, default=0)
     errors = Column(JSON, nullable=True)
+    # Avertissements sans incidence sur error_count (tranches de poids qui se chevauchent ou laissent un trou)
+    warnings = Column(JSON, nullable=True)
 
     created_at = Column(DateTime, default=datetime.utcnow)
     completed_at = Column(DateTime, nullable=True)
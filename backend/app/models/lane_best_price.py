@@ -0,0 +1,53 @@
+"""
+Modèle LaneBestPrice - Table matérialisée des meilleures offres par voie et tranche.
+
+Pour chaque voie (mode, origine, destination) et tranche de poids et de volume, tous partenaires
+confondus : le tarif actif non expiré le moins cher de chaque type de tarification et de chaque
+période de validité (cf. BestPriceService._candidates_select). Le gagnant de la tranche est choisi
+parmi ces candidats au poids et à la date de la recherche.
+
+Rafraîchie par voie (cf. BestPriceService.refresh_partner) à la fin de chaque import.
+"""
+from datetime import datetime
+from sqlalchemy import Column, String, Float, DateTime, Numeric, ForeignKey, Index
+from app.core.database import Base
+
+
+class LaneBestPrice(Base):
+    """Offre candidate d'une voie et d'une tranche."""
+
+    __tablename__ = "lane_best_prices"
+
+    # Tarif retenu (partner_quotes.id, sans clé étrangère : la table est reconstruite par partenaire)
+    quote_id = Column(String, primary_key=True)
+    partner_id = Column(String, ForeignKey("partners.id", ondelete="CASCADE"), nullable=False)
+    # Valeur de TransportMode (texte : pas de dépendance au type enum de partner_quotes)
+    transport_mode = Column(String, nullable=False)
+
+    # Voie : clés normalisées (cf. PartnerQuote)
+    origin_country_code = Column(String, nullable=True)
+    origin_postal_key = Column(String, nullable=True)
+    origin_city_key = Column(String, nullable=True)
+    dest_country_code = Column(String, nullable=True)
+    dest_postal_key = Column(String, nullable=True)
+    dest_city_key = Column(String, nullable=True)
+
+    # Tranche
+    weight_min = Column(Float, nullable=True)
+    weight_max = Column(Float, nullable=True)
+    volume_min = Column(Float, nullable=True)
+    volume_max = Column(Float, nullable=True)
+
+    # Offre
+    cost = Column(Numeric(10, 2), nullable=False)
+    pricing_type = Column(String, nullable=True)
+    delivery_time = Column(String, nullable=True)
+    valid_from = Column(DateTime, nullable=True)
+    valid_until = Column(DateTime, nullable=True)
+    refreshed_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index("ix_lane_best_prices_lane", "origin_country_code", "dest_country_code", "transport_mode",
+              "weight_min", "weight_max"),
+        Index("ix_lane_best_prices_partner", "partner_id"),
+    )
@@ -39,12 +39,17 @@ Prisma original:
 import uuid
 from datetime import datetime
 from enum import Enum as PyEnum
-from sqlalchemy import Column, String, Float, Boolean, DateTime, Numeric, Enum, ForeignKey, Index
+from sqlalchemy import Column, String, Float, Boolean, DateTime, Numeric, Enum, ForeignKey, Index, cast, func, literal_column, text
 from sqlalchemy.dialects.postgresql import JSON
 from sqlalchemy.orm import relationship
 from app.core.database import Base
 
 
+def volume_range(volume_min, volume_max):
+    """Tranche de volume en intervalle fermé ; une borne NULL est ouverte (cf. ix_partner_quotes_volume_range)."""
+    return func.numrange(cast(volume_min, Numeric), cast(volume_max, Numeric), literal_column("'[]'"))
+
+
 class TransportMode(str, PyEnum):
     """Modes de transport disponibles."""
     ROAD = "ROAD"
@@ -73,6 +78,14 @@ class PartnerQuote(Base):
     dest_city = Column(String, nullable=False)
     dest_country = Column(String, nullable=False)
 
+    # Clés normalisées pour le matching (DataNormalizer, calculées à l'écriture)
+    origin_postal_key = Column(String, nullable=True)
+    origin_city_key = Column(String, nullable=True)
+    origin_country_code = Column(String, nullable=True)
+    dest_postal_key = Column(String, nullable=True)
+    dest_city_key = Column(String, nullable=True)
+    dest_country_code = Column(String, nullable=True)
+
     # Critères
     weight_min = Column(Float, nullable=True)
     weight_max = Column(Float, nullable=True)
@@ -104,4 +117,19 @@ class PartnerQuote(Base):
         Index("ix_partner_quotes_origin_dest", "origin_country", "dest_country"),
         Index("ix_partner_quotes_transport_mode", "transport_mode"),
         Index("ix_partner_quotes_active_valid", "is_active", "valid_until"),
+        # Index du matching : voie puis fenêtre de validité, tarifs actifs uniquement
+        Index("ix_partner_quotes_lane_validity", "origin_country_code", "dest_country_code", "transport_mode",
+              "valid_until", "valid_from", postgresql_where=text("is_active")),
+        # Prefix match CP (IN sur les préfixes + LIKE 'xx%') : varchar_pattern_ops rend le LIKE indexable
+        Index("ix_partner_quotes_origin_postal_key", "origin_postal_key",
+              postgresql_ops={"origin_postal_key": "varchar_pattern_ops"}),
+        Index("ix_partner_quotes_dest_postal_key", "dest_postal_key",
+              postgresql_ops={"dest_postal_key": "varchar_pattern_ops"}),
+        Index("ix_partner_quotes_origin_city_key", "origin_city_key"),
+        Index("ix_partner_quotes_dest_city_key", "dest_city_key"),
+        # Tranches de volume (GiST sur l'intervalle) : filtre "volume @> v" du matching
+        Index("ix_partner_quotes_volume_range", volume_range(volume_min, volume_max),
+              postgresql_using="gist", postgresql_where=text("is_active")),
+        # Tarifs préparés par un import, activés en une fois à la fin (cf. QuoteService.activate_import)
+        Index("ix_partner_quotes_import_job", "import_job_id"),
     )
@@ -18,6 +18,7 @@ class ImportJobResponse(ImportJobBase):
     success_count: int
     error_count: int
     errors: Optional[Any] = None
+    warnings: Optional[Any] = None
     created_at: datetime
     completed_at: Optional[datetime] = None
 
@@ -1,16 +1,25 @@
-from typing import Optional, List
+from typing import Dict, Literal, Optional, List
 from decimal import Decimal
 from pydantic import BaseModel, Field, model_validator, field_serializer
 from datetime import date
 from app.models.partner_quote import TransportMode
 from app.schemas.partner_quote import PartnerQuoteResponse
 
+# Poids volumétrique : kg par m³ selon le mode (cf. RG2, poids taxable = MAX(poids réel, volume × ratio))
+VOLUMETRIC_KG_PER_M3: Dict[TransportMode, float] = {
+    TransportMode.ROAD: 250.0,
+    TransportMode.RAIL: 250.0,
+    TransportMode.MULTIMODAL: 250.0,
+    TransportMode.SEA: 1000.0,   # 1 m³ = 1 t (poids/mesure)
+    TransportMode.AIR: 167.0,    # IATA 1:6000
+}
 
 class PriceBreakdown(BaseModel):
     pricing_type: str                    # "PER_100KG", "LUMPSUM", "PER_KG"
     unit_price: float                    # Prix unitaire de base (ex: 17.00 €/100kg)
     actual_weight: float                 # Poids demandé par l'utilisateur (ex: 250 kg)
     billable_weight: float               # Poids facturé après arrondi (ex: 300 kg)
+    taxable_weight: Optional[float] = None  # MAX(poids réel, poids volumétrique) si un volume est renseigné
     base_cost: float                     # unit_price × (billable_weight / 100) ou forfait
     handling_melzo: float = 0.0
     handling_local: float = 0.0
@@ -19,7 +28,8 @@ class PriceBreakdown(BaseModel):
     total: float                         # Prix final
     formula: str                         # Formule lisible : "17.00 × 3 = 51.00 €"
 
-class QuoteSearchRequest(BaseModel):
+class LaneCriteria(BaseModel):
+    """Voie recherchée : origine, destination, mode et date (sans poids)."""
     origin_country: str = Field(..., description="Code pays ou nom complet")
     origin_postal_code: Optional[str] = Field(default=None, description="Code postal (optionnel si ville renseignée)")
     origin_city: Optional[str] = None
@@ -28,14 +38,11 @@ class QuoteSearchRequest(BaseModel):
     dest_postal_code: Optional[str] = Field(default=None, description="Code postal (optionnel si ville renseignée)")
     dest_city: Optional[str] = None
     
-    weight: float = Field(..., gt=0, description="Poids taxable en kg")
-    volume: Optional[float] = Field(None, gt=0, description="Volume en m3 (optionnel)")
-    
     transport_mode: Optional[TransportMode] = None
     shipping_date: date = Field(default_factory=date.today)
 
     @model_validator(mode='after')
-    def check_location_requirements(self) -> 'QuoteSearchRequest':
+    def check_location_requirements(self) -> 'LaneCriteria':
         # Check Origin
         if not self.origin_postal_code and not self.origin_city:
             raise ValueError("L'origine nécessite au moins un Code Postal OU une Ville.")
@@ -46,6 +53,80 @@ class QuoteSearchRequest(BaseModel):
             
         return self
 
+class QuoteSearchRequest(LaneCriteria):
+    weight: float = Field(..., gt=0, description="Poids taxable en kg")
+    volume: Optional[float] = Field(None, gt=0, description="Volume en m3 (optionnel)")
+
+    # Classement / pagination (ex: "les 5 moins chers")
+    sort: Optional[Literal["price"]] = Field(None, description="Tri par prix total croissant")
+    limit: Optional[int] = Field(None, gt=0, le=500, description="Nombre maximum de tarifs (les moins chers)")
+    offset: int = Field(0, ge=0, description="Décalage pour la pagination (avec limit)")
+
+    def taxable_weight(self, transport_mode: Optional[TransportMode] = None) -> float:
+        """Poids taxable pour un mode (par défaut celui de la recherche, sinon route)."""
+        if self.volume is None:
+            return self.weight
+        mode = TransportMode(transport_mode or self.transport_mode or TransportMode.ROAD)
+        return max(self.weight, self.volume * VOLUMETRIC_KG_PER_M3[mode])
+
+    def taxable_weights(self) -> Dict[str, float]:
+        """Poids taxable de chaque mode recherché ({mode: poids})."""
+        modes = [TransportMode(self.transport_mode)] if self.transport_mode else list(TransportMode)
+        return {mode.value: self.taxable_weight(mode) for mode in modes}
+
+    @property
+    def is_ranked(self) -> bool:
+        """Les résultats sont triés par prix dès qu'un tri ou une pagination est demandé."""
+        return self.sort == "price" or self.limit is not None or self.offset > 0
+
+class QuoteBatchSearchRequest(BaseModel):
+    searches: List[QuoteSearchRequest] = Field(..., min_length=1, max_length=2000, description="Envois à tarifer (max 2000)")
+
+class RateCurveRequest(LaneCriteria):
+    weights: Optional[List[float]] = Field(
+        None, min_length=1, max_length=50,
+        description="Poids à tarifer (kg). Absent : borne haute de chaque tranche de la voie"
+    )
+
+    @model_validator(mode='after')
+    def check_weights(self) -> 'RateCurveRequest':
+        if self.weights and any(w <= 0 for w in self.weights):
+            raise ValueError("Les poids doivent être positifs.")
+        return self
+
+class PartnerRateCurve(BaseModel):
+    partner_id: str
+    partner_code: str
+    partner_name: str
+    prices: List[Optional[float]]        # Prix le moins cher du partenaire pour chaque poids (None : non couvert)
+    quote_ids: List[Optional[str]]       # Tarif retenu pour chaque poids
+
+class RateCurveResponse(BaseModel):
+    weights: List[float]                 # Colonnes de la matrice
+    partners: List[PartnerRateCurve]
+
+class BestPriceOffer(BaseModel):
+    partner_id: str
+    partner_code: str
+    partner_name: str
+    quote_id: str                        # Tarif retenu (partner_quotes.id)
+    transport_mode: TransportMode
+    pricing_type: Optional[str] = None
+    unit_price: float
+    weight_min: Optional[float] = None   # Tranche du tarif
+    weight_max: Optional[float] = None
+    delivery_time: Optional[str] = None
+    total: float                         # Prix total (suppléments compris), même calcul que le matching
+
+class LaneDestination(BaseModel):
+    country: str
+    any_postal_code: bool                # Au moins un tarif sans code postal : toute la destination est possible
+    postal_codes: List[str]              # Codes postaux (préfixes) desservis
+
+class LaneCoverageResponse(BaseModel):
+    origin_country: str
+    destinations: List[LaneDestination]  # Pays de destination desservis depuis l'origine
+
 class QuoteMatchResult(PartnerQuoteResponse):
     price_breakdown: Optional[PriceBreakdown] = None
 
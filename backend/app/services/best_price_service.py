@@ -0,0 +1,208 @@
+"""
+Meilleures offres par voie et tranche de poids (table matérialisée lane_best_prices).
+
+"Qui est le moins cher sur cette voie à ce poids ?" : la table garde, pour chaque voie (mode,
+origine, destination) et chaque tranche de poids et de volume, tous partenaires confondus, le tarif
+le moins cher de chaque type de tarification et de chaque période de validité (cf. LaneBestPrice).
+À type et période identiques, l'ordre des coûts est le même à tout poids et à toute date : le
+gagnant d'une tranche pour un poids et une date donnés figure donc toujours parmi ces candidats.
+La recherche ne tarife que les candidats des tranches qui contiennent le poids demandé, valides à
+la date d'expédition, et retient le moins cher de chaque tranche (poids taxable, suppléments).
+
+La table est rafraîchie voie par voie : à la fin de chaque import, et lorsqu'un tarif est créé
+ou supprimé manuellement, seules les voies du partenaire concerné sont recalculées.
+"""
+from datetime import date, datetime
+from typing import Dict, List, Tuple
+
+from sqlalchemy import and_, func, insert, literal, or_, select
+from sqlalchemy.orm import Session
+
+from app.models.lane_best_price import LaneBestPrice
+from app.models.partner import Partner
+from app.models.partner_quote import PartnerQuote, TransportMode
+from app.schemas.matching import BestPriceOffer, QuoteSearchRequest
+from app.services.import_logic.data_normalizer import DataNormalizer
+from app.services.matching_service import MatchingService
+
+# Partition : voie et tranche. Un gagnant par partition, tous partenaires confondus, choisi à la recherche
+PARTITION_KEY = (
+    "transport_mode",
+    "origin_country_code", "origin_postal_key", "origin_city_key",
+    "dest_country_code", "dest_postal_key", "dest_city_key",
+    "weight_min", "weight_max", "volume_min", "volume_max",
+)
+# Candidats : le moins cher par partition, type de tarification et période de validité (à la date près)
+CANDIDATE_KEY = PARTITION_KEY + ("pricing_type",)
+VALIDITY_KEY = ("valid_from", "valid_until")
+# Colonnes recopiées depuis partner_quotes (quote_id = partner_quotes.id)
+OFFER_COLUMNS = PARTITION_KEY + (
+    "partner_id", "cost", "pricing_type", "delivery_time", "valid_from", "valid_until",
+)
+
+# (mode, pays origine, pays destination) : granularité du rafraîchissement
+Lane = Tuple[str, str, str]
+
+
+class BestPriceService:
+    @staticmethod
+    def _lane_filter(model, lanes: List[Lane]):
+        """Lignes des voies données (model : PartnerQuote ou LaneBestPrice)."""
+        return or_(*[
+            and_(
+                model.transport_mode == (TransportMode(mode) if model is PartnerQuote else mode),
+                model.origin_country_code.is_not_distinct_from(origin_country),
+                model.dest_country_code.is_not_distinct_from(dest_country),
+            )
+            for mode, origin_country, dest_country in lanes
+        ])
+
+    @staticmethod
+    def _candidates_select(lanes: List[Lane], today: date):
+        """
+        Candidats des voies données : tarif le moins cher de chaque partition, type de tarification
+        et période de validité (row_number plutôt que DISTINCT ON, propre à PostgreSQL).
+        Tarifs actifs non expirés, y compris ceux qui débutent plus tard.
+        """
+        partition = [getattr(PartnerQuote, name) for name in CANDIDATE_KEY]
+        partition += [func.date(getattr(PartnerQuote, name)) for name in VALIDITY_KEY]
+        ranked = (
+            select(
+                PartnerQuote.id.label("quote_id"),
+                *[getattr(PartnerQuote, name) for name in OFFER_COLUMNS],
+                func.row_number().over(
+                    partition_by=partition,
+                    order_by=(PartnerQuote.cost, PartnerQuote.id),
+                ).label("rank"),
+            )
+            .where(
+                PartnerQuote.is_active == True,  # noqa: E712
+                PartnerQuote.weight_min.isnot(None),
+                PartnerQuote.weight_max.isnot(None),
+                or_(PartnerQuote.valid_until.is_(None), func.date(PartnerQuote.valid_until) >= today),
+                BestPriceService._lane_filter(PartnerQuote, lanes),
+            )
+            .subquery()
+        )
+        return select(
+            ranked.c.quote_id,
+            *[ranked.c[name] for name in OFFER_COLUMNS],
+            literal(datetime.utcnow()).label("refreshed_at"),
+        ).where(ranked.c.rank == 1)
+
+    @staticmethod
+    def _partner_lanes(db: Session, partner_id: str) -> List[Lane]:
+        """Voies où le partenaire a des tarifs actifs ou détient un candidat."""
+        quoted = (
+            db.query(PartnerQuote.transport_mode, PartnerQuote.origin_country_code, PartnerQuote.dest_country_code)
+            .filter(PartnerQuote.partner_id == partner_id, PartnerQuote.is_active == True)  # noqa: E712
+            .distinct()
+        )
+        winning = (
+            db.query(LaneBestPrice.transport_mode, LaneBestPrice.origin_country_code, LaneBestPrice.dest_country_code)
+            .filter(LaneBestPrice.partner_id == partner_id)
+            .distinct()
+        )
+        lanes = {(TransportMode(mode).value, origin, dest) for mode, origin, dest in quoted}
+        lanes.update((mode, origin, dest) for mode, origin, dest in winning)
+        return sorted(lanes, key=lambda lane: tuple(part or "" for part in lane))
+
+    @staticmethod
+    def refresh_partner(db: Session, partner_id: str) -> int:
+        """
+        Recalcule les candidats des voies du partenaire (les autres voies ne sont pas touchées).
+        Retourne le nombre de candidats du partenaire.
+        """
+        lanes = BestPriceService._partner_lanes(db, partner_id)
+        if lanes:
+            db.query(LaneBestPrice).filter(
+                BestPriceService._lane_filter(LaneBestPrice, lanes)
+            ).delete(synchronize_session=False)
+            db.execute(
+                insert(LaneBestPrice).from_select(
+                    ["quote_id", *OFFER_COLUMNS, "refreshed_at"],
+                    BestPriceService._candidates_select(lanes, date.today()),
+                )
+            )
+        db.commit()
+        return db.query(LaneBestPrice).filter(LaneBestPrice.partner_id == partner_id).count()
+
+    @staticmethod
+    def best_offers(db: Session, criteria: QuoteSearchRequest) -> List[BestPriceOffer]:
+        """
+        Offres gagnantes des tranches qui contiennent la recherche, de la moins chère à la plus chère,
+        une par partenaire (mêmes règles de localisation, de poids taxable, de volume et de validité
+        que le matching). Seuls les candidats sont tarifés, au poids et à la date demandés ; le moins
+        cher de chaque tranche l'emporte.
+        """
+        criteria = MatchingService._prepare_criteria(db, criteria)
+        if MatchingService._is_uncovered(db, criteria):
+            return []
+
+        query = (
+            db.query(
+                LaneBestPrice,
+                Partner.code.label("partner_code"),
+                Partner.name.label("partner_name"),
+            )
+            .join(Partner, Partner.id == LaneBestPrice.partner_id)
+            .filter(
+                LaneBestPrice.origin_country_code == DataNormalizer.country_code(criteria.origin_country),
+                LaneBestPrice.dest_country_code == DataNormalizer.country_code(criteria.dest_country),
+                MatchingService._location_filter(
+                    LaneBestPrice.origin_postal_key, LaneBestPrice.origin_city_key,
+                    criteria.origin_postal_code, criteria.origin_city
+                ),
+                MatchingService._location_filter(
+                    LaneBestPrice.dest_postal_key, LaneBestPrice.dest_city_key,
+                    criteria.dest_postal_code, criteria.dest_city
+                ),
+                MatchingService._weight_filter(criteria, LaneBestPrice),
+                MatchingService._validity_filter(criteria.shipping_date, criteria.shipping_date, LaneBestPrice),
+            )
+        )
+        if criteria.transport_mode:
+            query = query.filter(LaneBestPrice.transport_mode == criteria.transport_mode.value)
+        if criteria.volume is not None:
+            query = query.filter(
+                or_(LaneBestPrice.volume_min.is_(None), LaneBestPrice.volume_min <= criteria.volume),
+                or_(LaneBestPrice.volume_max.is_(None), LaneBestPrice.volume_max >= criteria.volume),
+            )
+        rows = query.all()
+        if not rows:
+            return []
+
+        offers = [row.LaneBestPrice for row in rows]
+        _, _, _, amounts = MatchingService._price_totals(offers, criteria)
+
+        # Gagnant de chaque tranche
+        winners: Dict[Tuple, Tuple[float, int]] = {}
+        for i, (offer, total) in enumerate(zip(offers, amounts.total.tolist())):
+            partition = tuple(getattr(offer, name) for name in PARTITION_KEY)
+            current = winners.get(partition)
+            if current is None or (total, offer.quote_id) < (current[0], offers[current[1]].quote_id):
+                winners[partition] = (total, i)
+
+        best: Dict[str, BestPriceOffer] = {}
+        for total, i in winners.values():
+            row, offer = rows[i], offers[i]
+            current = best.get(offer.partner_id)
+            if current is not None and (current.total, current.quote_id) <= (total, offer.quote_id):
+                continue
+            best[offer.partner_id] = BestPriceOffer(
+                partner_id=offer.partner_id,
+                partner_code=row.partner_code,
+                partner_name=row.partner_name,
+                quote_id=offer.quote_id,
+                transport_mode=offer.transport_mode,
+                pricing_type=offer.pricing_type,
+                unit_price=float(offer.cost),
+                weight_min=offer.weight_min,
+                weight_max=offer.weight_max,
+                delivery_time=offer.delivery_time,
+                total=total,
+            )
+
+        ranked = sorted(best.values(), key=lambda offer: (offer.total, offer.partner_code))
+        end = criteria.offset + criteria.limit if criteria.limit else None
+        return ranked[criteria.offset:end]
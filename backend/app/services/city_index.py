@@ -0,0 +1,204 @@
+"""
+Dictionnaire des villes des tarifs, indexé par trigrammes (autocomplétion et matching).
+
+Les villes sont regroupées par clé normalisée (DataNormalizer.city_key : casse, accents,
+ponctuation et abréviations) et par pays. Chaque mot d'une clé est découpé en trigrammes
+à la manière de pg_trgm ("  S", " SA", "SAI", ..., "NE ") ; un index inversé
+trigramme -> villes permet de retrouver les villes proches d'une saisie en ne parcourant
+que les villes qui partagent au moins un trigramme avec elle.
+
+Le dictionnaire est construit une fois (GROUP BY sur partner_quotes) puis rafraîchi
+après TARIFF_INDEX_TTL_SECONDS ou à la fin d'un import.
+"""
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.core.config import get_settings
+from app.models.partner_quote import PartnerQuote
+from app.services.import_logic.data_normalizer import DataNormalizer
+
+settings = get_settings()
+
+# Part minimale des trigrammes de la saisie présents dans une suggestion
+SUGGEST_MIN_SCORE = 0.5
+
+
+def trigrams(key: str, partial: bool = False) -> Set[str]:
+    """
+    Trigrammes d'une clé normalisée, mot par mot.
+    partial : saisie en cours, le dernier mot n'est pas clos (pas de trigramme final).
+    """
+    words = key.split()
+    grams: Set[str] = set()
+    for i, word in enumerate(words):
+        padded = f"  {word}" if partial and i == len(words) - 1 else f"  {word} "
+        grams.update(padded[j:j + 3] for j in range(len(padded) - 2))
+    return grams
+
+
+class CityEntry:
+    """Ville du dictionnaire : clé normalisée, pays, libellé le plus fréquent, nombre de tarifs."""
+
+    __slots__ = ("key", "country", "city", "count", "zip", "trigram_count")
+
+    def __init__(self, key: str, country: Optional[str], city: str, count: int, zip: Optional[str]):
+        self.key = key
+        self.country = country
+        self.city = city
+        self.count = count
+        self.zip = zip
+        self.trigram_count = len(trigrams(key))
+
+    def to_dict(self) -> dict:
+        return {"city": self.city, "country": self.country, "count": self.count, "zip": self.zip}
+
+
+class CityIndex:
+    """Dictionnaire des villes partagé par les requêtes d'un même worker."""
+
+    def __init__(self):
+        self._entries: List[CityEntry] = []
+        self._postings: Dict[str, List[int]] = {}
+        # (pays, clé) des villes connues
+        self._known: Set[Tuple[Optional[str], str]] = set()
+        self._built_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_stale(self) -> bool:
+        if self._built_at is None:
+            return True
+        return time.monotonic() - self._built_at > settings.tariff_index_ttl_seconds
+
+    def invalidate(self):
+        """Force une reconstruction à la prochaine utilisation."""
+        self._built_at = None
+
+    def ensure_fresh(self, db: Session):
+        """Même stratégie que TariffIndex.ensure_fresh : pas d'attente bloquante sur le verrou."""
+        if not self.is_stale:
+            return
+        if self._lock.acquire(blocking=False):
+            try:
+                if self.is_stale:
+                    self.load(self._query_rows(db))
+            finally:
+                self._lock.release()
+        elif self._built_at is None and not self._entries:
+            self.load(self._query_rows(db))
+
+    @staticmethod
+    def _query_rows(db: Session) -> List[Any]:
+        """(city_key, country, city, count, zip) par libellé, origines et destinations."""
+        rows = []
+        sides = (
+            (PartnerQuote.origin_city_key, PartnerQuote.origin_country_code,
+             PartnerQuote.origin_city, PartnerQuote.origin_postal_code),
+            (PartnerQuote.dest_city_key, PartnerQuote.dest_country_code,
+             PartnerQuote.dest_city, PartnerQuote.dest_postal_code),
+        )
+        for key_column, country_column, city_column, zip_column in sides:
+            rows.extend(
+                db.query(
+                    key_column.label("key"),
+                    country_column.label("country"),
+                    city_column.label("city"),
+                    func.count(PartnerQuote.id).label("count"),
+                    func.max(zip_column).label("zip"),
+                )
+                .filter(key_column.isnot(None), PartnerQuote.is_active == True)  # noqa: E712
+                .group_by(key_column, country_column, city_column)
+                .all()
+            )
+        return rows
+
+    def load(self, rows: Iterable[Any]):
+        """Construit le dictionnaire à partir de lignes (key, country, city, count, zip)."""
+        merged: Dict[Tuple[Optional[str], str], dict] = {}
+        for row in rows:
+            if row.key == "ALL":
+                continue
+            data = merged.setdefault((row.country, row.key), {"count": 0, "zip": None, "labels": Counter()})
+            data["count"] += row.count
+            data["labels"][row.city] += row.count
+            # On garde le zip s'il existe (priorité à celui qu'on trouve)
+            if not data["zip"] and row.zip:
+                data["zip"] = row.zip
+
+        entries = [
+            # Libellé affiché : l'orthographe la plus fréquente dans les tarifs
+            CityEntry(key, country, data["labels"].most_common(1)[0][0], data["count"], data["zip"])
+            for (country, key), data in merged.items()
+        ]
+        postings: Dict[str, List[int]] = {}
+        for pos, entry in enumerate(entries):
+            for gram in trigrams(entry.key):
+                postings.setdefault(gram, []).append(pos)
+
+        # Remplacement atomique : les requêtes en cours gardent l'ancienne version
+        self._entries, self._postings = entries, postings
+        self._known = set(merged)
+        self._built_at = time.monotonic()
+
+    def _hits(self, grams: Set[str]) -> Counter:
+        """Nombre de trigrammes partagés, par position de ville."""
+        hits: Counter = Counter()
+        for gram in grams:
+            hits.update(self._postings.get(gram, ()))
+        return hits
+
+    def suggest(self, query: str, limit: int = 10) -> List[dict]:
+        """
+        Villes proches d'une saisie partielle, par pertinence :
+        début de clé, puis sous-chaîne, puis proportion de trigrammes communs, puis nombre de tarifs.
+        """
+        key = DataNormalizer.city_key(query)
+        if not key:
+            return []
+        grams = trigrams(key, partial=True)
+        entries = self._entries
+        scored = []
+        for pos, shared in self._hits(grams).items():
+            score = shared / len(grams)
+            if score < SUGGEST_MIN_SCORE:
+                continue
+            entry = entries[pos]
+            position = 0 if entry.key.startswith(key) else 1 if key in entry.key else 2
+            scored.append(((position, -score, -entry.count, entry.city), entry))
+        scored.sort(key=lambda item: item[0])
+        return [entry.to_dict() for _, entry in scored[:limit]]
+
+    def closest(self, country: Optional[str], city: Optional[str]) -> Optional[dict]:
+        """
+        Ville connue du pays la plus proche d'une ville inconnue ("Vouliez-vous dire ?"), si sa
+        similarité de trigrammes atteint CITY_MATCH_MIN_SIMILARITY (fautes de frappe).
+        None si la ville est connue, vide ou sans ville assez proche.
+        """
+        key = DataNormalizer.city_key(city)
+        country_code = DataNormalizer.country_code(country)
+        if not key or key == "ALL" or (country_code, key) in self._known:
+            return None
+        threshold = settings.city_match_min_similarity
+        if threshold > 1:
+            return None
+
+        grams = trigrams(key)
+        best: Optional[CityEntry] = None
+        best_rank: Tuple[float, int] = (threshold, -1)
+        for pos, shared in self._hits(grams).items():
+            entry = self._entries[pos]
+            if entry.country != country_code:
+                continue
+            # Similarité de Jaccard (équivalent de similarity() de pg_trgm)
+            similarity = shared / (len(grams) + entry.trigram_count - shared)
+            if (similarity, entry.count) >= best_rank:
+                best, best_rank = entry, (similarity, entry.count)
+        return best.to_dict() if best else None
+
+
+city_index = CityIndex()
@@ -1,84 +1,31 @@
 from typing import List, Optional
 from sqlalchemy.orm import Session
-from sqlalchemy import func, desc
 from app.models.partner_quote import PartnerQuote
+from app.services.city_index import city_index
 
 class CityService:
     @staticmethod
     def suggest_cities(db: Session, query: str, limit: int = 10) -> List[dict]:
         """
         Suggérer des villes basées sur les tarifs existants.
-        Recherche insensible à la casse dans origin_city et dest_city.
-        Retourne une liste de {city: str, country: str, count: int}
+        Recherche approchée (trigrammes) insensible à la casse et aux accents dans le
+        dictionnaire des villes d'origine et de destination (cf. city_index), sans parcours de table.
+        Retourne une liste de {city: str, country: str, count: int, zip: str}
         """
         if not query or len(query) < 2:
             return []
-            
-        search = f"%{query}%"
-        
-        # Recherche dans les origines
-        origins = (
-            db.query(
-                PartnerQuote.origin_city.label("city"),
-                PartnerQuote.origin_country.label("country"),
-                func.count(PartnerQuote.id).label("count"),
-                func.max(PartnerQuote.origin_postal_code).label("zip")
-            )
-            .filter(PartnerQuote.origin_city.ilike(search))
-            .group_by(PartnerQuote.origin_city, PartnerQuote.origin_country)
-        )
-        
-        # Recherche dans les destinations
-        destinations = (
-            db.query(
-                PartnerQuote.dest_city.label("city"),
-                PartnerQuote.dest_country.label("country"),
-                func.count(PartnerQuote.id).label("count"),
-                func.max(PartnerQuote.dest_postal_code).label("zip")
-            )
-            .filter(PartnerQuote.dest_city.ilike(search))
-            .group_by(PartnerQuote.dest_city, PartnerQuote.dest_country)
-        )
-        
-        # Union et tri
-        # Note: SQLAlchemy union might be tricky with complex ordering, 
-        # simpler to fetch both and merge in python for this use case 
-        # as the number of unique cities is essentially low.
-        
-        results = {}
-        
-        for row in origins.all():
-            key = (row.city, row.country)
-            # On garde le zip s'il existe (priorité à celui qu'on trouve)
-            current_zip = getattr(row, "zip", None)
-            if key in results:
-                 results[key]["count"] += row.count
-                 # Si on avait pas de zip et que maintenant on en a un, on update
-                 if not results[key]["zip"] and current_zip:
-                      results[key]["zip"] = current_zip
-            else:
-                 results[key] = {"count": row.count, "zip": current_zip}
 
-        for row in destinations.all():
-            key = (row.city, row.country)
-            current_zip = getattr(row, "zip", None)
-            if key in results:
-                 results[key]["count"] += row.count
-                 if not results[key]["zip"] and current_zip:
-                      results[key]["zip"] = current_zip
-            else:
-                 results[key] = {"count": row.count, "zip": current_zip}
+        city_index.ensure_fresh(db)
+        return city_index.suggest(query, limit)
 
-        # Convertir en liste triée
-        final_list = [
-            {"city": city, "country": country, "count": data["count"], "zip": data["zip"]}
-            for (city, country), data in results.items()
-        ]
-        
-        # Tri par pertinence (nombre de tarifs) puis alphabétique
-        final_list.sort(key=lambda x: (-x["count"], x["city"]))
-        
-        return final_list[:limit]
+    @staticmethod
+    def closest_city(db: Session, country: str, city: str) -> Optional[dict]:
+        """
+        Ville connue la plus proche d'une ville absente des tarifs du pays (faute de frappe),
+        à proposer à l'utilisateur : la recherche de tarifs ne la substitue jamais d'elle-même.
+        """
+        city_index.ensure_fresh(db)
+        return city_index.closest(country, city)
 
     @staticmethod
     def get_countries(db: Session) -> dict:
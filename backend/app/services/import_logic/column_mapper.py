@@ -8,11 +8,56 @@ import math
 
 CONFIG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__)))), "configs", "partner_mapping.yaml")
 
+# Layouts gérés par map_row (config partenaire) et par map_row_with_sheet_config (config de feuille)
+PARTNER_LAYOUTS = ("grid", "dual_grid", "single_grid")
+SHEET_LAYOUTS = ("dual_grid", "single_grid", "zone_matrix")
+
+# Étapes d'un plan : colonne -> champ(s), colonne par défaut si absente (dual_grid), province, pivot de poids
+FIELD = "field"
+DEFAULT_IF_ABSENT = "default_if_absent"
+PROVINCE = "province"
+PIVOT = "pivot"
+
+
+class MappingPlan:
+    """
+    Plan de mapping d'une config (partenaire ou feuille) résolu sur une liste d'en-têtes.
+
+    Les alias, la normalisation des en-têtes et la recherche des colonnes de tranches ou de
+    zones sont faits une fois à la compilation ; chaque ligne n'exécute plus que des accès
+    par clé (cf. ColumnMapper._compile).
+    """
+
+    __slots__ = ("config", "layout", "steps", "sections", "brackets", "dest_pc_extract", "weight_key", "zones")
+
+    def __init__(self, config: Dict[str, Any], layout: str):
+        self.config = config
+        self.layout = layout
+        # (type d'étape, colonne, cible) dans l'ordre des colonnes
+        self.steps: List[tuple] = []
+        # dual_grid : (colonne pricing, colonne délai, [(colonne ou None, tranche)]) par section
+        self.sections: List[tuple] = []
+        # single_grid : [(colonne ou None, bracket)]
+        self.brackets: List[tuple] = []
+        self.dest_pc_extract: Optional[str] = None
+        # zone_matrix : colonne du poids, [(colonne de zone, codes postaux)]
+        self.weight_key: Any = None
+        self.zones: List[tuple] = []
+
+
 class ColumnMapper:
     def __init__(self):
         self.config = self._load_config()
         self.default_mapping = self.config.get("default", {}).get("columns", {})
 
+        # Aliases du mapping par défaut, communs à toutes les configs
+        self._default_alias_map: Dict[str, List[str]] = {}
+        for field, aliases in self.default_mapping.items():
+            for alias in aliases if isinstance(aliases, list) else [aliases]:
+                self._add_alias(self._default_alias_map, alias, field)
+        # Plans compilés par (config, en-têtes)
+        self._plans: Dict[tuple, MappingPlan] = {}
+
     def _load_config(self) -> Dict:
         if not os.path.exists(CONFIG_PATH):
             return {}
@@ -67,273 +112,44 @@ class ColumnMapper:
         Utilisé pour le layout multi_sheet où chaque feuille a sa propre config.
         """
         mapped_rows = []
-        sheet_layout = sheet_config.get("layout", "flat")
-
-        # Mapping inversé : {alias: [champ_schema_1, champ_schema_2]}
-        alias_map = {}
-
-        def add_mapping(alias, field):
-            norm_alias = self._normalize(alias)
-            if norm_alias not in alias_map:
-                alias_map[norm_alias] = []
-            if field not in alias_map[norm_alias]:
-                alias_map[norm_alias].append(field)
-
-        # 1. Charger aliases défaut
-        for field, aliases in self.default_mapping.items():
-            if isinstance(aliases, list):
-                for alias in aliases:
-                    add_mapping(alias, field)
-            else:
-                add_mapping(aliases, field)
-
-        # 2. Surcharge depuis la config de la feuille
-        sheet_cols = sheet_config.get("columns", {})
-        for field, alias in sheet_cols.items():
-            add_mapping(alias, field)
+        plan = self._plan(("sheet", id(sheet_config)), sheet_config, row, SHEET_LAYOUTS)
+        base_row, _ = self._base_row(plan, row)
 
         # --- LOGIQUE DUAL GRID ---
-        if sheet_layout == "dual_grid":
-            dual_conf = sheet_config.get("dual_grid", {})
-
-            base_row = {}
-            for col_name, value in row.items():
-                normalized_col = self._normalize(col_name)
-                if normalized_col in alias_map:
-                    for target_field in alias_map[normalized_col]:
-                        base_row[target_field] = value
-                elif self._normalize(col_name) in self.default_mapping:
-                    if self.default_mapping[self._normalize(col_name)] not in base_row:
-                        base_row[self._normalize(col_name)] = value
-
-            defaults = sheet_config.get("defaults", {})
-            for field, value in defaults.items():
-                if field not in base_row or base_row[field] is None:
-                    base_row[field] = value
-
-            sections = ["small_weights", "large_weights"]
-            for section_name in sections:
-                section_conf = dual_conf.get(section_name)
-                if not section_conf:
-                    continue
-
-                columns_map = section_conf.get("columns", {})
-                pricing_col_alias = section_conf.get("pricing_col")
-                delivery_col_alias = section_conf.get("delivery_time_col")
-
-                section_pricing_type = base_row.get(pricing_col_alias)
-                section_delivery_time = base_row.get(delivery_col_alias)
-
-                for col_header, weight_range in columns_map.items():
-                    found_val = None
-                    norm_header = self._normalize(col_header)
-
-                    if norm_header in row:
-                        found_val = row[norm_header]
-                    else:
-                        for rk, rv in row.items():
-                            if self._normalize(rk) == norm_header:
-                                found_val = rv
-                                break
-
-                    cleaned_cost = self._clean_decimal(found_val)
-
-                    if cleaned_cost is not None and cleaned_cost > 0:
-                        new_row = base_row.copy()
-                        new_row["weight_min"] = weight_range["weight_min"]
-                        new_row["weight_max"] = weight_range["weight_max"]
-                        new_row["cost"] = cleaned_cost
-
-                        if section_pricing_type:
-                            new_row["pricing_type"] = section_pricing_type
-                        if section_delivery_time:
-                            new_row["delivery_time"] = section_delivery_time
-
-                        mapped_rows.append(new_row)
+        if plan.layout == "dual_grid":
+            mapped_rows = self._map_dual_grid(plan, row, base_row)
 
         # --- LOGIQUE SINGLE GRID ---
-        elif sheet_layout == "single_grid":
-            single_conf = sheet_config.get("single_grid", {})
-            province_col = single_conf.get("province_column")
-            brackets = single_conf.get("brackets", [])
-
-            transforms_conf = sheet_config.get("transforms", {})
-            dest_pc_extract = transforms_conf.get("dest_postal_code", {}).get("regex_extract")
-
-            base_row = {}
-            for col_name, value in row.items():
-                normalized_col = self._normalize(col_name)
-
-                if province_col and (col_name == province_col or normalized_col == self._normalize(province_col)):
-                    if dest_pc_extract and isinstance(value, str):
-                        match = re.search(dest_pc_extract, value)
-                        if match:
-                            base_row["dest_postal_code"] = match.group(1)
-                            if len(match.groups()) > 1:
-                                base_row["dest_city"] = match.group(2).strip()
-                        else:
-                            base_row["dest_postal_code"] = value
-                    else:
-                        base_row["dest_postal_code"] = value
-
-                    if "dest_city" not in base_row:
-                        base_row["dest_city"] = value
-
-                elif normalized_col in alias_map:
-                    for target_field in alias_map[normalized_col]:
-                        base_row[target_field] = value
-                elif self._normalize(col_name) in self.default_mapping:
-                    base_row[self._normalize(col_name)] = value
-
-            defaults = sheet_config.get("defaults", {})
-            for field, value in defaults.items():
-                if field not in base_row or base_row[field] is None:
-                    base_row[field] = value
-
-            for bracket in brackets:
-                header = bracket.get("header")
-                found_val = None
-                norm_header = self._normalize(header)
-
-                if header in row:
-                    found_val = row[header]
-                else:
-                    for rk, rv in row.items():
-                        if self._normalize(rk) == norm_header:
-                            found_val = rv
-                            break
-
-                cleaned_cost = self._clean_decimal(found_val)
-
-                if cleaned_cost is not None:
-                    new_row = base_row.copy()
-                    new_row["weight_min"] = bracket["weight_min"]
-                    new_row["weight_max"] = bracket["weight_max"]
-                    new_row["pricing_type"] = bracket.get("pricing_type", "PER_100KG")
-                    new_row["cost"] = cleaned_cost
-                    mapped_rows.append(new_row)
+        elif plan.layout == "single_grid":
+            mapped_rows = self._map_single_grid(plan, row, base_row)
 
         # --- LOGIQUE ZONE MATRIX (Internationale Phase 2) ---
-        elif sheet_layout == "zone_matrix":
-            zone_conf = sheet_config.get("zone_matrix", {})
-            weight_col_name = zone_conf.get("weight_column", "kg")
-            # Construire un mapping insensible à la casse (les headers pandas peuvent être en minuscules)
-            raw_zone_mappings = zone_conf.get("zone_to_postcodes", {})
-            zone_mappings = {k.upper(): v for k, v in raw_zone_mappings.items()}
-            
-            # Support for ranges (Portugal)
-            raw_zone_ranges = zone_conf.get("zone_to_postcode_ranges", {})
-            zone_ranges_mappings = {k.upper(): v for k, v in raw_zone_ranges.items()}
-
-            base_row = {}
-            for col_name, value in row.items():
-                normalized_col = self._normalize(col_name)
-                if normalized_col in alias_map:
-                    for target_field in alias_map[normalized_col]:
-                        base_row[target_field] = value
-                elif self._normalize(col_name) in self.default_mapping:
-                    base_row[self._normalize(col_name)] = value
-
-            defaults = sheet_config.get("defaults", {})
-            for field, value in defaults.items():
-                if field not in base_row or base_row[field] is None:
-                    base_row[field] = value
-
-            weight_val = None
-            weight_norm = self._normalize(weight_col_name)
-
-            for col_name, value in row.items():
-                if self._normalize(col_name) == weight_norm:
-                    weight_val = value
-                    break
+        elif plan.layout == "zone_matrix":
+            weight_val = row[plan.weight_key] if plan.weight_key is not None else None
 
             if weight_val is not None:
                 w_min, w_max = self._parse_weight_key(weight_val, prev_weight_max)
 
-                for col_name, value in row.items():
-                    norm_col = self._normalize(col_name)
-                    if norm_col == weight_norm:
-                        continue
-                    if "unnamed" in norm_col or value is None:
+                for col_key, postcodes in plan.zones:
+                    value = row[col_key]
+                    if value is None:
                         continue
 
                     cost = self._clean_decimal(value)
                     if cost is not None:
-                        dest_key = str(col_name).strip().upper()
-
-                        if dest_key in zone_mappings:
-                            postcodes = zone_mappings[dest_key]
-                            if isinstance(postcodes, list):
-                                for pc in postcodes:
-                                    new_row = base_row.copy()
-                                    new_row["weight_min"] = w_min
-                                    new_row["weight_max"] = w_max
-                                    new_row["cost"] = cost
-                                    new_row["dest_postal_code"] = str(pc).strip()
-                                    if "pricing_type" not in new_row:
-                                        new_row["pricing_type"] = "LUMPSUM"
-                                    mapped_rows.append(new_row)
-                            else:
-                                new_row = base_row.copy()
-                                new_row["weight_min"] = w_min
-                                new_row["weight_max"] = w_max
-                                new_row["cost"] = cost
-                                new_row["dest_postal_code"] = str(postcodes).strip()
-                                if "pricing_type" not in new_row:
-                                    new_row["pricing_type"] = "LUMPSUM"
-                                mapped_rows.append(new_row)
-                        
-                        elif dest_key in zone_ranges_mappings:
-                             # New logic for ranges
-                             ranges = zone_ranges_mappings[dest_key]
-                             # ranges is list of [start, end]
-                             all_prefixes = []
-                             for r in ranges:
-                                 if isinstance(r, list) and len(r) == 2:
-                                     prefixes = self._generate_prefixes_for_range(str(r[0]), str(r[1]))
-                                     all_prefixes.extend(prefixes)
-                             
-                             for pc in all_prefixes:
-                                 new_row = base_row.copy()
-                                 new_row["weight_min"] = w_min
-                                 new_row["weight_max"] = w_max
-                                 new_row["cost"] = cost
-                                 new_row["dest_postal_code"] = str(pc).strip()
-                                 if "pricing_type" not in new_row:
-                                     new_row["pricing_type"] = "LUMPSUM"
-                                 mapped_rows.append(new_row)
-
-                        else:
+                        for pc in postcodes:
                             new_row = base_row.copy()
                             new_row["weight_min"] = w_min
                             new_row["weight_max"] = w_max
                             new_row["cost"] = cost
-                            new_row["dest_postal_code"] = dest_key
+                            new_row["dest_postal_code"] = pc
                             if "pricing_type" not in new_row:
                                 new_row["pricing_type"] = "LUMPSUM"
                             mapped_rows.append(new_row)
 
         # --- LOGIQUE FLAT ---
         else:
-            mapped_row = {}
-            for col_name, value in row.items():
-                normalized_col = self._normalize(col_name)
-                if normalized_col in alias_map:
-                    for target_field in alias_map[normalized_col]:
-                        mapped_row[target_field] = value
-                elif col_name in self.default_mapping:
-                    mapped_row[col_name] = value
-
-            defaults = sheet_config.get("defaults", {})
-            for field, value in defaults.items():
-                if field not in mapped_row or mapped_row[field] is None:
-                    mapped_row[field] = value
-
-            if "cost" in mapped_row:
-                mapped_row["cost"] = self._clean_decimal(mapped_row.get("cost"))
-
-            if mapped_row.get("cost") is not None:
-                mapped_rows = [mapped_row]
+            mapped_rows = self._map_flat(base_row)
 
         # --- PHASE FINALE : TRANSFORMS & CLEANUP ---
         final_rows = []
@@ -364,151 +180,17 @@ class ColumnMapper:
         
         # 0. Récupérer config partenaire
         partner_config = self.config.get("partners", {}).get(partner_code, {}) if partner_code else {}
-        is_grid = partner_config.get("layout") == "grid"
-        is_dual_grid = partner_config.get("layout") == "dual_grid"
-        is_single = partner_config.get("layout") == "single_grid"
-
-        if not mapped_rows:
-             # Debug only first row
-             # print(f"DEBUG map_row code={partner_code} layout={partner_config.get('layout')} row_keys={list(row.keys())}")
-             pass
-        
-        # Mapping inversé : {alias: [champ_schema_1, champ_schema_2]}
-        alias_map = {}
-        
-        # Helper pour ajouter au mapping
-        def add_mapping(alias, field):
-            norm_alias = self._normalize(alias)
-            if norm_alias not in alias_map:
-                alias_map[norm_alias] = []
-            if field not in alias_map[norm_alias]:
-                alias_map[norm_alias].append(field)
-
-        # 1. Charger aliases défaut
-        for field, aliases in self.default_mapping.items():
-            if isinstance(aliases, list):
-                for alias in aliases:
-                    add_mapping(alias, field)
-            else:
-                add_mapping(aliases, field)
-                
-        # 2. Surcharge Partenaire (spécifique)
-        partner_cols = partner_config.get("columns", {})
-        for field, alias in partner_cols.items():
-             # Ici on peut avoir plusieurs fields qui pointent sur le meme alias
-             add_mapping(alias, field)
+        plan = self._plan(("partner", partner_code), partner_config, row, PARTNER_LAYOUTS)
+        base_row, pivot_data = self._base_row(plan, row)
 
         # --- LOGIQUE DUAL GRID (BIANCHI) ---
-        if is_dual_grid:
-            dual_conf = partner_config.get("dual_grid", {})
-            mapped_rows = []
-            
-            # Common fields map
-            base_row = {}
-            for col_name, value in row.items():
-                normalized_col = self._normalize(col_name)
-                # Map specific fields defined in 'columns'
-                if normalized_col in alias_map:
-                    for target_field in alias_map[normalized_col]:
-                        base_row[target_field] = value
-                # Map defaults that are not mapped
-                elif self._normalize(col_name) in self.default_mapping:
-                     # Avoid overwriting if explicit alias exists? 
-                     if self.default_mapping[self._normalize(col_name)] not in base_row:
-                        base_row[self._normalize(col_name)] = value
-            
-            # Apply defaults
-            defaults = partner_config.get("defaults", {})
-            for field, value in defaults.items():
-                if field not in base_row or base_row[field] is None:
-                    base_row[field] = value
-
-            # Process Sections
-            sections = ["small_weights", "large_weights"]
-            
-            for section_name in sections:
-                section_conf = dual_conf.get(section_name)
-                if not section_conf:
-                    continue
-                
-                columns_map = section_conf.get("columns", {})
-                pricing_col_alias = section_conf.get("pricing_col") # e.g. "pricing_type_small"
-                delivery_col_alias = section_conf.get("delivery_time_col")
-                
-                # Get pricing/delivery specific to this section
-                # These are ALREADY in base_row because we mapped them via alias_map initially
-                # But we need to assign them to the canonical 'pricing_type' and 'delivery_time' fields
-                
-                section_pricing_type = base_row.get(pricing_col_alias)
-                section_delivery_time = base_row.get(delivery_col_alias)
-                
-                for col_header, weight_range in columns_map.items():
-                    # Find value for this column
-                    found_val = None
-                    norm_header = self._normalize(col_header)
-                    
-                    # Try exact match first
-                    if norm_header in row:
-                         found_val = row[norm_header]
-                    else:
-                        for rk, rv in row.items():
-                            if self._normalize(rk) == norm_header:
-                                found_val = rv
-                                break
-                    
-                    # Clean/Validate Cost
-                    cleaned_cost = self._clean_decimal(found_val)
-                    
-                    if cleaned_cost is not None and cleaned_cost > 0:
-                        # Create a row for this weight range
-                        new_row = base_row.copy()
-                        new_row["weight_min"] = weight_range["weight_min"]
-                        new_row["weight_max"] = weight_range["weight_max"]
-                        new_row["cost"] = cleaned_cost
-                        
-                        # Assign section-specific attributes
-                        if section_pricing_type:
-                            new_row["pricing_type"] = section_pricing_type
-                        if section_delivery_time:
-                            new_row["delivery_time"] = section_delivery_time
-                            
-                        mapped_rows.append(new_row)
+        if plan.layout == "dual_grid":
+            mapped_rows = self._map_dual_grid(plan, row, base_row)
 
         # --- LOGIQUE GRID / MATRICE ---
-        elif is_grid:
+        elif plan.layout == "grid":
             grid_conf = partner_config.get("grid", {})
-            header_regex = grid_conf.get("header_regex")
             value_col_name = grid_conf.get("value_column", "cost")
-            
-            # Identifier les colonnes fixes (non pivot)
-            base_row = {}
-            pivot_data = [] # [(weight_max, cost), ...]
-
-            for col_name, value in row.items():
-                normalized_col = self._normalize(col_name)
-                
-                # Est-ce une colonne pivot (ex: "5 KG") ?
-                match = re.search(header_regex, str(col_name), re.IGNORECASE) if header_regex else None
-                
-                if match:
-                    # C'est une colonne de poids !
-                    weight_val = float(match.group(1))
-                    cleaned_val = self._clean_decimal(value)
-                    if cleaned_val is not None: # Si y'a un prix
-                        pivot_data.append((weight_val, cleaned_val))
-                elif normalized_col in alias_map:
-                    # Colonne standard mappée (peut mapper vers plusieurs champs)
-                    for target_field in alias_map[normalized_col]:
-                        base_row[target_field] = value
-                else:
-                    if self._normalize(col_name) in self.default_mapping:
-                         base_row[self._normalize(col_name)] = value
-
-            # Appliquer les valeurs par défaut
-            defaults = partner_config.get("defaults", {})
-            for field, value in defaults.items():
-                if field not in base_row or base_row[field] is None:
-                    base_row[field] = value
 
             # Générer les lignes pivotées
             pivot_data.sort(key=lambda x: x[0])
@@ -523,100 +205,12 @@ class ColumnMapper:
                 mapped_rows.append(new_row)
                 prev_weight = weight_max + weight_min_gap
 
-
         # --- LOGIQUE SINGLE GRID (MONACO ITALIE) ---
-        elif partner_config.get("layout") == "single_grid":
-            single_conf = partner_config.get("single_grid", {})
-            province_col = single_conf.get("province_column")
-            brackets = single_conf.get("brackets", [])
-            
-            # Regex extraction config
-            transforms_conf = partner_config.get("transforms", {})
-            dest_pc_extract = transforms_conf.get("dest_postal_code", {}).get("regex_extract")
-
-            base_row = {}
-            # Copie des champs par défaut et mappings simples
-            for col_name, value in row.items():
-                normalized_col = self._normalize(col_name)
-                
-                # Si c'est la colonne province, on la traite
-                if province_col and (col_name == province_col or normalized_col == self._normalize(province_col)):
-                    # Extraction Regex (ex: "20 Milano" -> "20")
-                    if dest_pc_extract and isinstance(value, str):
-                        match = re.search(dest_pc_extract, value)
-                        if match:
-                             base_row["dest_postal_code"] = match.group(1)
-                             if len(match.groups()) > 1:
-                                 base_row["dest_city"] = match.group(2).strip()
-                        else:
-                             base_row["dest_postal_code"] = value
-                    else:
-                        base_row["dest_postal_code"] = value
-                    
-                    if "dest_city" not in base_row:
-                         base_row["dest_city"] = value # Fallback
-
-                elif normalized_col in alias_map:
-                    for target_field in alias_map[normalized_col]:
-                        base_row[target_field] = value
-                elif self._normalize(col_name) in self.default_mapping:
-                     base_row[self._normalize(col_name)] = value
-
-            # Defaults
-            defaults = partner_config.get("defaults", {})
-            for field, value in defaults.items():
-                if field not in base_row or base_row[field] is None:
-                    base_row[field] = value
-
-            # Itération sur les brackets configurés
-            for bracket in brackets:
-                header = bracket.get("header")
-                found_val = None
-                norm_header = self._normalize(header)
-                
-                if header in row:
-                    found_val = row[header]
-                else:
-                    for rk, rv in row.items():
-                        if self._normalize(rk) == norm_header:
-                            found_val = rv
-                            break
-                
-                cleaned_cost = self._clean_decimal(found_val)
-                
-                if cleaned_cost is not None:
-                    new_row = base_row.copy()
-                    new_row["weight_min"] = bracket["weight_min"]
-                    new_row["weight_max"] = bracket["weight_max"]
-                    new_row["pricing_type"] = bracket.get("pricing_type", "PER_100KG")
-                    new_row["cost"] = cleaned_cost
-                    mapped_rows.append(new_row)
+        elif plan.layout == "single_grid":
+            mapped_rows = self._map_single_grid(plan, row, base_row)
 
         else:
-            mapped_row = {}
-            for col_name, value in row.items():
-                normalized_col = self._normalize(col_name)
-                if normalized_col in alias_map:
-                    for target_field in alias_map[normalized_col]:
-                        mapped_row[target_field] = value
-                elif col_name in self.default_mapping:
-                    mapped_row[col_name] = value
-            
-            # Defaults flat
-            defaults = partner_config.get("defaults", {})
-            for field, value in defaults.items():
-                if field not in mapped_row or mapped_row[field] is None:
-                    mapped_row[field] = value
-            
-            # Clean generic cost if present
-            if "cost" in mapped_row:
-                 mapped_row["cost"] = self._clean_decimal(mapped_row.get("cost"))
-
-            if mapped_row.get("cost") is not None:
-                mapped_rows = [mapped_row]
-            else:
-                mapped_rows = []
-            
+            mapped_rows = self._map_flat(base_row)
         
         # --- PHASE FINALE : TRANSFORMS & CLEANUP ---
         final_rows = []
@@ -639,10 +233,231 @@ class ColumnMapper:
             
             final_rows.append(r)
 
-
-        # --- LOGIQUE SINGLE GRID (MONACO ITALIE) ---
         return final_rows
 
+    # --- PLANS DE MAPPING COMPILÉS ---
+
+    def _plan(self, config_key: tuple, config: Dict[str, Any], row: Dict[str, Any], layouts: tuple) -> "MappingPlan":
+        """Plan de la config pour les en-têtes de la ligne, compilé à la première ligne puis réutilisé."""
+        key = (config_key, tuple(row))
+        plan = self._plans.get(key)
+        # Même id mais autre dict (config de feuille libérée puis remplacée) : plan recompilé
+        if plan is None or plan.config is not config:
+            plan = self._compile(config, key[1], layouts)
+            self._plans[key] = plan
+        return plan
+
+    def _alias_map(self, config: Dict[str, Any]) -> Dict[str, List[str]]:
+        """Mapping inversé : {alias normalisé: [champ_schema_1, champ_schema_2]}, défaut puis surcharge de la config."""
+        alias_map = {alias: list(fields) for alias, fields in self._default_alias_map.items()}
+
+        # Ici on peut avoir plusieurs fields qui pointent sur le meme alias
+        for field, alias in config.get("columns", {}).items():
+            self._add_alias(alias_map, alias, field)
+        return alias_map
+
+    def _add_alias(self, alias_map: Dict[str, List[str]], alias: Any, field: str):
+        norm_alias = self._normalize(alias)
+        if norm_alias not in alias_map:
+            alias_map[norm_alias] = []
+        if field not in alias_map[norm_alias]:
+            alias_map[norm_alias].append(field)
+
+    def _compile(self, config: Dict[str, Any], headers: tuple, layouts: tuple) -> "MappingPlan":
+        """
+        Résout une config (partenaire ou feuille) sur les en-têtes réels : colonnes mappées vers
+        un champ, colonne province, colonnes de poids (grid), colonnes de tranches et de zones.
+        """
+        layout = config.get("layout")
+        plan = MappingPlan(config, layout if layout in layouts else "flat")
+        alias_map = self._alias_map(config)
+        normalized = [self._normalize(col_name) for col_name in headers]
+
+        # Champs de base, dans l'ordre des colonnes (une colonne plus à droite écrase la précédente)
+        header_regex = config.get("grid", {}).get("header_regex") if plan.layout == "grid" else None
+        province_col = config.get("single_grid", {}).get("province_column") if plan.layout == "single_grid" else None
+        norm_province = self._normalize(province_col)
+        for col_name, normalized_col in zip(headers, normalized):
+            if province_col and (col_name == province_col or normalized_col == norm_province):
+                plan.steps.append((PROVINCE, col_name, None))
+                continue
+            # Est-ce une colonne pivot (ex: "5 KG") ?
+            match = re.search(header_regex, str(col_name), re.IGNORECASE) if header_regex else None
+            if match:
+                plan.steps.append((PIVOT, col_name, float(match.group(1))))
+            elif normalized_col in alias_map:
+                plan.steps.append((FIELD, col_name, tuple(alias_map[normalized_col])))
+            elif plan.layout == "flat":
+                if col_name in self.default_mapping:
+                    plan.steps.append((FIELD, col_name, (col_name,)))
+            elif normalized_col in self.default_mapping:
+                if plan.layout == "dual_grid":
+                    plan.steps.append((DEFAULT_IF_ABSENT, col_name, normalized_col))
+                else:
+                    plan.steps.append((FIELD, col_name, (normalized_col,)))
+
+        def find_column(header: Any, exact: Any) -> Any:
+            """Colonne d'un en-tête de config : clé exacte, sinon première colonne de même forme normalisée."""
+            if exact in headers:
+                return exact
+            norm_header = self._normalize(header)
+            for col_name, normalized_col in zip(headers, normalized):
+                if normalized_col == norm_header:
+                    return col_name
+            return None
+
+        if plan.layout == "dual_grid":
+            for section_name in ["small_weights", "large_weights"]:
+                section_conf = config.get("dual_grid", {}).get(section_name)
+                if not section_conf:
+                    continue
+                columns = [
+                    (find_column(col_header, self._normalize(col_header)), weight_range)
+                    for col_header, weight_range in section_conf.get("columns", {}).items()
+                ]
+                plan.sections.append(
+                    (section_conf.get("pricing_col"), section_conf.get("delivery_time_col"), columns)
+                )
+
+        elif plan.layout == "single_grid":
+            transforms_conf = config.get("transforms", {})
+            plan.dest_pc_extract = transforms_conf.get("dest_postal_code", {}).get("regex_extract")
+            plan.brackets = [
+                (find_column(bracket.get("header"), bracket.get("header")), bracket)
+                for bracket in config.get("single_grid", {}).get("brackets", [])
+            ]
+
+        elif plan.layout == "zone_matrix":
+            zone_conf = config.get("zone_matrix", {})
+            weight_norm = self._normalize(zone_conf.get("weight_column", "kg"))
+            # Construire un mapping insensible à la casse (les headers pandas peuvent être en minuscules)
+            zone_mappings = {k.upper(): v for k, v in zone_conf.get("zone_to_postcodes", {}).items()}
+            # Support for ranges (Portugal)
+            zone_ranges_mappings = {k.upper(): v for k, v in zone_conf.get("zone_to_postcode_ranges", {}).items()}
+
+            plan.weight_key = next(
+                (col_name for col_name, normalized_col in zip(headers, normalized) if normalized_col == weight_norm), None
+            )
+            for col_name, normalized_col in zip(headers, normalized):
+                if normalized_col == weight_norm or "unnamed" in normalized_col:
+                    continue
+                dest_key = str(col_name).strip().upper()
+                if dest_key in zone_mappings:
+                    postcodes = zone_mappings[dest_key]
+                    if isinstance(postcodes, list):
+                        codes = [str(pc).strip() for pc in postcodes]
+                    else:
+                        codes = [str(postcodes).strip()]
+                elif dest_key in zone_ranges_mappings:
+                    # ranges is list of [start, end]
+                    codes = []
+                    for r in zone_ranges_mappings[dest_key]:
+                        if isinstance(r, list) and len(r) == 2:
+                            codes.extend(
+                                str(pc).strip() for pc in self._generate_prefixes_for_range(str(r[0]), str(r[1]))
+                            )
+                else:
+                    codes = [dest_key]
+                plan.zones.append((col_name, codes))
+
+        return plan
+
+    def _base_row(self, plan: "MappingPlan", row: Dict[str, Any]) -> tuple:
+        """Exécute les étapes du plan sur la ligne : (champs de base avec défauts, [(poids, prix)] des colonnes pivot)."""
+        base_row = {}
+        pivot_data = []
+        for kind, col_name, target in plan.steps:
+            value = row[col_name]
+            if kind == FIELD:
+                for target_field in target:
+                    base_row[target_field] = value
+            elif kind == PIVOT:
+                cleaned_val = self._clean_decimal(value)
+                if cleaned_val is not None: # Si y'a un prix
+                    pivot_data.append((target, cleaned_val))
+            elif kind == DEFAULT_IF_ABSENT:
+                if self.default_mapping[target] not in base_row:
+                    base_row[target] = value
+            else:
+                self._map_province(base_row, value, plan.dest_pc_extract)
+
+        # Appliquer les valeurs par défaut
+        defaults = plan.config.get("defaults", {})
+        for field, value in defaults.items():
+            if field not in base_row or base_row[field] is None:
+                base_row[field] = value
+        return base_row, pivot_data
+
+    @staticmethod
+    def _map_province(base_row: Dict[str, Any], value: Any, dest_pc_extract: Optional[str]):
+        """Colonne province (single_grid) : code postal et ville de destination."""
+        # Extraction Regex (ex: "20 Milano" -> "20")
+        if dest_pc_extract and isinstance(value, str):
+            match = re.search(dest_pc_extract, value)
+            if match:
+                base_row["dest_postal_code"] = match.group(1)
+                if len(match.groups()) > 1:
+                    base_row["dest_city"] = match.group(2).strip()
+            else:
+                base_row["dest_postal_code"] = value
+        else:
+            base_row["dest_postal_code"] = value
+
+        if "dest_city" not in base_row:
+            base_row["dest_city"] = value # Fallback
+
+    def _map_dual_grid(self, plan: "MappingPlan", row: Dict[str, Any], base_row: Dict[str, Any]) -> List[Dict[str, Any]]:
+        mapped_rows = []
+        for pricing_col_alias, delivery_col_alias, columns in plan.sections:
+            # Get pricing/delivery specific to this section
+            # These are ALREADY in base_row because we mapped them via alias_map initially
+            section_pricing_type = base_row.get(pricing_col_alias)
+            section_delivery_time = base_row.get(delivery_col_alias)
+
+            for col_name, weight_range in columns:
+                # Clean/Validate Cost
+                cleaned_cost = self._clean_decimal(row[col_name] if col_name is not None else None)
+
+                if cleaned_cost is not None and cleaned_cost > 0:
+                    # Create a row for this weight range
+                    new_row = base_row.copy()
+                    new_row["weight_min"] = weight_range["weight_min"]
+                    new_row["weight_max"] = weight_range["weight_max"]
+                    new_row["cost"] = cleaned_cost
+
+                    # Assign section-specific attributes
+                    if section_pricing_type:
+                        new_row["pricing_type"] = section_pricing_type
+                    if section_delivery_time:
+                        new_row["delivery_time"] = section_delivery_time
+
+                    mapped_rows.append(new_row)
+        return mapped_rows
+
+    def _map_single_grid(self, plan: "MappingPlan", row: Dict[str, Any], base_row: Dict[str, Any]) -> List[Dict[str, Any]]:
+        mapped_rows = []
+        # Itération sur les brackets configurés
+        for col_name, bracket in plan.brackets:
+            cleaned_cost = self._clean_decimal(row[col_name] if col_name is not None else None)
+
+            if cleaned_cost is not None:
+                new_row = base_row.copy()
+                new_row["weight_min"] = bracket["weight_min"]
+                new_row["weight_max"] = bracket["weight_max"]
+                new_row["pricing_type"] = bracket.get("pricing_type", "PER_100KG")
+                new_row["cost"] = cleaned_cost
+                mapped_rows.append(new_row)
+        return mapped_rows
+
+    def _map_flat(self, mapped_row: Dict[str, Any]) -> List[Dict[str, Any]]:
+        # Clean generic cost if present
+        if "cost" in mapped_row:
+            mapped_row["cost"] = self._clean_decimal(mapped_row.get("cost"))
+
+        if mapped_row.get("cost") is not None:
+            return [mapped_row]
+        return []
+
     def _clean_decimal(self, value: Any) -> Optional[float]:
         """Convertit une valeur en float, renvoie None si impossible ou vide."""
         if value is None:
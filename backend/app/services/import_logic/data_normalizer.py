@@ -1,6 +1,13 @@
 from datetime import datetime
 from typing import Any, Optional
 import re
+import unicodedata
+
+# Abréviations courantes dans les noms de villes ("ST ETIENNE" -> "SAINT ETIENNE")
+CITY_ABBREVIATIONS = {"ST": "SAINT", "STE": "SAINTE"}
+# Version de city_key, à incrémenter à chaque changement de la normalisation des villes
+# (les résultats de matching en cache en dépendent, cf. MatchCache)
+CITY_KEY_VERSION = 1
 
 class DataNormalizer:
     
@@ -25,6 +32,40 @@ class DataNormalizer:
                     
         return normalized
 
+    @staticmethod
+    def city_key(value: Any) -> Optional[str]:
+        """
+        Clé de comparaison d'une ville (colonnes *_city_key, matching, dictionnaire des villes).
+        Insensible à la casse, aux accents, à la ponctuation et aux abréviations :
+        "St Etienne", "SAINT-ETIENNE" et "Saint Étienne" -> "SAINT ETIENNE".
+        Idempotente : city_key(city_key(x)) == city_key(x).
+        """
+        key = DataNormalizer._location_key(value)
+        if key is None:
+            return None
+        decomposed = unicodedata.normalize("NFKD", key)
+        ascii_key = "".join(c for c in decomposed if not unicodedata.combining(c))
+        words = re.sub(r"[^0-9A-Z]+", " ", ascii_key.upper()).split()
+        return " ".join(CITY_ABBREVIATIONS.get(word, word) for word in words) or None
+
+    @staticmethod
+    def postal_key(value: Any) -> Optional[str]:
+        """Clé de comparaison d'un code postal (colonnes *_postal_key, matching)."""
+        return DataNormalizer._location_key(value)
+
+    @staticmethod
+    def country_code(value: Any) -> Optional[str]:
+        """Code pays normalisé (colonnes *_country_code, matching)."""
+        return DataNormalizer._location_key(value)
+
+    @staticmethod
+    def _location_key(value: Any) -> Optional[str]:
+        # Codes postaux et pays : doit rester identique au backfill SQL NULLIF(UPPER(TRIM(col)), '')
+        if value is None:
+            return None
+        key = str(value).strip().upper()
+        return key or None
+
     @staticmethod
     def _clean_cost(value: Any) -> Optional[float]:
         return DataNormalizer._to_float(value)
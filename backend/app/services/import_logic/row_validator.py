@@ -45,6 +45,13 @@ class QuoteImportSchema(BaseModel):
             raise ValueError('Code pays doit faire 2 caractères (ISO)')
         return v.upper()
 
+    @validator('weight_max')
+    def validate_weight_range(cls, v, values):
+        weight_min = values.get('weight_min')
+        if v is not None and weight_min is not None and weight_min > v:
+            raise ValueError('Le poids max doit être supérieur ou égal au poids min')
+        return v
+
 class RowValidator:
     def validate(self, row_data: Dict[str, Any]) -> ValidationResult:
         try:
@@ -1,12 +1,17 @@
 import os
 import shutil
 import math
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
-from typing import Optional, Any
+from typing import Optional, Any, Dict, Iterator, List, Tuple
 from fastapi import UploadFile
 from sqlalchemy.orm import Session
 from app.models.import_job import ImportJob, ImportStatus
 from app.schemas.import_job import ImportJobCreate
+from app.services.parsers.base_parser import BaseParser
 from app.services.parsers.csv_parser import CsvParser
 from app.services.parsers.excel_parser import ExcelParser
 from app.services.parsers.pdf_parser import PdfParser
@@ -18,6 +23,10 @@ from app.services.quote_service import QuoteService
 from app.schemas.partner_quote import PartnerQuoteCreate
 from app.models.partner_quote import TransportMode
 from app.services.partner_service import PartnerService
+from app.services.tariff_index import WeightIntervalTree, tariff_index
+from app.core.config import get_settings
+
+settings = get_settings()
 
 UPLOAD_DIR = "uploads"
 
@@ -39,6 +48,167 @@ def sanitize_for_json(obj: Any) -> Any:
         return [sanitize_for_json(item) for item in obj]
     return obj
 
+def select_parser(file_type: str) -> BaseParser:
+    """Parser correspondant au type de fichier du job."""
+    if file_type in [".CSV", "CSV"]:
+        return CsvParser()
+    if file_type in [".XLSX", "XLSX", ".XLS", "XLS"]:
+        return ExcelParser()
+    if file_type in [".PDF", "PDF"]:
+        return PdfParser()
+    raise ValueError(f"Format non supporté: {file_type}")
+
+
+def map_sheet(file_path: str, file_type: str, partner_id: str, sheet_conf: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Parsing, mapping, normalisation et validation d'une feuille d'un layout multi_sheet.
+    Exécutée dans un process du pool d'import : pas d'accès base, résultat picklable.
+    Retourne {"rows": lignes lues, "quotes": [(tarif, données validées, contexte, ligne brute)],
+    "errors": erreurs de ligne}, dans l'ordre des lignes.
+    """
+    mapper = ColumnMapper()
+    normalizer = DataNormalizer()
+    validator = RowValidator()
+    parser = select_parser(file_type)
+
+    sheet_name = sheet_conf.get("sheet_name")
+    header_row = sheet_conf.get("header_row")
+    conf_name = sheet_conf.get("name", sheet_name)
+    quotes: List[Tuple[PartnerQuoteCreate, dict, dict, Any]] = []
+    errors: List[dict] = []
+
+    print(f"[{datetime.utcnow()}] Processing sheet '{sheet_name}' (config: {conf_name})...")
+
+    # Parser cette feuille spécifique
+    sheet_parser_config = {
+        "sheet_name": sheet_name,
+        "header_row": header_row
+    }
+    # Lecture en flux : une ligne à la fois
+    raw_rows = parser.iter_rows(file_path, **sheet_parser_config)
+
+    sheet_rows = 0
+    prev_weight_max = 0.0
+    for i, row in enumerate(raw_rows):
+        row_num = i + 1
+        sheet_rows += 1
+        context = {"sheet": sheet_name, "row": row_num}
+        try:
+            # Mapping avec la config spécifique de la feuille, avec prev_weight_max
+            mapped_rows_list = mapper.map_row_with_sheet_config(row, sheet_conf, prev_weight_max)
+
+            # Mise à jour du prev_weight_max pour la prochaine itération
+            # On cherche le weight_max le plus grand de la ligne courante
+            current_max = 0.0
+            for m_row in mapped_rows_list:
+                if "weight_max" in m_row and m_row["weight_max"] is not None:
+                    if m_row["weight_max"] > current_max:
+                        current_max = m_row["weight_max"]
+
+            # Si on a trouvé un max valide, on met à jour.
+            # Attention : si la ligne ne contient pas de poids (ex: ligne vide ignorée), on garde l'ancien.
+            if current_max > 0:
+                prev_weight_max = current_max
+
+            for mapped_row in mapped_rows_list:
+                try:
+                    normalized_row = normalizer.normalize_row(mapped_row)
+                    validation = validator.validate(normalized_row)
+
+                    if validation.is_valid:
+                        quote_in = PartnerQuoteCreate(
+                            partner_id=partner_id,
+                            **validation.data
+                        )
+                        quotes.append((quote_in, validation.data, context, row))
+                    else:
+                        errors.append({
+                            **context,
+                            "errors": [e.model_dump() for e in validation.errors],
+                            "raw": sanitize_for_json(row)
+                        })
+                except Exception as e_inner:
+                    errors.append({
+                        **context,
+                        "error": f"Error processing sub-row: {str(e_inner)}",
+                        "raw": sanitize_for_json(row)
+                    })
+
+        except Exception as e:
+            errors.append({
+                **context,
+                "error": str(e),
+                "raw": sanitize_for_json(row)
+            })
+
+    print(f"[{datetime.utcnow()}] Sheet '{sheet_name}' completed ({sheet_rows} rows).")
+    return {"rows": sheet_rows, "quotes": quotes, "errors": errors}
+
+
+# Pool de process des imports multi_sheet, créé à la première utilisation et partagé par les imports du worker
+_sheet_pool: Optional[ProcessPoolExecutor] = None
+
+
+def _sheet_workers() -> int:
+    """Process du pool : IMPORT_SHEET_WORKERS, borné au nombre de cœurs."""
+    return max(1, min(settings.import_sheet_workers, os.cpu_count() or 1))
+
+
+def _get_sheet_pool() -> ProcessPoolExecutor:
+    global _sheet_pool
+    if _sheet_pool is None:
+        # spawn : pas de fork d'un process multi-threadé qui détient des connexions base
+        _sheet_pool = ProcessPoolExecutor(
+            max_workers=_sheet_workers(), mp_context=multiprocessing.get_context("spawn")
+        )
+    return _sheet_pool
+
+
+def shutdown_sheet_pool():
+    """Arrête le pool (pool cassé, arrêt de l'application) ; il sera recréé au prochain import multi_sheet."""
+    global _sheet_pool
+    pool, _sheet_pool = _sheet_pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+class PendingQuotes:
+    """
+    Tarifs validés en attente d'écriture, insérés par lots de IMPORT_BATCH_SIZE
+    (QuoteService.bulk_create_quotes) au lieu d'une transaction par ligne.
+    Les tarifs sont préparés inactifs, rattachés à l'import, et activés en fin d'import.
+    Les lignes refusées par la base sont rapportées comme les autres erreurs de ligne.
+    """
+
+    def __init__(self, db: Session, batch_size: int, import_job_id: str):
+        self.db = db
+        self.batch_size = batch_size
+        self.import_job_id = import_job_id
+        # (tarif, contexte d'erreur : feuille éventuelle, numéro de ligne, ligne brute)
+        self.items: List[Tuple[PartnerQuoteCreate, dict, Any]] = []
+        self.errors: List[dict] = []
+
+    def add(self, quote_in: PartnerQuoteCreate, context: dict, raw: Any):
+        self.items.append((quote_in, context, raw))
+        if len(self.items) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.items:
+            return
+        failures = QuoteService.bulk_create_quotes(
+            self.db, [quote_in for quote_in, _, _ in self.items], import_job_id=self.import_job_id
+        )
+        for (_, context, raw), error in zip(self.items, failures):
+            if error is not None:
+                self.errors.append({
+                    **context,
+                    "error": f"Error processing sub-row: {error}",
+                    "raw": sanitize_for_json(raw)
+                })
+        self.items = []
+
+
 class ImportService:
     @staticmethod
     def create_import_job(db: Session, partner_id: str, file: UploadFile) -> ImportJob:
@@ -99,16 +269,7 @@ class ImportService:
             file_path = os.path.join(UPLOAD_DIR, job.filename)
             
             # Sélection parser
-            parser = None
-            if job.file_type in [".CSV", "CSV"]:
-                parser = CsvParser()
-            elif job.file_type in [".XLSX", "XLSX", ".XLS", "XLS"]:
-                parser = ExcelParser()
-            elif job.file_type in [".PDF", "PDF"]:
-                parser = PdfParser()
-            
-            if not parser:
-                raise ValueError(f"Format non supporté: {job.file_type}")
+            parser = select_parser(job.file_type)
 
             # Instanciation des services logiques
             mapper = ColumnMapper()
@@ -119,14 +280,19 @@ class ImportService:
             error_count = 0
             errors_list = []
             total_rows = 0
+            pending = PendingQuotes(db, settings.import_batch_size, job.id)
+            # Tranches de poids importées par série (voie + localisation), contrôlées en fin d'import
+            brackets: Dict[Tuple, List[Tuple[float, float, dict]]] = {}
 
             print(f"[{datetime.utcnow()}] START Processing Job {job_id}")
-            print(f"[{datetime.utcnow()}] Deleting old quotes...")
-
-            # Suppression des anciens tarifs du partenaire avant import
-            QuoteService.delete_all_by_partner(db, job.partner_id)
+            # Les anciens tarifs restent en service pendant l'import : les nouveaux sont préparés
+            # à part et basculés en une transaction à la fin (QuoteService.activate_import).
+            # Restes d'un import précédent interrompu (les imports en cours du partenaire gardent les leurs) :
+            discarded = QuoteService.discard_abandoned_staged_quotes(db, job.partner_id)
+            if discarded:
+                print(f"[{datetime.utcnow()}] {discarded} staged quotes from a previous import discarded.")
 
-            print(f"[{datetime.utcnow()}] Old quotes deleted. Parsing file...")
+            print(f"[{datetime.utcnow()}] Parsing file...")
 
             # --- VÉRIFICATION LAYOUT MULTI_SHEET ---
             if mapper.is_multi_sheet(partner_code):
@@ -134,98 +300,23 @@ class ImportService:
                 sheets_config = mapper.get_sheets_config(partner_code)
                 print(f"[{datetime.utcnow()}] Multi-sheet layout detected. Processing {len(sheets_config)} sheets...")
 
-                for sheet_conf in sheets_config:
-                    sheet_name = sheet_conf.get("sheet_name")
-                    header_row = sheet_conf.get("header_row")
-                    conf_name = sheet_conf.get("name", sheet_name)
-
-                    print(f"[{datetime.utcnow()}] Processing sheet '{sheet_name}' (config: {conf_name})...")
-
-                    # Parser cette feuille spécifique
-                    sheet_parser_config = {
-                        "sheet_name": sheet_name,
-                        "header_row": header_row
-                    }
-                    raw_data = parser.parse(file_path, **sheet_parser_config)
-
-                    print(f"[{datetime.utcnow()}] Sheet '{sheet_name}': {len(raw_data) if raw_data else 0} rows parsed.")
-
-                    if not raw_data:
-                        continue
-
-                    total_rows += len(raw_data)
-
-                    prev_weight_max = 0.0
-                    for i, row in enumerate(raw_data):
-                        row_num = i + 1
-                        try:
-                            # Mapping avec la config spécifique de la feuille, avec prev_weight_max
-                            mapped_rows_list = mapper.map_row_with_sheet_config(row, sheet_conf, prev_weight_max)
-                            
-                            # Mise à jour du prev_weight_max pour la prochaine itération
-                            # On cherche le weight_max le plus grand de la ligne courante
-                            current_max = 0.0
-                            for m_row in mapped_rows_list:
-                                if "weight_max" in m_row and m_row["weight_max"] is not None:
-                                    if m_row["weight_max"] > current_max:
-                                        current_max = m_row["weight_max"]
-                            
-                            # Si on a trouvé un max valide, on met à jour.
-                            # Attention : si la ligne ne contient pas de poids (ex: ligne vide ignorée), on garde l'ancien.
-                            if current_max > 0:
-                                prev_weight_max = current_max
-
-                            for mapped_row in mapped_rows_list:
-                                try:
-                                    normalized_row = normalizer.normalize_row(mapped_row)
-                                    validation = validator.validate(normalized_row)
-
-                                    if validation.is_valid:
-                                        quote_in = PartnerQuoteCreate(
-                                            partner_id=job.partner_id,
-                                            **validation.data
-                                        )
-                                        QuoteService.create_quote(db, quote_in)
-                                        success_count += 1
-                                    else:
-                                        error_count += 1
-                                        errors_list.append({
-                                            "sheet": sheet_name,
-                                            "row": row_num,
-                                            "errors": [e.model_dump() for e in validation.errors],
-                                            "raw": sanitize_for_json(row)
-                                        })
-                                except Exception as e_inner:
-                                    error_count += 1
-                                    errors_list.append({
-                                        "sheet": sheet_name,
-                                        "row": row_num,
-                                        "error": f"Error processing sub-row: {str(e_inner)}",
-                                        "raw": sanitize_for_json(row)
-                                    })
-
-                        except Exception as e:
-                            error_count += 1
-                            errors_list.append({
-                                "sheet": sheet_name,
-                                "row": row_num,
-                                "error": str(e),
-                                "raw": sanitize_for_json(row)
-                            })
-
-                    print(f"[{datetime.utcnow()}] Sheet '{sheet_name}' completed.")
+                for sheet in ImportService._map_sheets(file_path, job.file_type, job.partner_id, sheets_config):
+                    total_rows += sheet["rows"]
+                    error_count += len(sheet["errors"])
+                    errors_list.extend(sheet["errors"])
+                    for quote_in, data, context, row in sheet["quotes"]:
+                        pending.add(quote_in, context, row)
+                        success_count += 1
+                        ImportService._record_bracket(brackets, data, context)
 
             else:
                 # --- PIPELINE STANDARD (une seule feuille) ---
                 parser_config = mapper.get_parser_config(partner_code)
-                raw_data = parser.parse(file_path, **parser_config)
-
-                print(f"[{datetime.utcnow()}] Parsed {len(raw_data) if raw_data else 0} rows.")
-
-                total_rows = len(raw_data) if raw_data else 0
+                raw_rows = parser.iter_rows(file_path, **parser_config)
 
-                for i, row in enumerate(raw_data):
+                for i, row in enumerate(raw_rows):
                     row_num = i + 1
+                    total_rows += 1
                     try:
                         # 1. Mapping (peut retourner plusieurs lignes si matrice)
                         mapped_rows_list = mapper.map_row(row, partner_code)
@@ -244,8 +335,9 @@ class ImportService:
                                         partner_id=job.partner_id,
                                         **validation.data
                                     )
-                                    QuoteService.create_quote(db, quote_in)
+                                    pending.add(quote_in, {"row": row_num}, row)
                                     success_count += 1
+                                    ImportService._record_bracket(brackets, validation.data, {"row": row_num})
                                 else:
                                     # Gestion Erreur Validation
                                     error_count += 1
@@ -271,11 +363,25 @@ class ImportService:
                             "raw": sanitize_for_json(row)
                         })
 
+                print(f"[{datetime.utcnow()}] Parsed {total_rows} rows.")
+
+            # Dernier lot ; les lignes refusées par la base passent de succès à erreur
+            pending.flush()
+            success_count -= len(pending.errors)
+            error_count += len(pending.errors)
+            errors_list.extend(pending.errors)
+
+            # Tranches qui se chevauchent ou laissent un trou : signalées sans bloquer l'import
+            bracket_warnings = ImportService._bracket_warnings(brackets)
+            if bracket_warnings:
+                print(f"[{datetime.utcnow()}] {len(bracket_warnings)} weight bracket warnings.")
+
             # Mise à jour du Job
             job.total_rows = total_rows
             job.success_count = success_count
             job.error_count = error_count
             job.errors = errors_list
+            job.warnings = bracket_warnings
             
             if error_count == 0:
                 job.status = ImportStatus.COMPLETED
@@ -285,7 +391,130 @@ class ImportService:
                 job.status = ImportStatus.FAILED
             
         except Exception as e:
+            db.rollback()
             job.status = ImportStatus.FAILED
             job.errors = {"error": str(e)}
             
         db.commit()
+
+        # Bascule : nouveaux tarifs activés, anciens supprimés, dans une seule transaction.
+        # En cas d'échec, les anciens tarifs restent en service et la préparation est abandonnée.
+        if job.status == ImportStatus.COMPLETED:
+            try:
+                activated = QuoteService.activate_import(db, job.partner_id, job.id)
+                print(f"[{datetime.utcnow()}] {activated} quotes activated.")
+            except Exception as e:
+                db.rollback()
+                job.status = ImportStatus.FAILED
+                job.errors = {"error": f"Activation failed: {e}"}
+                db.commit()
+        if job.status != ImportStatus.COMPLETED:
+            QuoteService.discard_staged_quotes(db, job.id)
+
+        # Les tarifs du partenaire ont pu changer
+        QuoteService.publish_partner_changes(db, job.partner_id)
+
+        # Reconstruction de l'index mémoire du matching avec les nouveaux tarifs
+        if settings.tariff_index_enabled and job.status == ImportStatus.COMPLETED:
+            try:
+                indexed = tariff_index.rebuild(db)
+                print(f"[{datetime.utcnow()}] Tariff index rebuilt ({indexed} rows).")
+            except Exception as e:
+                tariff_index.invalidate()
+                print(f"[{datetime.utcnow()}] Tariff index rebuild failed: {e}")
+
+    @staticmethod
+    def _map_sheets(
+        file_path: str, file_type: str, partner_id: str, sheets_config: List[Dict[str, Any]]
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Résultats de map_sheet pour chaque feuille, dans l'ordre de la configuration, produits au fur
+        et à mesure : l'appelant écrit une feuille avant de recevoir la suivante.
+        Les feuilles sont traitées en parallèle dans le pool (IMPORT_SHEET_WORKERS > 1 et plusieurs cœurs),
+        au plus une feuille d'avance par process ; sinon, ou si le pool devient indisponible, les feuilles
+        restantes le sont dans le process courant. Une feuille en échec devient une erreur d'import.
+        """
+        file_path = os.path.abspath(file_path)
+        remaining = list(sheets_config)
+        workers = _sheet_workers()
+        if workers > 1 and len(remaining) > 1:
+            in_flight: deque = deque()
+            try:
+                pool = _get_sheet_pool()
+                while remaining or in_flight:
+                    while remaining and len(in_flight) < workers:
+                        sheet_conf = remaining.pop(0)
+                        in_flight.append(
+                            (sheet_conf, pool.submit(map_sheet, file_path, file_type, partner_id, sheet_conf))
+                        )
+                    sheet_conf, future = in_flight[0]
+                    try:
+                        result = future.result()
+                    except BrokenProcessPool:
+                        raise
+                    except Exception as e:
+                        result = ImportService._sheet_failure(sheet_conf, e)
+                    in_flight.popleft()
+                    yield result
+                return
+            except BrokenProcessPool as e:
+                print(f"[{datetime.utcnow()}] Sheet pool unavailable ({e}), processing remaining sheets sequentially.")
+                shutdown_sheet_pool()
+                remaining = [sheet_conf for sheet_conf, _ in in_flight] + remaining
+
+        for sheet_conf in remaining:
+            try:
+                result = map_sheet(file_path, file_type, partner_id, sheet_conf)
+            except Exception as e:
+                result = ImportService._sheet_failure(sheet_conf, e)
+            yield result
+
+    @staticmethod
+    def _sheet_failure(sheet_conf: Dict[str, Any], error: Exception) -> Dict[str, Any]:
+        """Résultat d'une feuille illisible : aucune ligne, une erreur rattachée à la feuille."""
+        sheet_name = sheet_conf.get("sheet_name")
+        print(f"[{datetime.utcnow()}] Sheet '{sheet_name}' failed: {error}")
+        return {
+            "rows": 0,
+            "quotes": [],
+            "errors": [{"sheet": sheet_name, "row": None, "error": f"Sheet processing failed: {error}"}],
+        }
+
+    @staticmethod
+    def _record_bracket(brackets: Dict[Tuple, List[Tuple[float, float, dict]]], data: dict, ref: dict):
+        """Ajoute la tranche de poids d'une ligne importée à sa série (mode + localisation origine/destination)."""
+        if data.get("weight_min") is None or data.get("weight_max") is None:
+            return
+        series = (
+            TransportMode(data["transport_mode"]).value,
+            DataNormalizer.country_code(data.get("origin_country")),
+            DataNormalizer.postal_key(data.get("origin_postal_code")),
+            DataNormalizer.city_key(data.get("origin_city")),
+            DataNormalizer.country_code(data.get("dest_country")),
+            DataNormalizer.postal_key(data.get("dest_postal_code")),
+            DataNormalizer.city_key(data.get("dest_city")),
+        )
+        brackets.setdefault(series, []).append((data["weight_min"], data["weight_max"], ref))
+
+    @staticmethod
+    def _bracket_warnings(brackets: Dict[Tuple, List[Tuple[float, float, dict]]]) -> List[dict]:
+        """Avertissements (job.warnings, hors error_count) pour les tranches qui se chevauchent ou laissent un trou."""
+        labels = {
+            "overlap": "Tranches de poids qui se chevauchent",
+            "gap": "Trou entre deux tranches de poids",
+        }
+        warnings = []
+        for series, intervals in brackets.items():
+            mode, origin_country, origin_cp, origin_city, dest_country, dest_cp, dest_city = series
+            lane = (
+                f"{mode} {origin_country} {origin_cp or origin_city or '*'}"
+                f" -> {dest_country} {dest_cp or dest_city or '*'}"
+            )
+            for anomaly in WeightIntervalTree.anomalies(intervals):
+                warnings.append({
+                    "warning": labels[anomaly["type"]],
+                    "lane": lane,
+                    "brackets": anomaly["brackets"],
+                    "rows": anomaly["refs"],
+                })
+        return warnings
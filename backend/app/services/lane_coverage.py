@@ -0,0 +1,180 @@
+"""
+Carte de couverture des voies : (mode, pays origine, pays destination) -> codes postaux desservis.
+
+Une recherche sur une voie qu'aucun tarif actif ne couvre renvoie forcément une liste vide :
+la carte permet de le savoir en mémoire, sans requête SQL (LANE_COVERAGE_ENABLED), et
+d'indiquer au formulaire de recherche les destinations possibles depuis une origine.
+
+La carte est volontairement large : une voie peut être déclarée couverte sans qu'aucun tarif
+ne corresponde finalement (poids, volume, validité, ville), jamais l'inverse. Origine et
+destination sont vérifiées indépendamment l'une de l'autre.
+
+Elle est construite une fois (DISTINCT sur partner_quotes) puis reconstruite après
+TARIFF_INDEX_TTL_SECONDS, à la fin d'un import ou à la création d'un tarif.
+"""
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from sqlalchemy.orm import Session
+
+from app.core.config import get_settings
+from app.models.partner_quote import PartnerQuote, TransportMode
+from app.schemas.matching import LaneCriteria
+from app.services.import_logic.data_normalizer import DataNormalizer
+from app.services.tariff_index import LaneKey
+
+settings = get_settings()
+
+
+class PostalCoverage:
+    """
+    Codes postaux desservis d'un côté d'une voie (origine ou destination).
+
+    covers(cp) reprend le prefix match bidirectionnel du matching en O(len(cp)) :
+    un code du tarif préfixe du code recherché ("06" pour "06200"), ou commençant par lui
+    ("223" pour "22"). Un tarif sans code postal (ville ou joker) couvre tout le côté.
+    """
+
+    __slots__ = ("keys", "prefixes", "any_postal_code")
+
+    def __init__(self):
+        self.keys: Set[str] = set()
+        # Tous les préfixes des codes desservis
+        self.prefixes: Set[str] = set()
+        self.any_postal_code = False
+
+    def add(self, postal_key: Optional[str]):
+        if postal_key is None:
+            self.any_postal_code = True
+            return
+        self.keys.add(postal_key)
+        self.prefixes.update(postal_key[:i] for i in range(1, len(postal_key) + 1))
+
+    def covers(self, postal_code: Optional[str]) -> bool:
+        cp_key = DataNormalizer.postal_key(postal_code)
+        if not cp_key or self.any_postal_code:
+            # Recherche par ville : le code postal ne permet pas de conclure
+            return True
+        return cp_key in self.prefixes or any(cp_key[:i] in self.keys for i in range(1, len(cp_key)))
+
+
+class LaneCoverage:
+    """Carte de couverture partagée par les requêtes d'un même worker."""
+
+    def __init__(self):
+        self._origins: Dict[LaneKey, PostalCoverage] = {}
+        self._destinations: Dict[LaneKey, PostalCoverage] = {}
+        self._built_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_stale(self) -> bool:
+        if self._built_at is None:
+            return True
+        return time.monotonic() - self._built_at > settings.tariff_index_ttl_seconds
+
+    def invalidate(self):
+        """Force une reconstruction à la prochaine utilisation."""
+        self._built_at = None
+
+    def ensure_fresh(self, db: Session):
+        """Même stratégie que TariffIndex.ensure_fresh : pas d'attente bloquante sur le verrou."""
+        if not self.is_stale:
+            return
+        if self._lock.acquire(blocking=False):
+            try:
+                if self.is_stale:
+                    self.load(*self._query_rows(db))
+            finally:
+                self._lock.release()
+        elif self._built_at is None:
+            # Jamais construite (ou invalidée) : une carte périmée pourrait écarter une voie couverte
+            self.load(*self._query_rows(db))
+
+    @staticmethod
+    def _query_rows(db: Session) -> List[List[Any]]:
+        """(mode, pays origine, pays destination, code postal) distincts des tarifs actifs, par côté."""
+        return [
+            db.query(
+                PartnerQuote.transport_mode.label("transport_mode"),
+                PartnerQuote.origin_country_code.label("origin_country"),
+                PartnerQuote.dest_country_code.label("dest_country"),
+                postal_key_column.label("postal_key"),
+            )
+            .filter(PartnerQuote.is_active == True)  # noqa: E712
+            .distinct()
+            .all()
+            for postal_key_column in (PartnerQuote.origin_postal_key, PartnerQuote.dest_postal_key)
+        ]
+
+    def load(self, origin_rows: Iterable[Any], dest_rows: Iterable[Any]):
+        """Construit la carte à partir de lignes (transport_mode, origin_country, dest_country, postal_key)."""
+        sides = []
+        for rows in (origin_rows, dest_rows):
+            coverage: Dict[LaneKey, PostalCoverage] = {}
+            for row in rows:
+                key = (TransportMode(row.transport_mode).value, row.origin_country, row.dest_country)
+                coverage.setdefault(key, PostalCoverage()).add(row.postal_key)
+            sides.append(coverage)
+
+        # Remplacement atomique : les requêtes en cours gardent l'ancienne version
+        self._origins, self._destinations = sides
+        self._built_at = time.monotonic()
+
+    @staticmethod
+    def _modes(criteria: LaneCriteria) -> List[str]:
+        if criteria.transport_mode:
+            return [TransportMode(criteria.transport_mode).value]
+        return [mode.value for mode in TransportMode]
+
+    def covers(self, criteria: LaneCriteria) -> bool:
+        """False si aucun tarif actif ne peut correspondre à la recherche (voie ou codes postaux)."""
+        origin_country = DataNormalizer.country_code(criteria.origin_country)
+        dest_country = DataNormalizer.country_code(criteria.dest_country)
+        for mode in self._modes(criteria):
+            key = (mode, origin_country, dest_country)
+            origins = self._origins.get(key)
+            if origins is None or not origins.covers(criteria.origin_postal_code):
+                continue
+            # Côtés lus par deux requêtes : une voie activée entre les deux peut n'avoir qu'une origine
+            destinations = self._destinations.get(key)
+            if destinations is not None and destinations.covers(criteria.dest_postal_code):
+                return True
+        return False
+
+    def destinations(
+        self,
+        origin_country: str,
+        origin_postal_code: Optional[str] = None,
+        transport_mode: Optional[TransportMode] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Pays de destination desservis depuis une origine, avec leurs codes postaux
+        (any_postal_code : au moins un tarif sans code postal, toute la destination est possible).
+        """
+        origin = DataNormalizer.country_code(origin_country)
+        modes = [TransportMode(transport_mode).value] if transport_mode else [mode.value for mode in TransportMode]
+        merged: Dict[str, PostalCoverage] = {}
+        for key, origins in self._origins.items():
+            mode, origin_key, dest_country = key
+            if mode not in modes or origin_key != origin or not origins.covers(origin_postal_code):
+                continue
+            destinations = self._destinations.get(key)
+            if destinations is None:
+                continue
+            coverage = merged.setdefault(dest_country, PostalCoverage())
+            coverage.keys |= destinations.keys
+            coverage.any_postal_code |= destinations.any_postal_code
+
+        return [
+            {
+                "country": country,
+                "any_postal_code": coverage.any_postal_code,
+                "postal_codes": sorted(coverage.keys),
+            }
+            for country, coverage in sorted(merged.items(), key=lambda item: item[0] or "")
+        ]
+
+
+lane_coverage = LaneCoverage()
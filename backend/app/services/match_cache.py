@@ -0,0 +1,128 @@
+"""
+Cache Redis des résultats de matching (MATCH_CACHE_ENABLED, désactivé par défaut).
+
+La clé combine la recherche normalisée, l'empreinte des "générations" de tarifs
+de tous les partenaires (hash Redis tariff_generation, {partner_id: compteur}),
+la version des suppléments chargés (surcharges.yaml) et celle de la normalisation
+des villes. Toute modification des tarifs d'un partenaire incrémente son compteur.
+
+L'invalidation est globale : la clé portant sur les générations de TOUS les partenaires,
+un import change la clé de toutes les recherches, y compris celles où le partenaire
+n'apparaît pas (les partenaires d'une recherche ne sont connus qu'après le matching,
+et un tarif ajouté peut faire apparaître un partenaire absent jusque-là). Les entrées
+calculées avant ne sont plus jamais relues et expirent via leur TTL.
+
+Le cache est best-effort : une indisponibilité de Redis équivaut à un cache miss.
+"""
+import hashlib
+import json
+import logging
+from typing import List, Optional
+
+import redis
+
+from app.core.config import get_settings
+from app.core.redis import get_redis
+from app.schemas.matching import QuoteSearchRequest, QuoteMatchResult
+from app.services.import_logic.data_normalizer import CITY_ABBREVIATIONS, CITY_KEY_VERSION
+from app.services.surcharge_rules import surcharge_engine
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+GENERATIONS_KEY = "tariff_generation"
+KEY_PREFIX = "match_cache"
+
+
+class MatchCache:
+    @staticmethod
+    def normalize_criteria(criteria: QuoteSearchRequest) -> dict:
+        """Forme canonique de la recherche (mêmes règles de casse que le matching)."""
+        def city(value: Optional[str]) -> Optional[str]:
+            return value.strip().upper() if value else None
+
+        def cp(value: Optional[str]) -> Optional[str]:
+            return str(value).strip() if value else None
+
+        return {
+            "origin_country": criteria.origin_country.upper(),
+            "origin_postal_code": cp(criteria.origin_postal_code),
+            "origin_city": city(criteria.origin_city),
+            "dest_country": criteria.dest_country.upper(),
+            "dest_postal_code": cp(criteria.dest_postal_code),
+            "dest_city": city(criteria.dest_city),
+            "weight": criteria.weight,
+            "volume": criteria.volume,
+            "transport_mode": criteria.transport_mode.value if criteria.transport_mode else None,
+            "shipping_date": criteria.shipping_date.isoformat(),
+            "ranked": criteria.is_ranked,
+            "limit": criteria.limit,
+            "offset": criteria.offset,
+        }
+
+    @staticmethod
+    def key_for(criteria: QuoteSearchRequest) -> Optional[str]:
+        """
+        Clé de cache de la recherche, ou None si le cache est désactivé / Redis indisponible.
+        La clé doit être calculée AVANT le matching pour ne jamais associer des résultats
+        à une génération plus récente que celle lue.
+        """
+        if not settings.match_cache_enabled:
+            return None
+        try:
+            generations = get_redis().hgetall(GENERATIONS_KEY)
+        except redis.RedisError as e:
+            logger.warning(f"Match cache unavailable: {e}")
+            return None
+        return MatchCache._build_key(criteria, generations)
+
+    @staticmethod
+    def get(key: Optional[str]) -> Optional[List[QuoteMatchResult]]:
+        if not key:
+            return None
+        try:
+            cached = get_redis().get(key)
+        except redis.RedisError as e:
+            logger.warning(f"Match cache read failed: {e}")
+            return None
+        return MatchCache._decode(cached)
+
+    @staticmethod
+    def set(key: Optional[str], results: List[QuoteMatchResult]):
+        if not key:
+            return
+        try:
+            get_redis().setex(key, settings.match_cache_ttl_seconds, MatchCache._encode(results))
+        except redis.RedisError as e:
+            logger.warning(f"Match cache write failed: {e}")
+
+    @staticmethod
+    def _build_key(criteria: QuoteSearchRequest, generations: dict) -> str:
+        payload = json.dumps(
+            {
+                "criteria": MatchCache.normalize_criteria(criteria),
+                "generations": sorted(generations.items()),
+                "surcharges": surcharge_engine.version,
+                "cities": [CITY_KEY_VERSION, sorted(CITY_ABBREVIATIONS.items())],
+            },
+            sort_keys=True,
+        )
+        return f"{KEY_PREFIX}:{hashlib.sha256(payload.encode()).hexdigest()}"
+
+    @staticmethod
+    def _encode(results: List[QuoteMatchResult]) -> str:
+        return json.dumps([result.model_dump(mode="json") for result in results])
+
+    @staticmethod
+    def _decode(cached: Optional[str]) -> Optional[List[QuoteMatchResult]]:
+        if cached is None:
+            return None
+        return [QuoteMatchResult.model_validate(item) for item in json.loads(cached)]
+
+    @staticmethod
+    def bump_partner(partner_id: str):
+        """Invalide les résultats en cache impliquant potentiellement ce partenaire."""
+        try:
+            get_redis().hincrby(GENERATIONS_KEY, partner_id, 1)
+        except redis.RedisError as e:
+            logger.warning(f"Tariff generation bump failed for partner {partner_id}: {e}")
@@ -1,135 +1,677 @@
-from typing import List
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, cast, Date, literal
-from app.models.partner_quote import PartnerQuote
-from app.schemas.matching import QuoteSearchRequest, PriceBreakdown
+import math
+from datetime import date, datetime, time, timedelta
+import numpy as np
+from itertools import islice
+from typing import Dict, Iterator, List, Optional, Tuple
+from sqlalchemy.orm import Session, Query
+from decimal import Decimal
+from sqlalchemy import and_, or_, case, func, literal, Numeric, Row
+from app.core.config import get_settings
+from app.core.metrics import StageTimer
+from app.models.partner import Partner
+from app.models.partner_quote import PartnerQuote, TransportMode, volume_range
+from app.schemas.matching import (
+    LaneCriteria, QuoteSearchRequest, QuoteMatchResult, PriceBreakdown,
+    RateCurveRequest, RateCurveResponse, PartnerRateCurve,
+)
+from app.schemas.partner import PartnerResponse
+from app.schemas.partner_quote import PartnerQuoteResponse
+from app.services.import_logic.data_normalizer import DataNormalizer
+from app.services.lane_coverage import lane_coverage
+from app.services.surcharge_rules import SurchargeAmounts, round_half_up, surcharge_engine
+from app.services.tariff_index import LaneIndex, TariffEntry, tariff_index
+
+settings = get_settings()
+
+# Clés de localisation : suppléments par ville et TariffEntry de la recherche groupée
+ENTRY_COLUMNS = (
+    PartnerQuote.origin_postal_key, PartnerQuote.origin_city_key,
+    PartnerQuote.dest_postal_key, PartnerQuote.dest_city_key,
+)
+# Colonnes sélectionnées pour les résultats (sans instances ORM) : champs de
+# QuoteMatchResult, partenaire compris via une jointure, puis clés de localisation
+QUOTE_FIELDS = tuple(name for name in PartnerQuoteResponse.model_fields if name != "partner")
+PARTNER_FIELDS = tuple(PartnerResponse.model_fields)
+RESULT_COLUMNS = (
+    [getattr(PartnerQuote, name) for name in QUOTE_FIELDS]
+    + [getattr(Partner, name).label(f"partner__{name}") for name in PARTNER_FIELDS]
+    + list(ENTRY_COLUMNS)
+)
 
 class MatchingService:
     @staticmethod
-    def search_quotes(db: Session, criteria: QuoteSearchRequest) -> List[PartnerQuote]:
-        query = db.query(PartnerQuote)
+    def search_quotes(db: Session, criteria: QuoteSearchRequest, timer: Optional[StageTimer] = None) -> List[QuoteMatchResult]:
+        """timer : chronométrage optionnel des étapes (sql, index, filter, pricing) et des volumes."""
+        timer = timer or StageTimer(enabled=False)
+        criteria = MatchingService._prepare_criteria(db, criteria)
+        with timer.stage("coverage"):
+            uncovered = MatchingService._is_uncovered(db, criteria)
+        if uncovered:
+            timer.count("results", 0)
+            return []
+
+        if settings.tariff_index_enabled:
+            # Index mémoire : voie, localisation, poids et validité déjà vérifiés
+            entries = MatchingService._index_entries(db, criteria, timer)
+            with timer.stage("sql"):
+                potential_quotes = MatchingService._load_rows(db, entries)
+        else:
+            query = MatchingService._search_query(db, criteria)
+            with timer.stage("sql"):
+                potential_quotes = query.all()
+            timer.count("candidates", len(potential_quotes))
+            timer.count("filtered_out", 0)
+
+        with timer.stage("pricing"):
+            results = MatchingService._build_results(potential_quotes, criteria)
+        timer.count("results", len(results))
+        return results
+
+    @staticmethod
+    def iter_quotes(db: Session, criteria: QuoteSearchRequest, chunk_size: int = 500) -> Iterator[QuoteMatchResult]:
+        """
+        Variante en flux de search_quotes (réponse NDJSON) : les lignes sont lues par
+        paquets via un curseur serveur puis tarifées paquet par paquet.
+        """
+        criteria = MatchingService._prepare_criteria(db, criteria)
+        if MatchingService._is_uncovered(db, criteria):
+            return
+        if settings.tariff_index_enabled:
+            entries = MatchingService._index_entries(db, criteria, StageTimer(enabled=False))
+            for start in range(0, len(entries), chunk_size):
+                rows = MatchingService._load_rows(db, entries[start:start + chunk_size])
+                yield from MatchingService._build_results(rows, criteria)
+            return
+
+        rows = iter(MatchingService._search_query(db, criteria).yield_per(chunk_size))
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                return
+            yield from MatchingService._build_results(chunk, criteria)
+
+    @staticmethod
+    def _search_query(db: Session, criteria: QuoteSearchRequest) -> Query:
+        """Requête SQL des résultats, classée et paginée si demandé."""
+        # Le pré-filtre SQL est exact (localisation comprise) : pas de filtrage Python
+        query = MatchingService._build_candidate_query(db, criteria)
+        if criteria.is_ranked:
+            # Top-K : la base calcule le prix et ne renvoie que les K moins chers
+            query = (
+                query.order_by(MatchingService._price_expression(criteria), PartnerQuote.id)
+                .offset(criteria.offset)
+                .limit(criteria.limit)
+            )
+        return query
+
+    @staticmethod
+    def search_quotes_batch(db: Session, criteria_list: List[QuoteSearchRequest]) -> List[List[QuoteMatchResult]]:
+        """
+        Recherche groupée : une liste de résultats par critère, dans l'ordre d'entrée.
+        Les critères sont regroupés par voie (mode, pays origine, pays destination) :
+        une seule requête SQL par voie, puis sélection en mémoire pour chaque envoi.
+        """
+        criteria_list = [MatchingService._prepare_criteria(db, criteria) for criteria in criteria_list]
+        entries_per_search: List[List[TariffEntry]] = [[] for _ in criteria_list]
+        quotes_by_id: Dict[str, Row] = {}
+        # Envois sur une voie non desservie : liste vide, sans requête
+        searched = [i for i, criteria in enumerate(criteria_list) if not MatchingService._is_uncovered(db, criteria)]
+
+        if settings.tariff_index_enabled:
+            tariff_index.ensure_fresh(db)
+            for i in searched:
+                criteria = criteria_list[i]
+                search_keys = MatchingService._search_keys(criteria)
+                entries_per_search[i] = [
+                    entry for entry in tariff_index.lookup(criteria)
+                    if MatchingService._is_quote_location_match(search_keys, entry)
+                ]
+            ids = {entry.id for entries in entries_per_search for entry in entries}
+            if ids:
+                quotes_by_id = {row.id: row for row in MatchingService._result_query(db).filter(PartnerQuote.id.in_(ids))}
+        else:
+            lanes: Dict[Tuple, List[int]] = {}
+            for i in searched:
+                criteria = criteria_list[i]
+                lane_key = (
+                    criteria.transport_mode,
+                    DataNormalizer.country_code(criteria.origin_country),
+                    DataNormalizer.country_code(criteria.dest_country),
+                )
+                lanes.setdefault(lane_key, []).append(i)
+
+            for (transport_mode, origin_country, dest_country), indexes in lanes.items():
+                group = [criteria_list[i] for i in indexes]
+                taxable_weights = [w for c in group for w in c.taxable_weights().values()]
+                query = MatchingService._result_query(db).filter(
+                    PartnerQuote.origin_country_code == origin_country,
+                    PartnerQuote.dest_country_code == dest_country,
+                    # Enveloppe des poids taxables du groupe (affinée par envoi dans LaneIndex)
+                    PartnerQuote.weight_min <= max(taxable_weights),
+                    PartnerQuote.weight_max >= min(taxable_weights),
+                    # Idem pour les dates d'expédition
+                    PartnerQuote.is_active == True,  # noqa: E712
+                    MatchingService._validity_filter(
+                        min(c.shipping_date for c in group), max(c.shipping_date for c in group)
+                    ),
+                )
+                if transport_mode:
+                    query = query.filter(PartnerQuote.transport_mode == transport_mode)
+
+                # Une LaneIndex par mode : le poids taxable dépend du mode
+                entries_by_mode: Dict[str, List[TariffEntry]] = {}
+                for row in query.all():
+                    quotes_by_id[row.id] = row
+                    entry = TariffEntry(row)
+                    entries_by_mode.setdefault(entry.transport_mode, []).append(entry)
+                mode_lanes = {mode: LaneIndex(entries) for mode, entries in entries_by_mode.items()}
+                for i, criteria in zip(indexes, group):
+                    search_keys = MatchingService._search_keys(criteria)
+                    entries_per_search[i] = [
+                        entry
+                        for mode, weight in criteria.taxable_weights().items() if mode in mode_lanes
+                        for entry in mode_lanes[mode].lookup(criteria, weight)
+                        if MatchingService._is_quote_location_match(search_keys, entry)
+                    ]
+
+        results: List[List[QuoteMatchResult]] = []
+        for criteria, entries in zip(criteria_list, entries_per_search):
+            if criteria.is_ranked:
+                entries = MatchingService._rank(entries, criteria)
+            # Un même tarif peut servir plusieurs envois : résultat distinct par envoi
+            rows = [quotes_by_id[entry.id] for entry in entries if entry.id in quotes_by_id]
+            results.append(MatchingService._build_results(rows, criteria))
+        return results
+
+    @staticmethod
+    def rate_curve(db: Session, request: RateCurveRequest) -> RateCurveResponse:
+        """
+        Grille de prix d'une voie : une seule requête pour tous les poids demandés
+        (ou la borne haute de chaque tranche), puis tarification NumPy par poids.
+        Pour chaque partenaire et chaque poids, le tarif le moins cher est retenu.
+        """
+        request = MatchingService._prepare_criteria(db, request)
+        if MatchingService._is_uncovered(db, request):
+            return RateCurveResponse(weights=sorted(set(request.weights or [])), partners=[])
+        query = MatchingService._build_lane_query(db, request).filter(
+            PartnerQuote.weight_min.isnot(None),
+            PartnerQuote.weight_max.isnot(None),
+        )
+        if request.weights:
+            query = query.filter(
+                PartnerQuote.weight_min <= max(request.weights),
+                PartnerQuote.weight_max >= min(request.weights),
+            )
+        rows = query.all()
+
+        if request.weights:
+            weights = sorted(set(request.weights))
+        else:
+            weights = sorted({row.weight_max for row in rows})
+
+        # Ligne de la matrice de chaque tarif
+        curves: List[PartnerRateCurve] = []
+        curve_by_partner: Dict[str, PartnerRateCurve] = {}
+        row_curves: List[PartnerRateCurve] = []
+        for row in rows:
+            curve = curve_by_partner.get(row.partner_id)
+            if curve is None:
+                curve = curve_by_partner[row.partner_id] = PartnerRateCurve(
+                    partner_id=row.partner_id,
+                    partner_code=row.partner__code,
+                    partner_name=row.partner__name,
+                    prices=[None] * len(weights),
+                    quote_ids=[None] * len(weights),
+                )
+                curves.append(curve)
+            row_curves.append(curve)
+
+        costs = np.fromiter((float(row.cost) for row in rows), dtype=float, count=len(rows))
+        pricing_types = np.array([row.pricing_type for row in rows], dtype=object)
+        partner_ids = np.array([row.partner_id for row in rows], dtype=object)
+        origin_city_keys = np.array([row.origin_city_key for row in rows], dtype=object)
+        dest_city_keys = np.array([row.dest_city_key for row in rows], dtype=object)
+        weight_mins = np.fromiter((row.weight_min for row in rows), dtype=float, count=len(rows))
+        weight_maxs = np.fromiter((row.weight_max for row in rows), dtype=float, count=len(rows))
+
+        for j, weight in enumerate(weights):
+            covered = np.flatnonzero((weight_mins <= weight) & (weight_maxs >= weight))
+            if not covered.size:
+                continue
+            # Mêmes règles de tarification que search_quotes (suppléments compris)
+            _, base_costs = MatchingService._price_vector(costs[covered], pricing_types[covered], weight)
+            amounts = surcharge_engine.apply(
+                request, weight, partner_ids[covered],
+                origin_city_keys[covered], dest_city_keys[covered], base_costs,
+            )
+            for i, price in zip(covered, amounts.total.tolist()):
+                curve = row_curves[i]
+                if curve.prices[j] is None or price < curve.prices[j]:
+                    curve.prices[j] = price
+                    curve.quote_ids[j] = rows[i].id
+
+        curves.sort(key=lambda curve: curve.partner_code)
+        return RateCurveResponse(weights=weights, partners=curves)
+
+    @staticmethod
+    def _result_query(db: Session, *extra_columns) -> Query:
+        """Requête des colonnes de résultat (tuples, pas d'instances ORM ni d'identity map)."""
+        return db.query(*RESULT_COLUMNS, *extra_columns).join(Partner, Partner.id == PartnerQuote.partner_id)
+
+    @staticmethod
+    def _build_results(rows: List[Row], criteria: QuoteSearchRequest) -> List[QuoteMatchResult]:
+        """Tarification vectorisée puis construction directe des résultats (données issues de la base, déjà valides)."""
+        taxable_weights, billable_weights, base_costs, amounts = MatchingService._price_totals(rows, criteria)
+
+        quote_count = len(QUOTE_FIELDS)
+        partner_end = quote_count + len(PARTNER_FIELDS)
+        results = []
+        for i, row in enumerate(rows):
+            breakdown = MatchingService._build_breakdown(
+                row.cost, row.pricing_type, criteria.weight, billable_weights[i], base_costs[i], amounts, i,
+                taxable_weight=taxable_weights[i] if criteria.volume is not None else None,
+            )
+            values = dict(zip(QUOTE_FIELDS, row[:quote_count]))
+            # 'cost' porte le prix total calculé pour la réponse
+            values["cost"] = Decimal(str(breakdown.total))
+            values["partner"] = PartnerResponse.model_construct(**dict(zip(PARTNER_FIELDS, row[quote_count:partner_end])))
+            results.append(QuoteMatchResult.model_construct(**values, price_breakdown=breakdown))
+        return results
+
+    @staticmethod
+    def _price_quotes(quotes: List, weight) -> Tuple[np.ndarray, np.ndarray]:
+        """Poids facturable et coût de base de tous les candidats (voir _price_vector)."""
+        costs = np.fromiter((float(q.cost) for q in quotes), dtype=float, count=len(quotes))
+        pricing_types = np.array([q.pricing_type for q in quotes], dtype=object)
+        return MatchingService._price_vector(costs, pricing_types, weight)
+
+    @staticmethod
+    def _taxable_weights(quotes: List, criteria: QuoteSearchRequest) -> np.ndarray:
+        """Poids taxable de chaque candidat : le ratio volumétrique dépend de son mode de transport."""
+        if criteria.volume is None:
+            return np.full(len(quotes), float(criteria.weight))
+        weights = criteria.taxable_weights()
+        return np.fromiter(
+            (weights[TransportMode(q.transport_mode).value] for q in quotes), dtype=float, count=len(quotes)
+        )
+
+    @staticmethod
+    def _price_totals(quotes: List, criteria: QuoteSearchRequest) -> Tuple[np.ndarray, np.ndarray, np.ndarray, SurchargeAmounts]:
+        """
+        Poids taxable, poids facturable, coût de base et suppléments (manutention, carburant) de tous
+        les candidats, en une passe : les candidats portent leur mode, partner_id et les clés de ville
+        (lignes ou TariffEntry). Le prix de base suit le poids taxable, la manutention le poids réel.
+        """
+        weight = MatchingService._taxable_weights(quotes, criteria)
+        billable_weights, base_costs = MatchingService._price_quotes(quotes, weight)
+        amounts = surcharge_engine.apply(
+            criteria,
+            criteria.weight,
+            np.array([q.partner_id for q in quotes], dtype=object),
+            np.array([q.origin_city_key for q in quotes], dtype=object),
+            np.array([q.dest_city_key for q in quotes], dtype=object),
+            base_costs,
+        )
+        return weight, billable_weights, base_costs, amounts
+
+    @staticmethod
+    def _price_vector(costs: np.ndarray, pricing_types: np.ndarray, weight) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Tarification en une passe NumPy :
+        - PER_100KG : arrondi au 100 kg supérieur, prix × nombre de tranches de 100 kg
+        - PER_KG    : prix × poids taxable
+        - LUMPSUM (et types inconnus) : forfait
+        weight : poids taxable, commun (scalaire) ou par candidat (tableau).
+        """
+        per_100kg = pricing_types == 'PER_100KG'
+        per_kg = pricing_types == 'PER_KG'
+
+        billable_100kg = np.ceil(np.asarray(weight, dtype=float) / 100) * 100
+        billable_weights = np.where(per_100kg, billable_100kg, weight)
+        multipliers = np.where(per_100kg, billable_100kg / 100, np.where(per_kg, weight, 1.0))
+        base_costs = round_half_up(costs * multipliers)
+        return billable_weights, base_costs
+
+    @staticmethod
+    def _price_expression(criteria: QuoteSearchRequest):
+        """
+        Prix total en SQL, identique à _price_totals (sert au tri Top-K côté base).
+        Les types inconnus sont traités comme un forfait.
+        """
+        weights = criteria.taxable_weights()
+        if len(set(weights.values())) == 1:
+            weight = next(iter(weights.values()))
+            weight_value = literal(Decimal(str(weight)), Numeric)
+            units_100kg = math.ceil(weight / 100)
+        else:
+            # Volume renseigné sans mode : poids taxable selon le mode du tarif
+            weight_value = case(*[
+                (PartnerQuote.transport_mode == TransportMode(mode), literal(Decimal(str(weight)), Numeric))
+                for mode, weight in weights.items()
+            ])
+            units_100kg = case(*[
+                (PartnerQuote.transport_mode == TransportMode(mode), math.ceil(weight / 100))
+                for mode, weight in weights.items()
+            ])
+        base_cost = func.round(
+            case(
+                (PartnerQuote.pricing_type == 'PER_100KG', PartnerQuote.cost * units_100kg),
+                (PartnerQuote.pricing_type == 'PER_KG', PartnerQuote.cost * weight_value),
+                else_=PartnerQuote.cost,
+            ),
+            2,
+        )
+        # Manutention au poids réel, prix de base au poids taxable
+        return surcharge_engine.sql_total(criteria, math.ceil(criteria.weight / 100), base_cost)
+
+    @staticmethod
+    def _rank(entries: List[TariffEntry], criteria: QuoteSearchRequest) -> List[TariffEntry]:
+        """Tri par prix croissant (puis id, comme en SQL) et pagination, en mémoire."""
+        _, _, _, amounts = MatchingService._price_totals(entries, criteria)
+        totals = amounts.total
+        order = sorted(range(len(entries)), key=lambda i: (totals[i], entries[i].id))
+        end = criteria.offset + criteria.limit if criteria.limit is not None else None
+        return [entries[i] for i in order[criteria.offset:end]]
+
+    @staticmethod
+    def _build_breakdown(
+        cost, pricing_type: str, actual_weight: float, billable_weight: float, base_cost: float,
+        amounts: Optional[SurchargeAmounts] = None, index: int = 0, taxable_weight: Optional[float] = None,
+    ) -> PriceBreakdown:
+        """
+        Détail lisible d'un prix déjà calculé ; construit uniquement pour les résultats renvoyés.
+        amounts[index] : suppléments du candidat (cf. _price_totals).
+        taxable_weight : poids taxable si un volume est renseigné (sinon le poids réel).
+        """
+        unit_price = float(cost)
+        billable_weight = float(billable_weight)
+        base_cost = float(base_cost)
+
+        if pricing_type == 'PER_100KG':
+            units = int(billable_weight / 100)
+            formula = f"{unit_price:.2f} × {units} = {base_cost:.2f} €"
+        elif pricing_type == 'PER_KG':
+            priced_weight = taxable_weight if taxable_weight is not None else actual_weight
+            formula = f"{unit_price:.2f} × {priced_weight:.0f} = {base_cost:.2f} €"
+        elif pricing_type == 'LUMPSUM':
+            formula = f"Forfait = {base_cost:.2f} €"
+        else:
+            formula = f"{base_cost:.2f} €"
+
+        handling_melzo = handling_local = fuel_pct = fuel_amount = 0.0
+        total = base_cost
+        if amounts is not None:
+            handling_melzo = float(amounts.handling_melzo[index])
+            handling_local = float(amounts.handling_local[index])
+            fuel_pct = float(amounts.fuel_pct[index])
+            fuel_amount = float(amounts.fuel_amount[index])
+            total = float(amounts.total[index])
+            if handling_melzo:
+                formula += f" + manutention {handling_melzo:.2f} €"
+            if handling_local:
+                formula += f" + manutention locale {handling_local:.2f} €"
+            if fuel_pct:
+                formula += f" + carburant {fuel_pct:g}% {fuel_amount:.2f} €"
+            if total != base_cost:
+                formula += f" = {total:.2f} €"
+
+        return PriceBreakdown(
+            pricing_type=pricing_type,
+            unit_price=unit_price,
+            actual_weight=actual_weight,
+            billable_weight=billable_weight,
+            taxable_weight=float(taxable_weight) if taxable_weight is not None else None,
+            base_cost=base_cost,
+            handling_melzo=handling_melzo,
+            handling_local=handling_local,
+            fuel_surcharge_pct=fuel_pct,
+            fuel_surcharge_amount=fuel_amount,
+            total=round(total, 2),
+            formula=formula,
+        )
+
+    @staticmethod
+    def _index_entries(db: Session, criteria: QuoteSearchRequest, timer: StageTimer) -> List[TariffEntry]:
+        """Sélectionne (et classe si demandé) les candidats via l'index mémoire."""
+        with timer.stage("index"):
+            tariff_index.ensure_fresh(db)
+            candidates = tariff_index.lookup(criteria)
+        timer.count("candidates", len(candidates))
+
+        with timer.stage("filter"):
+            search_keys = MatchingService._search_keys(criteria)
+            entries = [
+                entry for entry in candidates
+                if MatchingService._is_quote_location_match(search_keys, entry)
+            ]
+        timer.count("filtered_out", len(candidates) - len(entries))
+
+        if criteria.is_ranked:
+            # Top-K sur l'index : seules les K lignes retenues sont chargées
+            with timer.stage("ranking"):
+                entries = MatchingService._rank(entries, criteria)
+        return entries
+
+    @staticmethod
+    def _load_rows(db: Session, entries: List[TariffEntry]) -> List[Row]:
+        """Charge les lignes de résultat des entrées d'index par clé primaire, dans l'ordre des entrées."""
+        if not entries:
+            return []
+        # Les tarifs supprimés depuis la construction de l'index disparaissent ici
+        positions = {entry.id: i for i, entry in enumerate(entries)}
+        rows = MatchingService._result_query(db).filter(PartnerQuote.id.in_(list(positions))).all()
+        rows.sort(key=lambda row: positions[row.id])
+        return rows
+
+    @staticmethod
+    def _prepare_criteria(db: Session, criteria: LaneCriteria) -> LaneCriteria:
+        """
+        Règles de suppléments à jour, et villes recherchées remplacées par leur clé normalisée
+        ("St Étienne" -> "SAINT ETIENNE"). Une ville inconnue n'est pas corrigée : la ville proche
+        est seulement proposée (CityService.closest_city).
+        """
+        surcharge_engine.ensure_fresh(db)
+        if not criteria.origin_city and not criteria.dest_city:
+            return criteria
+        return criteria.model_copy(update={
+            "origin_city": DataNormalizer.city_key(criteria.origin_city),
+            "dest_city": DataNormalizer.city_key(criteria.dest_city),
+        })
+
+    @staticmethod
+    def _is_uncovered(db: Session, criteria: LaneCriteria) -> bool:
+        """Aucun tarif actif ne dessert la voie ni les codes postaux recherchés (LANE_COVERAGE_ENABLED)."""
+        if not settings.lane_coverage_enabled:
+            return False
+        lane_coverage.ensure_fresh(db)
+        return not lane_coverage.covers(criteria)
+
+    @staticmethod
+    def _search_keys(criteria: QuoteSearchRequest) -> Tuple[Optional[str], Optional[str], Optional[str], Optional[str]]:
+        """Clés normalisées de la recherche (origin_cp, origin_city, dest_cp, dest_city), calculées une fois."""
+        return (
+            DataNormalizer.postal_key(criteria.origin_postal_code),
+            DataNormalizer.city_key(criteria.origin_city),
+            DataNormalizer.postal_key(criteria.dest_postal_code),
+            DataNormalizer.city_key(criteria.dest_city),
+        )
+
+    @staticmethod
+    def _is_quote_location_match(search_keys: Tuple, quote) -> bool:
+        """
+        Origine ET destination compatibles (accepte un PartnerQuote ou une TariffEntry).
+        Les candidats proviennent toujours du pré-filtre CP (SQL ou trie) : le prefix match est acquis.
+        """
+        origin_cp, origin_city, dest_cp, dest_city = search_keys
+        return (
+            MatchingService._is_location_key_match(
+                origin_cp, origin_city, quote.origin_postal_key, quote.origin_city_key, cp_prematched=True
+            )
+            and MatchingService._is_location_key_match(
+                dest_cp, dest_city, quote.dest_postal_key, quote.dest_city_key, cp_prematched=True
+            )
+        )
+
+    @staticmethod
+    def _build_candidate_query(db: Session, criteria: QuoteSearchRequest) -> Query:
+        """Pré-filtre SQL : mode, pays, code postal, poids taxable, volume et validité."""
+        query = MatchingService._build_lane_query(db, criteria)
+
+        # 3. Filtre par Poids taxable (Range) : un poids par mode si un volume est renseigné
+        query = query.filter(MatchingService._weight_filter(criteria))
+
+        # 3b. Filtre par tranche de Volume (ix_partner_quotes_volume_range, bornes NULL ouvertes)
+        if criteria.volume is not None:
+            query = query.filter(MatchingService._volume_filter(criteria.volume))
+        
+        return query
+
+    @staticmethod
+    def _weight_filter(criteria: QuoteSearchRequest, model=PartnerQuote):
+        """Tranche de poids contenant le poids taxable, regroupé par mode s'il en dépend (model : PartnerQuote ou LaneBestPrice)."""
+        modes_by_weight: Dict[float, List[str]] = {}
+        for mode, weight in criteria.taxable_weights().items():
+            modes_by_weight.setdefault(weight, []).append(mode)
+        if len(modes_by_weight) == 1:
+            (weight,) = modes_by_weight
+            return and_(model.weight_min <= weight, model.weight_max >= weight)
+        return or_(*[
+            and_(
+                # Valeurs de TransportMode : acceptées par l'enum de PartnerQuote comme par le texte de LaneBestPrice
+                model.transport_mode.in_(modes),
+                model.weight_min <= weight,
+                model.weight_max >= weight,
+            )
+            for weight, modes in modes_by_weight.items()
+        ])
+
+    @staticmethod
+    def _volume_filter(volume: float):
+        return volume_range(PartnerQuote.volume_min, PartnerQuote.volume_max).op("@>")(
+            literal(Decimal(str(volume)), Numeric)
+        )
+
+    @staticmethod
+    def _build_lane_query(db: Session, criteria: LaneCriteria, *extra_columns) -> Query:
+        """Tarifs de la voie (mode, pays, localisation) actifs et valides, tous poids confondus."""
+        query = MatchingService._result_query(db, *extra_columns)
         
         # 1. Filtre par mode de transport (si spécifié)
         if criteria.transport_mode:
             query = query.filter(PartnerQuote.transport_mode == criteria.transport_mode)
             
-        # 2. Filtre par Pays (Correspondance exacte)
-        # Note: Idéalement normaliser les codes pays (ISO) en amont
+        # 2. Filtre par Pays (Correspondance exacte sur les codes normalisés, indexable)
         query = query.filter(
-            PartnerQuote.origin_country.ilike(criteria.origin_country),
-            PartnerQuote.dest_country.ilike(criteria.dest_country)
+            PartnerQuote.origin_country_code == DataNormalizer.country_code(criteria.origin_country),
+            PartnerQuote.dest_country_code == DataNormalizer.country_code(criteria.dest_country)
         )
 
-        # 2b. Pré-filtre SQL: Code Postal (prefix match bidirectionnel)
+        # 2b. Pré-filtre SQL: Localisation (exact, cf. _is_location_key_match)
         # Le CP recherché peut commencer par le CP du devis ou l'inverse
         # Ex: recherche "223" matche devis "223" ; recherche "06200" matche devis "06"
-        if criteria.origin_postal_code:
-             search_origin = str(criteria.origin_postal_code).strip()
-             query = query.filter(
-                 or_(
-                     PartnerQuote.origin_postal_code.startswith(search_origin),
-                     literal(search_origin).like(PartnerQuote.origin_postal_code + '%'),
-                     PartnerQuote.origin_postal_code.is_(None)
-                 )
-             )
-
-        if criteria.dest_postal_code:
-             search_dest = str(criteria.dest_postal_code).strip()
-             query = query.filter(
-                 or_(
-                     PartnerQuote.dest_postal_code.startswith(search_dest),
-                     literal(search_dest).like(PartnerQuote.dest_postal_code + '%'),
-                     PartnerQuote.dest_postal_code.is_(None)
-                 )
-             )
-        
-        # 3. Filtre par Poids (Range)
+        # Sans CP recherché : ville identique, "ALL", ou devis sans CP ni ville
         query = query.filter(
-            PartnerQuote.weight_min <= criteria.weight,
-            PartnerQuote.weight_max >= criteria.weight
+            MatchingService._location_filter(
+                PartnerQuote.origin_postal_key, PartnerQuote.origin_city_key,
+                criteria.origin_postal_code, criteria.origin_city
+            ),
+            MatchingService._location_filter(
+                PartnerQuote.dest_postal_key, PartnerQuote.dest_city_key,
+                criteria.dest_postal_code, criteria.dest_city
+            )
         )
         
-        # 4. Filtre par Date de validité (Comparaison sur la DATE uniquement, sans l'heure)
+        # 4. Tarifs actifs et valides à la date d'expédition (ix_partner_quotes_lane_validity)
         query = query.filter(
-            or_(cast(PartnerQuote.valid_from, Date) <= criteria.shipping_date, PartnerQuote.valid_from.is_(None)),
-            or_(cast(PartnerQuote.valid_until, Date) >= criteria.shipping_date, PartnerQuote.valid_until.is_(None))
+            PartnerQuote.is_active == True,  # noqa: E712 (prédicat de l'index partiel)
+            MatchingService._validity_filter(criteria.shipping_date, criteria.shipping_date)
         )
         
-        # Exécution de la requête de base
-        potential_quotes = query.all()
-        
-        # 5. Filtrage fin en Python (Codes Postaux OU Ville) ET Calcul du prix
-        matched_quotes = []
-        
-        # Import local pour éviter les cycles si nécessaire, sinon utiliser Math
-        import math
+        return query
 
-        for quote in potential_quotes:
-            valid_origin = MatchingService._is_location_match(
-                criteria.origin_postal_code, criteria.origin_city,
-                quote.origin_postal_code, quote.origin_city
-            )
-            valid_dest = MatchingService._is_location_match(
-                criteria.dest_postal_code, criteria.dest_city,
-                quote.dest_postal_code, quote.dest_city
-            )
-            
-            if valid_origin and valid_dest:
-                # CLONE the quote to avoid modifying the DB session object directly, 
-                # or ensure Pydantic serialization happens from a dict/copy.
-                # Actually, sqlalchemy objects are mutable. Modifying them might dirty the session.
-                # Safer to construct a response dictionary or let Pydantic handle it, 
-                # BUT we need to override 'cost' with 'total_price'.
-                # Let's assign the calculated price to 'cost' on the object BUT detach it first or accept it's a Transient object if query didn't lock.
-                # Better: Create a copy/dict.
-                
-                # Logic Calcul
-                unit_price = float(quote.cost)
-                pricing_type = getattr(quote, 'pricing_type', 'PER_100KG')
-                actual_weight = criteria.weight
-                billable_weight = actual_weight
-
-                if pricing_type == 'PER_100KG':
-                    billable_weight = math.ceil(actual_weight / 100) * 100
-                    units = int(billable_weight / 100)
-                    base_cost = round(unit_price * units, 2)
-                    formula = f"{unit_price:.2f} × {units} = {base_cost:.2f} €"
-                elif pricing_type == 'PER_KG':
-                    billable_weight = actual_weight
-                    base_cost = round(unit_price * actual_weight, 2)
-                    formula = f"{unit_price:.2f} × {actual_weight:.0f} = {base_cost:.2f} €"
-                elif pricing_type == 'LUMPSUM':
-                    billable_weight = actual_weight
-                    base_cost = round(unit_price, 2)
-                    formula = f"Forfait = {base_cost:.2f} €"
-                else:
-                    base_cost = round(unit_price, 2)
-                    formula = f"{base_cost:.2f} €"
-
-                total = base_cost
-
-                breakdown = PriceBreakdown(
-                    pricing_type=pricing_type,
-                    unit_price=unit_price,
-                    actual_weight=actual_weight,
-                    billable_weight=billable_weight,
-                    base_cost=base_cost,
-                    total=total,
-                    formula=formula,
-                )
+    @staticmethod
+    def _validity_filter(first_date: date, last_date: date, model=PartnerQuote):
+        """
+        Tarifs valides à au moins une date de [first_date, last_date] (model : PartnerQuote ou LaneBestPrice).
+        La comparaison porte sur la DATE uniquement (sans l'heure), exprimée en bornes
+        de timestamp pour rester indexable :
+        - valid_from::date  <= last_date   <=>  valid_from  <  last_date + 1 jour
+        - valid_until::date >= first_date  <=>  valid_until >= first_date 00:00
+        """
+        starts_before = datetime.combine(last_date + timedelta(days=1), time.min)
+        ends_after = datetime.combine(first_date, time.min)
+        return and_(
+            or_(model.valid_from < starts_before, model.valid_from.is_(None)),
+            or_(model.valid_until >= ends_after, model.valid_until.is_(None))
+        )
+
+    @staticmethod
+    def _postal_prefix_filter(column, search_cp: str):
+        """
+        Prefix match bidirectionnel indexable (cf. ix_partner_quotes_*_postal_key).
+        - CP du devis préfixe du CP recherché : expansion en liste ("06200" -> "0", "06", ..., "06200")
+        - CP du devis commençant par le CP recherché : LIKE 'xx%' (varchar_pattern_ops)
+        """
+        search = DataNormalizer.postal_key(search_cp)
+        prefixes = [search[:i] for i in range(1, len(search) + 1)]
+        return or_(
+            column.in_(prefixes),
+            column.startswith(search, autoescape=True),
+            column.is_(None)
+        )
+
+    @staticmethod
+    def _location_filter(postal_key_column, city_key_column, search_cp: Optional[str], search_city: Optional[str]):
+        """Traduction SQL de _is_location_key_match : aucun candidat n'est écarté ensuite en Python."""
+        cp_key = DataNormalizer.postal_key(search_cp)
+        if not cp_key:
+            return MatchingService._city_filter(postal_key_column, city_key_column, search_city)
 
-                quote.cost = round(total, 2)
-                quote.price_breakdown = breakdown
-                matched_quotes.append(quote)
-                
-        return matched_quotes
+        city_key = DataNormalizer.city_key(search_city)
+        if city_key:
+            # Ville demandée : le devis doit être sans ville, "ALL" ou de la même ville
+            city_condition = or_(city_key_column.is_(None), city_key_column.in_(["ALL", city_key]))
+        else:
+            # Pas de ville : un devis sans CP doit être "ALL" ou sans ville
+            city_condition = or_(postal_key_column.isnot(None), city_key_column.is_(None), city_key_column == "ALL")
+        return and_(MatchingService._postal_prefix_filter(postal_key_column, cp_key), city_condition)
 
     @staticmethod
-    def _is_location_match(search_cp: str, search_city: str, quote_cp: str, quote_city: str) -> bool:
+    def _city_filter(postal_key_column, city_key_column, search_city: Optional[str]):
+        """Tarifs 'ALL', de la ville recherchée, ou sans CP ni ville (joker)."""
+        cities = ["ALL"]
+        city_key = DataNormalizer.city_key(search_city)
+        if city_key:
+            cities.append(city_key)
+        return or_(
+            city_key_column.in_(cities),
+            and_(postal_key_column.is_(None), city_key_column.is_(None))
+        )
+
+    @staticmethod
+    def _is_location_match(search_cp: str, search_city: str, quote_cp: str, quote_city: str, cp_prematched: bool = False) -> bool:
+        """
+        Vérifie la correspondance géographique à partir de valeurs brutes.
+        Voir _is_location_key_match (valeurs déjà normalisées, utilisé dans la boucle de matching).
+        """
+        return MatchingService._is_location_key_match(
+            DataNormalizer.postal_key(search_cp), DataNormalizer.city_key(search_city),
+            DataNormalizer.postal_key(quote_cp), DataNormalizer.city_key(quote_city),
+            cp_prematched=cp_prematched
+        )
+
+    @staticmethod
+    def _is_location_key_match(search_cp: Optional[str], search_city: Optional[str], quote_cp: Optional[str], quote_city: Optional[str], cp_prematched: bool = False) -> bool:
         """
         Vérifie la correspondance géographique.
         Priorité 1: Code Postal (Prefix Match)
-        Priorité 2: Ville (Exact Match insensible à la casse) si CP manquant
+        Priorité 2: Ville (Exact Match sur la clé normalisée : casse, accents, abréviations) si CP manquant
+
+        Toutes les valeurs sont des clés normalisées (DataNormalizer.postal_key / city_key) :
+        côté tarif, elles sont précalculées en base (origin_postal_key, origin_city_key...).
+
+        cp_prematched: le prefix match CP a déjà été garanti en amont (filtre SQL ou trie de
+        l'index) pour tout devis porteur d'un CP ; seule la ville reste à vérifier.
         """
         # 1. Matching par Code Postal (Prioritaire si le devis en a un)
         if quote_cp:
@@ -140,52 +682,42 @@ class MatchingService:
                 # Pour l'instant: Si user cherche sans CP, on ignore les devis avec CP spécifique ? 
                 # Non, "Nice" doit matcher "06000 Nice".
                 # Simplification: Si User n'a pas de CP, on check la ville.
-                if quote_city and quote_city.strip().upper() == "ALL":
+                if quote_city == "ALL":
                     return True
                 if search_city and quote_city:
-                    return search_city.strip().upper() == quote_city.strip().upper()
+                    return search_city == quote_city
                 return False # Pas de CP recherche et pas de correspondance ville possible
             
             # CP vs CP
-            clean_search_cp = str(search_cp).strip().upper()
-            clean_quote_cp = str(quote_cp).strip().upper()
-            
             # Bidirectional Prefix Match (match SQL logic)
             # "33" matches "33000" AND "33000" matches "33"
-            if clean_search_cp.startswith(clean_quote_cp) or clean_quote_cp.startswith(clean_search_cp):
+            if cp_prematched or search_cp.startswith(quote_cp) or quote_cp.startswith(search_cp):
                  # CP Match OK. Verifions la Ville si demandée
                  if search_city and quote_city:
-                     s_city = search_city.strip().upper()
-                     q_city = quote_city.strip().upper()
-                     
-                     if q_city == "ALL": return True
-                     if s_city == q_city: return True
+                     if quote_city == "ALL": return True
+                     if search_city == quote_city: return True
                      return False
                      
                  return True
             
             # If CP is present but doesn't match:
-            # DOES NOT return False immediately?
-            # Current logic fell through to City check.
             # If we want to be strict: if Quote has CP, and it mismatches, we should Fail.
-            # EXCEPT if the City matches exactly?
             # E.g. Quote "33000 Bordeaux". Search "33000 Paris".
             # CP matches. City mismatches. Returns False (lines above).
             
             # E.g. Quote "33000 Bordeaux". Search "99999 Bordeaux".
             # CP mismatches.
-            # Should we allow it?
             # Generally NO. If DB has CP, it implies validity scope.
             
             return False
 
         # 2. Matching par Ville (Si le devis n'a PAS de CP)
         if quote_city:
-            if quote_city.strip().upper() == "ALL":
+            if quote_city == "ALL":
                 return True
             if not search_city:
                 return False # Devis spécifique ville, recherche sans ville (et sans CP matché avant)
-            return search_city.strip().upper() == quote_city.strip().upper()
+            return search_city == quote_city
 
         # 3. Wildcard (Pas de CP ni Ville sur le devis)
         return True
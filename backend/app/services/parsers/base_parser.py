@@ -1,5 +1,5 @@
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator
 
 class BaseParser(ABC):
     @abstractmethod
@@ -9,3 +9,15 @@ class BaseParser(ABC):
         Chaque dictionnaire représente une ligne brute du fichier.
         """
         pass
+
+    def iter_rows(self, file_path: str, **kwargs) -> Iterator[Dict[str, Any]]:
+        """
+        Mode flux : mêmes lignes que parse, produites une à une sans charger tout le fichier.
+        Par défaut repose sur parse ; les parsers qui savent lire par morceaux la redéfinissent.
+        """
+        yield from self.parse(file_path, **kwargs)
+
+    @staticmethod
+    def _clean_column(name: Any) -> str:
+        """Nom de colonne nettoyé (minuscules, strip, espaces remplacés par _)."""
+        return str(name).lower().strip().replace(" ", "_")
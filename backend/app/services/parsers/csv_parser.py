@@ -1,7 +1,11 @@
 import pandas as pd
-from typing import List, Dict, Any
+from itertools import chain
+from typing import List, Dict, Any, Iterator
 from app.services.parsers.base_parser import BaseParser
 
+# Lignes lues par morceau en mode flux
+CHUNK_SIZE = 10000
+
 class CsvParser(BaseParser):
     def parse(self, file_path: str) -> List[Dict[str, Any]]:
         # Lire le CSV avec pandas
@@ -13,7 +17,28 @@ class CsvParser(BaseParser):
             df = pd.read_csv(file_path, sep=';')
             
         # Nettoyer les noms de colonnes (minuscules, strip, remplace espaces par _)
-        df.columns = [str(c).lower().strip().replace(" ", "_") for c in df.columns]
+        df.columns = [self._clean_column(c) for c in df.columns]
         
         # Convertir en liste de dictionnaires (avec gestion des NaN -> None)
         return df.where(pd.notnull(df), None).to_dict(orient='records')
+
+    def iter_rows(self, file_path: str, chunk_size: int = CHUNK_SIZE) -> Iterator[Dict[str, Any]]:
+        """
+        Lecture par morceaux de chunk_size lignes (read_csv chunksize) : un seul morceau en mémoire.
+        Le séparateur est choisi sur le premier morceau (virgule, sinon point-virgule).
+        """
+        try:
+            chunks = pd.read_csv(file_path, chunksize=chunk_size)
+            first = next(chunks, None)
+        except Exception:
+            chunks = pd.read_csv(file_path, sep=';', chunksize=chunk_size)
+            first = next(chunks, None)
+        if first is None:
+            return
+
+        columns = [self._clean_column(c) for c in first.columns]
+        for df in chain([first], chunks):
+            df.columns = columns
+            # Types inférés par morceau : passage en object pour que les vides soient toujours None
+            yield from df.astype(object).where(pd.notnull(df), None).to_dict(orient='records')
+
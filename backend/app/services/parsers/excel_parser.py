@@ -1,7 +1,14 @@
 import pandas as pd
-from typing import List, Dict, Any
+from itertools import islice
+from typing import List, Dict, Any, Iterator
+from openpyxl import load_workbook
+from openpyxl.cell.cell import TYPE_ERROR
 from app.services.parsers.base_parser import BaseParser
 
+# Textes lus comme cellule vide, comme read_excel ("N/A", "#N/A", "NULL"...)
+NA_VALUES = frozenset({"", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN",
+                       "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null"})
+
 class ExcelParser(BaseParser):
     def parse(self, file_path: str, **kwargs) -> List[Dict[str, Any]]:
         # Lire le fichier Excel avec pandas
@@ -18,7 +25,93 @@ class ExcelParser(BaseParser):
             raise ValueError(f"Erreur lecture Excel: {str(e)}")
             
         # Nettoyer les noms de colonnes
-        df.columns = [str(c).lower().strip().replace(" ", "_") for c in df.columns]
+        df.columns = [self._clean_column(c) for c in df.columns]
         
         # Convertir en liste de dictionnaires (avec gestion des NaN -> None)
         return df.where(pd.notnull(df), None).to_dict(orient='records')
+
+    def iter_rows(self, file_path: str, **kwargs) -> Iterator[Dict[str, Any]]:
+        """
+        Lecture en flux (openpyxl read_only) : les lignes sont lues au fil de l'eau dans le XML
+        de la feuille, sans DataFrame. Mêmes en-têtes que parse ("unnamed:_3", doublons "zone.1") ;
+        les colonnes sont celles de la ligne d'en-tête, les cellules au-delà sont ignorées.
+        Les valeurs ne subissent pas l'inférence de type par colonne de pandas : un code postal
+        saisi en texte ("06000") reste un texte.
+        Les fichiers qu'openpyxl ne sait pas ouvrir (.xls) passent par parse (pandas/xlrd).
+        """
+        sheet_name = kwargs.get("sheet_name")
+        if sheet_name is None:
+            sheet_name = 0
+        header_row = kwargs.get("header_row")
+        if header_row is None:
+            header_row = 0
+
+        try:
+            workbook = load_workbook(file_path, read_only=True, data_only=True)
+        except Exception:
+            # Format non lu par openpyxl (.xls) : lecture complète via pandas/xlrd
+            yield from self.parse(file_path, **kwargs)
+            return
+        try:
+            sheet = workbook.worksheets[sheet_name] if isinstance(sheet_name, int) else workbook[sheet_name]
+        except Exception as e:
+            workbook.close()
+            raise ValueError(f"Erreur lecture Excel: {str(e)}")
+
+        try:
+            # Dimensions déclarées parfois démesurées (A1:XFD70) : lignes non complétées jusqu'à max_column
+            sheet.reset_dimensions()
+            rows = sheet.iter_rows()
+            header = next(islice(rows, header_row, None), None)
+            if header is None:
+                return
+            header_values = self._trim([self._cell_value(cell) for cell in header])
+            columns = self._header_columns(header_values)
+
+            # Lignes vides conservées (numérotation identique à parse), sauf en fin de feuille
+            empty_rows = 0
+            for cells in rows:
+                values = self._trim([self._cell_value(cell) for cell in cells])
+                if not values:
+                    empty_rows += 1
+                    continue
+                for _ in range(empty_rows):
+                    yield dict.fromkeys(columns)
+                empty_rows = 0
+                # Colonnes fixées par l'en-tête : toutes les lignes ont les mêmes clés
+                values = values[:len(columns)]
+                yield dict(zip(columns, values + [None] * (len(columns) - len(values))))
+        finally:
+            workbook.close()
+
+    @staticmethod
+    def _trim(values: List[Any]) -> List[Any]:
+        """Retire les cellules vides en fin de ligne."""
+        end = len(values)
+        while end and values[end - 1] is None:
+            end -= 1
+        return values[:end]
+
+    @staticmethod
+    def _cell_value(cell) -> Any:
+        """Valeur d'une cellule convertie comme read_excel (nombre entier -> int, erreurs et N/A -> None)."""
+        value = getattr(cell, "value", None)
+        if value is None or cell.data_type == TYPE_ERROR:
+            return None
+        if isinstance(value, float) and value.is_integer():
+            return int(value)
+        if isinstance(value, str) and value in NA_VALUES:
+            return None
+        return value
+
+    @classmethod
+    def _header_columns(cls, header: List[Any]) -> List[str]:
+        """Noms de colonnes à la manière de pandas : cellule vide -> "Unnamed: i", doublon -> "nom.1"."""
+        names: List[str] = []
+        seen: Dict[str, int] = {}
+        for i, value in enumerate(header):
+            name = f"Unnamed: {i}" if value is None else str(value)
+            count = seen.get(name, 0)
+            seen[name] = count + 1
+            names.append(f"{name}.{count}" if count else name)
+        return [cls._clean_column(name) for name in names]
@@ -2,6 +2,9 @@ from typing import List, Optional
 from sqlalchemy.orm import Session
 from app.models.partner import Partner
 from app.schemas.partner import PartnerCreate, PartnerUpdate
+from app.services.match_cache import MatchCache
+from app.services.surcharge_rules import surcharge_engine
+from app.services.tariff_snapshot import TariffSnapshot
 
 class PartnerService:
     @staticmethod
@@ -26,6 +29,8 @@ class PartnerService:
         db.add(db_partner)
         db.commit()
         db.refresh(db_partner)
+        # Les règles de suppléments sont rattachées par code partenaire
+        surcharge_engine.invalidate()
         return db_partner
 
     @staticmethod
@@ -41,6 +46,8 @@ class PartnerService:
         db.add(db_partner)
         db.commit()
         db.refresh(db_partner)
+        # Le partenaire est embarqué dans les résultats de matching en cache
+        MatchCache.bump_partner(partner_id)
         return db_partner
 
     @staticmethod
@@ -51,6 +58,9 @@ class PartnerService:
             
         db.delete(db_partner)
         db.commit()
+        MatchCache.bump_partner(partner_id)
+        TariffSnapshot.remove(partner_id)
+        surcharge_engine.invalidate()
         return True
     @staticmethod
     def ensure_defaults(db: Session):
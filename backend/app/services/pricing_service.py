@@ -1,3 +1,4 @@
+import math
 from decimal import Decimal, ROUND_HALF_UP
 from typing import Optional, Tuple
 
@@ -76,7 +77,6 @@ class PricingService:
             
             # Si le rounding a arrondi vers le bas (ex 2.4 -> 2), on ajuste car on veut ceil
             # Mais ROUND_HALF_UP sur 2.4 -> 2. 
-            import math
             ceil_100 = math.ceil(float(weight) / 100.0)
             
             # Prix = (Poids arrondi / 100) * Prix unitaire
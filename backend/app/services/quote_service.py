@@ -1,8 +1,21 @@
-from typing import List, Optional
-from sqlalchemy.orm import Session
-from sqlalchemy import or_
+from datetime import datetime
+from typing import Iterator, List, Optional
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import insert, or_
+from app.core.config import get_settings
+from app.models.import_job import ImportJob, ImportStatus
 from app.models.partner_quote import PartnerQuote, TransportMode
 from app.schemas.partner_quote import PartnerQuoteCreate
+from app.services.match_cache import MatchCache
+from app.services.best_price_service import BestPriceService
+from app.services.city_index import city_index
+from app.services.lane_coverage import lane_coverage
+from app.services.tariff_index import tariff_index
+from app.services.tariff_snapshot import TariffSnapshot
+from app.services.import_logic.data_normalizer import DataNormalizer
+
+settings = get_settings()
 
 class QuoteService:
     @staticmethod
@@ -11,7 +24,66 @@ class QuoteService:
 
     @staticmethod
     def create_quote(db: Session, quote_in: PartnerQuoteCreate) -> PartnerQuote:
-        db_quote = PartnerQuote(
+        db_quote = PartnerQuote(**QuoteService._quote_values(quote_in))
+        db.add(db_quote)
+        db.commit()
+        db.refresh(db_quote)
+        return db_quote
+
+    @staticmethod
+    def bulk_create_quotes(
+        db: Session,
+        quotes_in: List[PartnerQuoteCreate],
+        import_job_id: Optional[str] = None
+    ) -> List[Optional[str]]:
+        """
+        Insertion en masse (import) : un INSERT multi-lignes et une transaction pour tout le lot.
+        Si le lot échoue, ses lignes sont réessayées une à une (SAVEPOINT) pour isoler les fautives.
+        Avec import_job_id, les tarifs sont préparés inactifs, invisibles du matching et des listes
+        jusqu'à activate_import.
+        Retourne, pour chaque tarif et dans l'ordre, None ou le message d'erreur.
+        """
+        rows = [QuoteService._insert_values(quote_in) for quote_in in quotes_in]
+        if import_job_id is not None:
+            for row in rows:
+                row.update(is_active=False, import_job_id=import_job_id)
+        if not rows:
+            return []
+        try:
+            db.execute(insert(PartnerQuote), rows)
+            db.commit()
+            return [None] * len(rows)
+        except SQLAlchemyError:
+            db.rollback()
+
+        errors: List[Optional[str]] = []
+        for row in rows:
+            try:
+                with db.begin_nested():
+                    db.execute(insert(PartnerQuote), [row])
+                errors.append(None)
+            except SQLAlchemyError as e:
+                errors.append(str(e))
+        db.commit()
+        return errors
+
+    @staticmethod
+    def _insert_values(quote_in: PartnerQuoteCreate) -> dict:
+        """
+        Valeurs d'insertion en masse : comme l'ORM, une valeur None laisse place au défaut
+        de la colonne (id, valid_from, is_active...), évalué ici ligne par ligne.
+        """
+        values = QuoteService._quote_values(quote_in)
+        for column in PartnerQuote.__table__.columns:
+            default = column.default
+            if values.get(column.key) is None and default is not None:
+                values[column.key] = default.arg(None) if default.is_callable else default.arg
+        return values
+
+    @staticmethod
+    def _quote_values(quote_in: PartnerQuoteCreate) -> dict:
+        """Colonnes d'un nouveau tarif, clés normalisées du matching comprises."""
+        return dict(
             partner_id=quote_in.partner_id,
             transport_mode=quote_in.transport_mode,
             origin_postal_code=quote_in.origin_postal_code,
@@ -20,6 +92,12 @@ class QuoteService:
             dest_postal_code=quote_in.dest_postal_code,
             dest_city=quote_in.dest_city,
             dest_country=quote_in.dest_country,
+            origin_postal_key=DataNormalizer.postal_key(quote_in.origin_postal_code),
+            origin_city_key=DataNormalizer.city_key(quote_in.origin_city),
+            origin_country_code=DataNormalizer.country_code(quote_in.origin_country),
+            dest_postal_key=DataNormalizer.postal_key(quote_in.dest_postal_code),
+            dest_city_key=DataNormalizer.city_key(quote_in.dest_city),
+            dest_country_code=DataNormalizer.country_code(quote_in.dest_country),
             weight_min=quote_in.weight_min,
             weight_max=quote_in.weight_max,
             volume_min=quote_in.volume_min,
@@ -31,10 +109,11 @@ class QuoteService:
             valid_until=quote_in.valid_until,
             meta_data=quote_in.meta_data
         )
-        db.add(db_quote)
-        db.commit()
-        db.refresh(db_quote)
-        return db_quote
+
+    @staticmethod
+    def _not_staged():
+        """Exclut les tarifs préparés par un import en cours ou abandonné (inactifs, rattachés à un import)."""
+        return or_(PartnerQuote.is_active == True, PartnerQuote.import_job_id.is_(None))  # noqa: E712
 
     @staticmethod
     def list_quotes(
@@ -51,12 +130,35 @@ class QuoteService:
         if transport_mode:
             query = query.filter(PartnerQuote.transport_mode == transport_mode)
             
-        return query.offset(skip).limit(limit).all()
+        return query.filter(QuoteService._not_staged()).offset(skip).limit(limit).all()
+
+    @staticmethod
+    def iter_quotes(
+        db: Session,
+        skip: int = 0,
+        limit: Optional[int] = None,
+        partner_id: Optional[str] = None,
+        transport_mode: Optional[TransportMode] = None,
+        chunk_size: int = 1000
+    ) -> Iterator[PartnerQuote]:
+        """Variante en flux de list_quotes : curseur serveur, partenaire chargé par jointure."""
+        query = db.query(PartnerQuote).options(joinedload(PartnerQuote.partner)).filter(QuoteService._not_staged())
+
+        if partner_id:
+            query = query.filter(PartnerQuote.partner_id == partner_id)
+        if transport_mode:
+            query = query.filter(PartnerQuote.transport_mode == transport_mode)
+
+        # Ordre stable nécessaire à la pagination
+        query = query.order_by(PartnerQuote.id).offset(skip)
+        if limit is not None:
+            query = query.limit(limit)
+        return iter(query.yield_per(chunk_size))
 
     @staticmethod
     def count_quotes(db: Session, partner_id: Optional[str] = None) -> int:
         """Retourne le nombre total de tarifs, éventuellement filtré par partenaire."""
-        query = db.query(PartnerQuote)
+        query = db.query(PartnerQuote).filter(QuoteService._not_staged())
         if partner_id:
             query = query.filter(PartnerQuote.partner_id == partner_id)
         return query.count()
@@ -66,8 +168,10 @@ class QuoteService:
         db_quote = QuoteService.get_by_id(db, quote_id)
         if not db_quote:
             return False
+        partner_id = db_quote.partner_id
         db.delete(db_quote)
         db.commit()
+        QuoteService.publish_partner_changes(db, partner_id)
         return True
 
     @staticmethod
@@ -79,8 +183,7 @@ class QuoteService:
         # 1. Détacher les tarifs des devis clients (SET NULL) pour éviter IntegrityError
         # On cherche tous les items qui pointent vers des quotes de ce partenaire
         quotes_to_delete_subquery = db.query(PartnerQuote.id).filter(PartnerQuote.partner_id == partner_id)
-        
-        from datetime import datetime
+
         print(f"[{datetime.utcnow()}] QuoteService: Detaching quotes...")
 
         db.query(CustomerQuoteItem).filter(
@@ -92,4 +195,95 @@ class QuoteService:
         # 2. Supprimer les tarifs
         num_deleted = db.query(PartnerQuote).filter(PartnerQuote.partner_id == partner_id).delete(synchronize_session=False)
         db.commit()
+        QuoteService.publish_partner_changes(db, partner_id)
+        return num_deleted
+
+    @staticmethod
+    def publish_partner_changes(db: Session, partner_id: str):
+        """
+        Propage un changement des tarifs d'un partenaire (import, création ou suppression manuelle) :
+        cache de recherche, dictionnaires de villes et de couverture, meilleures offres, snapshot
+        relu par les autres workers et index mémoire du matching de ce worker.
+        """
+        MatchCache.bump_partner(partner_id)
+        # Nouvelles villes ou voies possibles : dictionnaires reconstruits à la prochaine recherche
+        city_index.invalidate()
+        lane_coverage.invalidate()
+
+        # Meilleures offres par voie et tranche : rafraîchies pour ce partenaire uniquement
+        try:
+            offers = BestPriceService.refresh_partner(db, partner_id)
+            print(f"[{datetime.utcnow()}] Best prices refreshed ({offers} candidates).")
+        except Exception as e:
+            db.rollback()
+            print(f"[{datetime.utcnow()}] Best prices refresh failed: {e}")
+
+        # Snapshot colonnaire du partenaire (tarifs supprimés : snapshot vide)
+        if settings.tariff_snapshot_enabled:
+            try:
+                published = TariffSnapshot.publish(db, partner_id)
+                print(f"[{datetime.utcnow()}] Tariff snapshot published ({published} rows).")
+            except Exception as e:
+                print(f"[{datetime.utcnow()}] Tariff snapshot publish failed: {e}")
+
+        tariff_index.invalidate()
+
+    @staticmethod
+    def activate_import(db: Session, partner_id: str, import_job_id: str) -> int:
+        """
+        Bascule atomique d'un import : en une seule transaction, les tarifs actifs du partenaire
+        sont supprimés et ceux préparés par l'import activés. Les recherches concurrentes voient
+        soit l'ancien jeu de tarifs, soit le nouveau, jamais un partenaire vide. Les tarifs préparés
+        par un autre import en cours du même partenaire ne sont pas touchés.
+        Retourne le nombre de tarifs activés.
+        """
+        from app.models.customer_quote import CustomerQuoteItem
+
+        old_quotes = db.query(PartnerQuote.id).filter(
+            PartnerQuote.partner_id == partner_id,
+            PartnerQuote.is_active == True,  # noqa: E712
+            PartnerQuote.import_job_id.is_distinct_from(import_job_id)
+        )
+        db.query(CustomerQuoteItem).filter(
+            CustomerQuoteItem.partner_quote_id.in_(old_quotes)
+        ).update({CustomerQuoteItem.partner_quote_id: None}, synchronize_session=False)
+        db.query(PartnerQuote).filter(
+            PartnerQuote.partner_id == partner_id,
+            PartnerQuote.is_active == True,  # noqa: E712
+            PartnerQuote.import_job_id.is_distinct_from(import_job_id)
+        ).delete(synchronize_session=False)
+
+        num_activated = db.query(PartnerQuote).filter(
+            PartnerQuote.partner_id == partner_id,
+            PartnerQuote.import_job_id == import_job_id
+        ).update({PartnerQuote.is_active: True}, synchronize_session=False)
+        db.commit()
+        return num_activated
+
+    @staticmethod
+    def discard_staged_quotes(db: Session, import_job_id: str) -> int:
+        """Supprime les tarifs préparés et jamais activés d'un import (import échoué)."""
+        num_deleted = db.query(PartnerQuote).filter(
+            PartnerQuote.import_job_id == import_job_id,
+            PartnerQuote.is_active == False  # noqa: E712
+        ).delete(synchronize_session=False)
+        db.commit()
+        return num_deleted
+
+    @staticmethod
+    def discard_abandoned_staged_quotes(db: Session, partner_id: str) -> int:
+        """
+        Supprime les tarifs préparés du partenaire dont l'import n'est plus en cours (interrompu
+        avant sa fin). Ceux d'un import en attente ou en cours ne sont pas touchés.
+        """
+        running_jobs = db.query(ImportJob.id).filter(
+            ImportJob.status.in_([ImportStatus.PENDING, ImportStatus.PROCESSING])
+        )
+        num_deleted = db.query(PartnerQuote).filter(
+            PartnerQuote.partner_id == partner_id,
+            PartnerQuote.is_active == False,  # noqa: E712
+            PartnerQuote.import_job_id.isnot(None),
+            PartnerQuote.import_job_id.notin_(running_jobs)
+        ).delete(synchronize_session=False)
+        db.commit()
         return num_deleted
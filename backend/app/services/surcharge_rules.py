@@ -0,0 +1,279 @@
+"""
+Suppléments tarifaires par partenaire : manutention et surcharge carburant (configs/surcharges.yaml).
+
+Les règles sont lues au démarrage et relues dès que la date de modification du fichier
+change (sans redémarrage), puis compilées : codes partenaires résolus en identifiants,
+villes et pays ramenés aux clés normalisées, dates converties. Elles s'appliquent ensuite à
+tous les candidats d'une recherche en une passe NumPy (apply) et, pour le tri Top-K côté
+base, sous forme d'une expression SQL équivalente (sql_total).
+
+Calcul (cf. PricingService.calculate_transport_price) :
+- manutention : montant par tranche de 100 kg de poids réel, et non taxable (arrondi à la tranche supérieure)
+- carburant   : pourcentage du prix de base + manutention
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from datetime import date
+from decimal import Decimal
+from typing import Dict, List, NamedTuple, Optional
+
+import numpy as np
+import yaml
+from sqlalchemy import Numeric, and_, case, func, literal
+from sqlalchemy.orm import Session
+
+from app.core.config import get_settings
+from app.models.partner import Partner
+from app.models.partner_quote import PartnerQuote
+from app.schemas.matching import LaneCriteria
+from app.services.import_logic.data_normalizer import DataNormalizer
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+CONFIG_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "configs", "surcharges.yaml"
+)
+
+# Types de règle : champs de PriceBreakdown alimentés
+HANDLING_KINDS = ("handling_melzo", "handling_local")
+FUEL_KIND = "fuel"
+
+
+def round_half_up(values) -> np.ndarray:
+    """
+    Arrondi au centime, demi vers le haut comme round(numeric) PostgreSQL et PricingService
+    (np.round arrondit au pair : 0.125 -> 0.12). Le pré-arrondi à 1e-6 centime absorbe
+    l'erreur binaire (1.005 * 100 = 100.4999...).
+    """
+    values = np.asarray(values, dtype=float)
+    cents = np.floor(np.round(np.abs(values) * 100, 6) + 0.5)
+    return np.sign(values) * cents / 100
+
+
+class SurchargeRule:
+    """Règle compilée : conditions normalisées, montant (€/100 kg) ou pourcentage (carburant)."""
+
+    __slots__ = (
+        "partner_code", "partner_id", "kind", "amount",
+        "origin_country", "dest_country", "origin_city", "dest_city", "valid_from", "valid_until",
+    )
+
+    def __init__(self, partner_code: str, config: dict):
+        kind = config.get("type")
+        if kind not in HANDLING_KINDS + (FUEL_KIND,):
+            raise ValueError(f"Type de supplément inconnu pour {partner_code} : {kind!r}")
+        self.partner_code = partner_code
+        self.partner_id: Optional[str] = None
+        self.kind = kind
+        self.amount = float(config["percent"] if kind == FUEL_KIND else config["per_100kg"])
+        when = config.get("when") or {}
+        self.origin_country = DataNormalizer.country_code(when.get("origin_country"))
+        self.dest_country = DataNormalizer.country_code(when.get("dest_country"))
+        self.origin_city = DataNormalizer.city_key(when.get("origin_city"))
+        self.dest_city = DataNormalizer.city_key(when.get("dest_city"))
+        self.valid_from = SurchargeRule._to_date(config.get("valid_from"))
+        self.valid_until = SurchargeRule._to_date(config.get("valid_until"))
+
+    @staticmethod
+    def _to_date(value) -> Optional[date]:
+        if value is None or isinstance(value, date):
+            return value
+        return date.fromisoformat(str(value))
+
+    def applies_to_lane(self, criteria: LaneCriteria) -> bool:
+        """Conditions communes à tous les candidats d'une recherche (pays, date d'expédition)."""
+        if self.partner_id is None:
+            return False
+        if self.origin_country and self.origin_country != DataNormalizer.country_code(criteria.origin_country):
+            return False
+        if self.dest_country and self.dest_country != DataNormalizer.country_code(criteria.dest_country):
+            return False
+        if self.valid_from and criteria.shipping_date < self.valid_from:
+            return False
+        if self.valid_until and criteria.shipping_date > self.valid_until:
+            return False
+        return True
+
+
+class SurchargeAmounts(NamedTuple):
+    """Suppléments par candidat (tableaux alignés sur les candidats)."""
+    handling_melzo: np.ndarray
+    handling_local: np.ndarray
+    fuel_pct: np.ndarray
+    fuel_amount: np.ndarray
+    total: np.ndarray
+
+
+class SurchargeEngine:
+    """Règles compilées partagées par les requêtes d'un même worker."""
+
+    def __init__(self, config_path: str = CONFIG_PATH):
+        self._config_path = config_path
+        self._mtime: Optional[float] = self._file_mtime(config_path)
+        self._rules: List[SurchargeRule] = self._load_config(config_path)
+        # Empreinte du fichier chargé (clé du cache de matching, cf. MatchCache)
+        self.version: str = self._file_version(config_path)
+        # Dernière résolution {code: id}, appliquée aux règles relues
+        self._partner_ids: Dict[str, str] = {}
+        self._built_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _load_config(config_path: str) -> List[SurchargeRule]:
+        if not os.path.exists(config_path):
+            return []
+        try:
+            with open(config_path, "r") as f:
+                config = yaml.safe_load(f) or {}
+            return [
+                SurchargeRule(partner_code, rule)
+                for partner_code, rules in (config.get("partners") or {}).items()
+                for rule in rules or []
+            ]
+        except Exception as e:
+            logger.error(f"Error loading surcharge config: {e}")
+            return []
+
+    @staticmethod
+    def _file_mtime(config_path: str) -> Optional[float]:
+        try:
+            return os.stat(config_path).st_mtime
+        except OSError:
+            return None
+
+    def reload_if_changed(self):
+        """Relit le fichier si sa date de modification a changé depuis le dernier chargement."""
+        mtime = self._file_mtime(self._config_path)
+        if mtime == self._mtime:
+            return
+        rules = self._load_config(self._config_path)
+        for rule in rules:
+            rule.partner_id = self._partner_ids.get(rule.partner_code)
+        self._rules, self.version, self._mtime = rules, self._file_version(self._config_path), mtime
+        # Nouveaux codes partenaires éventuels : résolus à la prochaine recherche
+        self._built_at = None
+
+    @staticmethod
+    def _file_version(config_path: str) -> str:
+        try:
+            with open(config_path, "rb") as f:
+                return hashlib.sha256(f.read()).hexdigest()[:16]
+        except OSError:
+            return ""
+
+    @property
+    def is_stale(self) -> bool:
+        if self._built_at is None:
+            return True
+        return time.monotonic() - self._built_at > settings.tariff_index_ttl_seconds
+
+    def invalidate(self):
+        """Force la résolution des partenaires à la prochaine recherche (partenaire créé ou supprimé)."""
+        self._built_at = None
+
+    def ensure_fresh(self, db: Session):
+        """
+        Relit le fichier s'il a changé, puis résout les codes partenaires en identifiants
+        (même stratégie que TariffIndex.ensure_fresh).
+        """
+        self.reload_if_changed()
+        if not self.is_stale:
+            return
+        if not self._rules:
+            self._built_at = time.monotonic()
+            return
+        if self._lock.acquire(blocking=False):
+            try:
+                if self.is_stale:
+                    self._resolve_partners(db)
+            finally:
+                self._lock.release()
+        elif self._built_at is None:
+            # Jamais compilées : résolution indépendante plutôt que des prix sans suppléments
+            self._resolve_partners(db)
+
+    def _resolve_partners(self, db: Session):
+        codes = {rule.partner_code for rule in self._rules}
+        rows = db.query(Partner.code, Partner.id).filter(Partner.code.in_(codes)).all()
+        self.compile({code: partner_id for code, partner_id in rows})
+
+    def compile(self, partner_ids: Dict[str, str]):
+        """partner_ids : {code: id}. Les règles d'un partenaire inconnu sont ignorées."""
+        self._partner_ids = partner_ids
+        for rule in self._rules:
+            rule.partner_id = partner_ids.get(rule.partner_code)
+        self._built_at = time.monotonic()
+
+    def lane_rules(self, criteria: LaneCriteria) -> List[SurchargeRule]:
+        return [rule for rule in self._rules if rule.applies_to_lane(criteria)]
+
+    def apply(
+        self,
+        criteria: LaneCriteria,
+        real_weight,
+        partner_ids: np.ndarray,
+        origin_city_keys: np.ndarray,
+        dest_city_keys: np.ndarray,
+        base_costs: np.ndarray,
+    ) -> SurchargeAmounts:
+        """
+        Suppléments et prix total de tous les candidats, une passe NumPy par règle de la voie.
+        real_weight : poids réel de l'envoi (manutention), commun (scalaire) ou par candidat (tableau).
+        """
+        handling = {kind: np.zeros(len(base_costs)) for kind in HANDLING_KINDS}
+        fuel_pct = np.zeros(len(base_costs))
+        units_100kg = np.ceil(np.asarray(real_weight, dtype=float) / 100)
+
+        for rule in self.lane_rules(criteria):
+            mask = partner_ids == rule.partner_id
+            if rule.origin_city:
+                mask &= origin_city_keys == rule.origin_city
+            if rule.dest_city:
+                mask &= dest_city_keys == rule.dest_city
+            if rule.kind == FUEL_KIND:
+                fuel_pct += np.where(mask, rule.amount, 0.0)
+            else:
+                handling[rule.kind] += np.where(mask, rule.amount * units_100kg, 0.0)
+
+        handling_melzo = round_half_up(handling["handling_melzo"])
+        handling_local = round_half_up(handling["handling_local"])
+        subtotal = base_costs + handling_melzo + handling_local
+        fuel_amount = round_half_up(subtotal * fuel_pct / 100)
+        total = round_half_up(subtotal + fuel_amount)
+        return SurchargeAmounts(handling_melzo, handling_local, fuel_pct, fuel_amount, total)
+
+    def sql_total(self, criteria: LaneCriteria, units_100kg, base_cost):
+        """
+        Expression SQL du prix total, identique à apply (sert au tri Top-K côté base).
+        units_100kg : nombre de tranches de 100 kg du poids réel (manutention).
+        """
+        rules = self.lane_rules(criteria)
+        if not rules:
+            return base_cost
+
+        def amount(value: float):
+            return literal(Decimal(str(value)), Numeric)
+
+        def matches(rule: SurchargeRule):
+            conditions = [PartnerQuote.partner_id == rule.partner_id]
+            if rule.origin_city:
+                conditions.append(PartnerQuote.origin_city_key == rule.origin_city)
+            if rule.dest_city:
+                conditions.append(PartnerQuote.dest_city_key == rule.dest_city)
+            return and_(*conditions)
+
+        subtotal = base_cost
+        fuel_pct = amount(0)
+        for rule in rules:
+            if rule.kind == FUEL_KIND:
+                fuel_pct = fuel_pct + case((matches(rule), amount(rule.amount)), else_=0)
+            else:
+                subtotal = subtotal + case((matches(rule), amount(rule.amount) * units_100kg), else_=0)
+        return func.round(subtotal + func.round(subtotal * fuel_pct / 100, 2), 2)
+
+
+surcharge_engine = SurchargeEngine()
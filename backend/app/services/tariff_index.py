@@ -0,0 +1,453 @@
+"""
+Index mémoire des tarifs partenaires pour le matching (optionnel, TARIFF_INDEX_ENABLED).
+
+Les tarifs sont regroupés par voie (mode, pays origine, pays destination).
+Chaque voie indexe ses lignes par code postal, par ville et par tranche de poids
+(arbre d'intervalles) : la sélection des candidats d'une recherche se fait sans requête SQL.
+
+L'index est reconstruit à la fin de chaque import réussi, et invalidé à chaque création
+ou suppression manuelle de tarif (cf. QuoteService.publish_partner_changes). Les autres workers
+le reconstruisent d'eux-mêmes après TARIFF_INDEX_TTL_SECONDS : depuis les snapshots
+colonnaires si TARIFF_SNAPSHOT_ENABLED (cf. tariff_snapshot), sinon depuis la base ;
+les partenaires sans snapshot publié sont toujours lus en base.
+"""
+import bisect
+import itertools
+import math
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.core.config import get_settings
+from app.models.partner_quote import PartnerQuote, TransportMode
+from app.schemas.matching import QuoteSearchRequest
+from app.services.import_logic.data_normalizer import DataNormalizer
+from app.services.tariff_snapshot import TariffSnapshot
+
+settings = get_settings()
+
+# (transport_mode, origin_country, dest_country)
+LaneKey = Tuple[str, str, str]
+
+
+class TariffEntry:
+    """Projection légère d'une ligne partner_quotes, suffisante pour le matching."""
+
+    __slots__ = (
+        "id", "partner_id", "transport_mode", "origin_postal_key", "origin_city_key", "dest_postal_key", "dest_city_key",
+        "weight_min", "weight_max", "volume_min", "volume_max", "valid_from", "valid_until", "cost", "pricing_type",
+    )
+
+    def __init__(self, row: Any):
+        self.id = row.id
+        # Partenaire : suppléments appliqués au classement (cf. surcharge_rules)
+        self.partner_id = row.partner_id
+        # Mode : ratio du poids volumétrique (cf. QuoteSearchRequest.taxable_weight)
+        self.transport_mode = TransportMode(row.transport_mode).value
+        # Clés normalisées précalculées en base (cf. DataNormalizer)
+        self.origin_postal_key = row.origin_postal_key
+        self.origin_city_key = row.origin_city_key
+        self.dest_postal_key = row.dest_postal_key
+        self.dest_city_key = row.dest_city_key
+        self.weight_min = row.weight_min
+        self.weight_max = row.weight_max
+        # Tranche de volume (m³), NULL = borne ouverte
+        self.volume_min = row.volume_min
+        self.volume_max = row.volume_max
+        # Comparaison sur la DATE uniquement (cf. filtre SQL de MatchingService)
+        self.valid_from = row.valid_from.date() if row.valid_from else None
+        self.valid_until = row.valid_until.date() if row.valid_until else None
+        # Tarification : permet le classement par prix avant de charger les lignes complètes
+        self.cost = float(row.cost)
+        self.pricing_type = row.pricing_type
+
+
+class PostalPrefixTrie:
+    """
+    Trie des codes postaux d'une voie.
+
+    match(code) retourne, en O(len(code)) + taille du résultat, les positions dont le code
+    est un préfixe du code recherché ("06" pour "06200") ou commence par lui ("223" pour "22").
+    """
+
+    __slots__ = ("_root", "_frozen")
+
+    class _Node:
+        __slots__ = ("children", "positions", "below")
+
+        def __init__(self):
+            self.children: Dict[str, "PostalPrefixTrie._Node"] = {}
+            self.positions: List[int] = []
+            self.below: List[int] = []
+
+    def __init__(self):
+        self._root = PostalPrefixTrie._Node()
+        self._frozen = False
+
+    def insert(self, code: str, pos: int):
+        node = self._root
+        for char in code:
+            node = node.children.setdefault(char, PostalPrefixTrie._Node())
+        node.positions.append(pos)
+        self._frozen = False
+
+    def freeze(self):
+        """Précalcule, pour chaque nœud, les positions de tous ses descendants."""
+        def collect(node: "PostalPrefixTrie._Node") -> List[int]:
+            below: List[int] = []
+            for child in node.children.values():
+                below.extend(child.positions)
+                below.extend(collect(child))
+            node.below = below
+            return below
+
+        collect(self._root)
+        self._frozen = True
+
+    def match(self, code: str) -> List[int]:
+        if not self._frozen:
+            self.freeze()
+        found: List[int] = []
+        node = self._root
+        for char in code:
+            node = node.children.get(char)
+            if node is None:
+                return found
+            # Code du tarif préfixe du code recherché (ou égal)
+            found.extend(node.positions)
+        # Codes du tarif qui commencent par le code recherché
+        found.extend(node.below)
+        return found
+
+
+class WeightIntervalTree:
+    """
+    Arbre d'intervalles centré sur les tranches de poids [weight_min, weight_max] (bornes incluses).
+
+    stab(poids) retourne les positions des tranches contenant le poids en
+    O(log n + k) au lieu de parcourir toutes les tranches de la voie.
+    """
+
+    __slots__ = ("_root",)
+
+    class _Node:
+        __slots__ = ("center", "mins", "min_positions", "maxs", "max_positions", "left", "right")
+
+        def __init__(self, center: float, here: List[Tuple[float, float, int]]):
+            self.center = center
+            # Tranches contenant le centre, triées par borne basse puis par borne haute
+            by_min = sorted(here, key=lambda iv: iv[0])
+            self.mins = [iv[0] for iv in by_min]
+            self.min_positions = [iv[2] for iv in by_min]
+            by_max = sorted(here, key=lambda iv: iv[1])
+            self.maxs = [iv[1] for iv in by_max]
+            self.max_positions = [iv[2] for iv in by_max]
+            self.left: Optional["WeightIntervalTree._Node"] = None
+            self.right: Optional["WeightIntervalTree._Node"] = None
+
+    def __init__(self, intervals: Iterable[Tuple[float, float, int]]):
+        """
+        intervals: (weight_min, weight_max, position).
+        Une tranche inversée (min > max) ne contient aucun poids, comme en SQL : elle est ignorée.
+        """
+        self._root = self._build([iv for iv in intervals if iv[0] <= iv[1]])
+
+    @classmethod
+    def _build(cls, intervals: List[Tuple[float, float, int]]) -> Optional["WeightIntervalTree._Node"]:
+        if not intervals:
+            return None
+        endpoints = sorted(bound for iv in intervals for bound in iv[:2])
+        center = endpoints[len(endpoints) // 2]
+
+        left, right, here = [], [], []
+        for iv in intervals:
+            if iv[1] < center:
+                left.append(iv)
+            elif iv[0] > center:
+                right.append(iv)
+            else:
+                here.append(iv)
+
+        node = cls._Node(center, here)
+        node.left = cls._build(left)
+        node.right = cls._build(right)
+        return node
+
+    def stab(self, weight: float) -> List[int]:
+        found: List[int] = []
+        node = self._root
+        while node is not None:
+            if weight < node.center:
+                found.extend(node.min_positions[:bisect.bisect_right(node.mins, weight)])
+                node = node.left
+            elif weight > node.center:
+                found.extend(node.max_positions[bisect.bisect_left(node.maxs, weight):])
+                node = node.right
+            else:
+                found.extend(node.min_positions)
+                break
+        return found
+
+    @staticmethod
+    def anomalies(intervals: Iterable[Tuple[float, float, Any]], max_gap: float = 1.0) -> List[Dict[str, Any]]:
+        """
+        Tranches qui se chevauchent ou laissent un trou, pour une même série de tranches.
+
+        Des tranches jointives (0-100 / 100-200) ou séparées d'un pas entier
+        (0-100 / 101-200, cf. weight_min_gap) ne sont pas signalées.
+        """
+        found: List[Dict[str, Any]] = []
+        previous = None
+        for weight_min, weight_max, ref in sorted(intervals, key=lambda iv: (iv[0], iv[1])):
+            if previous is not None:
+                prev_min, prev_max, prev_ref = previous
+                if weight_min < prev_max:
+                    found.append({"type": "overlap", "brackets": [[prev_min, prev_max], [weight_min, weight_max]],
+                                  "refs": [prev_ref, ref]})
+                elif weight_min - prev_max > max_gap:
+                    found.append({"type": "gap", "brackets": [[prev_min, prev_max], [weight_min, weight_max]],
+                                  "refs": [prev_ref, ref]})
+            if previous is None or weight_max > previous[1]:
+                previous = (weight_min, weight_max, ref)
+        return found
+
+
+class _LocationIndex:
+    """Index d'un côté (origine ou destination) d'une voie : codes postaux et villes."""
+
+    __slots__ = ("cp", "city_with_cp", "city_without_cp", "open")
+
+    def __init__(self):
+        self.cp = PostalPrefixTrie()
+        # Villes des tarifs avec CP : uniquement utiles pour une recherche sans CP
+        self.city_with_cp: Dict[str, List[int]] = {}
+        self.city_without_cp: Dict[str, List[int]] = {}
+        # Ni CP ni ville : le tarif couvre tout le pays
+        self.open: List[int] = []
+
+    def add(self, pos: int, cp_key: Optional[str], city_key: Optional[str]):
+        if cp_key:
+            self.cp.insert(cp_key, pos)
+            if city_key:
+                self.city_with_cp.setdefault(city_key, []).append(pos)
+        elif city_key:
+            self.city_without_cp.setdefault(city_key, []).append(pos)
+        else:
+            self.open.append(pos)
+
+    def candidates(self, search_cp: Optional[str], search_city: Optional[str]) -> Set[int]:
+        """
+        Positions compatibles avec la localisation recherchée.
+
+        Lorsqu'un CP est recherché, tout candidat porteur d'un CP est garanti en
+        correspondance de préfixe : il ne reste à vérifier que la ville
+        (cf. MatchingService._is_location_match, cp_prematched=True).
+        """
+        city_key = DataNormalizer.city_key(search_city)
+        city_maps = [self.city_without_cp]
+        positions = set(self.open)
+        search_cp_key = DataNormalizer.postal_key(search_cp)
+        if search_cp_key:
+            positions.update(self.cp.match(search_cp_key))
+        else:
+            city_maps.append(self.city_with_cp)
+
+        for city_map in city_maps:
+            positions.update(city_map.get("ALL", ()))
+            if city_key:
+                positions.update(city_map.get(city_key, ()))
+        return positions
+
+
+class LaneIndex:
+    """Tarifs d'une voie, indexés par poids, code postal et ville."""
+
+    def __init__(self, entries: List[TariffEntry]):
+        # Tri par poids minimum : résultats dans l'ordre des tranches
+        self.entries = sorted(entries, key=lambda e: e.weight_min)
+        self.weights = WeightIntervalTree(
+            (entry.weight_min, entry.weight_max, pos) for pos, entry in enumerate(self.entries)
+        )
+        # Tranches de volume : bornes NULL ouvertes (infinies)
+        self.volumes = WeightIntervalTree(
+            (
+                entry.volume_min if entry.volume_min is not None else -math.inf,
+                entry.volume_max if entry.volume_max is not None else math.inf,
+                pos,
+            )
+            for pos, entry in enumerate(self.entries)
+        )
+
+        self.origin = _LocationIndex()
+        self.dest = _LocationIndex()
+        for pos, entry in enumerate(self.entries):
+            self.origin.add(pos, entry.origin_postal_key, entry.origin_city_key)
+            self.dest.add(pos, entry.dest_postal_key, entry.dest_city_key)
+        self.origin.cp.freeze()
+        self.dest.cp.freeze()
+
+    def lookup(self, criteria: QuoteSearchRequest, weight: float) -> List[TariffEntry]:
+        """weight : poids taxable de la recherche pour le mode de la voie."""
+        weights = self.weights.stab(weight)
+        if not weights:
+            return []
+        if criteria.volume is not None:
+            weights = set(weights).intersection(self.volumes.stab(criteria.volume))
+            if not weights:
+                return []
+
+        origin = self.origin.candidates(criteria.origin_postal_code, criteria.origin_city)
+        if not origin:
+            return []
+        dest = self.dest.candidates(criteria.dest_postal_code, criteria.dest_city)
+
+        shipping_date = criteria.shipping_date
+        matches = []
+        for pos in sorted(origin.intersection(weights, dest)):
+            entry = self.entries[pos]
+            if entry.valid_from is not None and entry.valid_from > shipping_date:
+                continue
+            if entry.valid_until is not None and entry.valid_until < shipping_date:
+                continue
+            matches.append(entry)
+        return matches
+
+
+class TariffIndex:
+    """Index mémoire partagé par les requêtes d'un même worker."""
+
+    def __init__(self):
+        self._lanes: Dict[LaneKey, LaneIndex] = {}
+        self._built_at: Optional[float] = None
+        # Versions des snapshots chargés ({partner_id: version}), None si chargé (même en partie) depuis la base
+        self._snapshot_versions: Optional[Dict[str, str]] = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_stale(self) -> bool:
+        if self._built_at is None:
+            return True
+        return time.monotonic() - self._built_at > settings.tariff_index_ttl_seconds
+
+    def invalidate(self):
+        """Force une reconstruction à la prochaine recherche."""
+        self._built_at = None
+
+    def rebuild(self, db: Session) -> int:
+        """Recharge tous les tarifs depuis la base. Retourne le nombre de lignes indexées."""
+        with self._lock:
+            return self._rebuild(db)
+
+    def ensure_fresh(self, db: Session):
+        """
+        Reconstruit l'index s'il est absent ou expiré (un seul thread reconstruit).
+
+        Jamais d'attente sur le verrou : pendant une reconstruction, les autres requêtes
+        servent l'index précédent plutôt que de bloquer leur thread.
+        """
+        if not self.is_stale:
+            return
+        if self._lock.acquire(blocking=False):
+            try:
+                if self.is_stale:
+                    self._rebuild(db)
+            finally:
+                self._lock.release()
+        elif not self._lanes:
+            # Aucun index à servir pendant la première construction : construction indépendante
+            self._rebuild(db)
+
+    def _rebuild(self, db: Session) -> int:
+        versions = TariffSnapshot.versions() if settings.tariff_snapshot_enabled else {}
+        unpublished: List[str] = []
+        if not versions:
+            rows: Iterable[Any] = TariffIndex._query_rows(db)
+        else:
+            # Partenaires sans snapshot (importés avant l'activation, publication en échec) : lus en base
+            unpublished = TariffIndex._unpublished_partners(db, versions)
+            if not unpublished and versions == self._snapshot_versions:
+                # Aucune version changée : index conservé
+                self._built_at = time.monotonic()
+                return sum(len(lane.entries) for lane in self._lanes.values())
+            rows = TariffSnapshot.iter_rows(versions)
+            if unpublished:
+                rows = itertools.chain(rows, TariffIndex._query_rows(db, unpublished))
+        lanes, count = self._build_lanes(rows)
+
+        # Remplacement atomique : les recherches en cours gardent l'ancienne version
+        self._lanes = lanes
+        # Versions mémorisées seulement pour un index entièrement chargé depuis les snapshots
+        self._snapshot_versions = versions if versions and not unpublished else None
+        self._built_at = time.monotonic()
+        return count
+
+    @staticmethod
+    def _query_rows(db: Session, partner_ids: Optional[List[str]] = None) -> Iterable[Any]:
+        """Tarifs actifs lus en base (tous, ou ceux des partenaires donnés)."""
+        query = db.query(
+            PartnerQuote.id,
+            PartnerQuote.partner_id,
+            PartnerQuote.transport_mode,
+            PartnerQuote.origin_country_code,
+            PartnerQuote.dest_country_code,
+            PartnerQuote.origin_postal_key,
+            PartnerQuote.origin_city_key,
+            PartnerQuote.dest_postal_key,
+            PartnerQuote.dest_city_key,
+            PartnerQuote.weight_min,
+            PartnerQuote.weight_max,
+            PartnerQuote.volume_min,
+            PartnerQuote.volume_max,
+            PartnerQuote.valid_from,
+            PartnerQuote.valid_until,
+            PartnerQuote.cost,
+            PartnerQuote.pricing_type,
+        ).filter(PartnerQuote.is_active == True)  # noqa: E712
+        if partner_ids is not None:
+            query = query.filter(PartnerQuote.partner_id.in_(partner_ids))
+        return query.yield_per(5000)
+
+    @staticmethod
+    def _unpublished_partners(db: Session, versions: Dict[str, str]) -> List[str]:
+        """Partenaires ayant des tarifs actifs mais aucun snapshot publié."""
+        rows = (
+            db.query(PartnerQuote.partner_id)
+            .filter(
+                PartnerQuote.is_active == True,  # noqa: E712
+                PartnerQuote.partner_id.notin_(list(versions)),
+            )
+            .distinct()
+            .all()
+        )
+        return sorted(row.partner_id for row in rows)
+
+    @staticmethod
+    def _build_lanes(rows: Iterable[Any]) -> Tuple[Dict[LaneKey, LaneIndex], int]:
+        grouped: Dict[LaneKey, List[TariffEntry]] = {}
+        count = 0
+        for row in rows:
+            # Le filtre SQL (weight_min <= w AND weight_max >= w) exclut les poids NULL
+            if row.weight_min is None or row.weight_max is None:
+                continue
+            key = (TransportMode(row.transport_mode).value, row.origin_country_code, row.dest_country_code)
+            grouped.setdefault(key, []).append(TariffEntry(row))
+            count += 1
+        return {key: LaneIndex(entries) for key, entries in grouped.items()}, count
+
+    def lookup(self, criteria: QuoteSearchRequest) -> List[TariffEntry]:
+        """Candidats (voie, poids, validité) pré-filtrés sur la localisation."""
+        lanes = self._lanes
+        origin_country = DataNormalizer.country_code(criteria.origin_country)
+        dest_country = DataNormalizer.country_code(criteria.dest_country)
+
+        matches: List[TariffEntry] = []
+        for mode, weight in criteria.taxable_weights().items():
+            lane = lanes.get((mode, origin_country, dest_country))
+            if lane:
+                matches.extend(lane.lookup(criteria, weight))
+        return matches
+
+
+tariff_index = TariffIndex()
@@ -0,0 +1,156 @@
+"""
+Snapshots colonnaires des tarifs par partenaire (TARIFF_SNAPSHOT_ENABLED).
+
+Après chaque import, les colonnes utiles au matching sont publiées en fichiers
+NumPy .npy (une version par import) :
+
+    <TARIFF_SNAPSHOT_DIR>/<partner_id>/CURRENT        -> nom de la version courante
+    <TARIFF_SNAPSHOT_DIR>/<partner_id>/<version>/*.npy
+
+Les workers reconstruisent leur index mémoire (cf. TariffIndex) depuis ces fichiers,
+mappés en lecture seule puis convertis en objets Python : chaque worker garde sa
+propre copie de l'index, mais Postgres n'est plus sollicité pour recharger les tarifs.
+
+Les colonnes texte sont stockées en unicode à largeur fixe (mappable, contrairement
+aux tableaux d'objets) : la chaîne vide y représente NULL. Les dates utilisent
+datetime64 (NaT pour NULL).
+"""
+import math
+import os
+import shutil
+import uuid
+from collections import namedtuple
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from app.core.config import get_settings
+from app.models.partner_quote import PartnerQuote
+
+settings = get_settings()
+
+CURRENT_FILE = "CURRENT"
+
+TEXT_COLUMNS = (
+    "id", "transport_mode", "origin_country_code", "dest_country_code",
+    "origin_postal_key", "origin_city_key", "dest_postal_key", "dest_city_key", "pricing_type",
+)
+FLOAT_COLUMNS = ("weight_min", "weight_max", "cost")
+# Colonnes numériques nullables : NaN représente NULL
+NULLABLE_FLOAT_COLUMNS = ("volume_min", "volume_max")
+DATE_COLUMNS = ("valid_from", "valid_until")
+COLUMNS = TEXT_COLUMNS + FLOAT_COLUMNS + NULLABLE_FLOAT_COLUMNS + DATE_COLUMNS
+
+# Ligne relue depuis un snapshot : mêmes attributs que la projection SQL de TariffIndex
+# (le partenaire est donné par le répertoire du snapshot)
+SnapshotRow = namedtuple("SnapshotRow", COLUMNS + ("partner_id",))
+
+
+class TariffSnapshot:
+    @staticmethod
+    def partner_dir(partner_id: str) -> str:
+        return os.path.join(settings.tariff_snapshot_dir, partner_id)
+
+    @staticmethod
+    def publish(db: Session, partner_id: str) -> int:
+        """Écrit une nouvelle version du snapshot du partenaire puis la rend courante. Retourne le nombre de lignes."""
+        rows = (
+            db.query(*(getattr(PartnerQuote, column) for column in COLUMNS))
+            .filter(
+                PartnerQuote.partner_id == partner_id,
+                PartnerQuote.is_active == True,  # noqa: E712
+                # Lignes ignorées par l'index (cf. TariffIndex._build_lanes)
+                PartnerQuote.weight_min.isnot(None),
+                PartnerQuote.weight_max.isnot(None),
+            )
+            .all()
+        )
+
+        partner_dir = TariffSnapshot.partner_dir(partner_id)
+        version = uuid.uuid4().hex
+        version_dir = os.path.join(partner_dir, version)
+        os.makedirs(version_dir, exist_ok=True)
+
+        columns = list(zip(*rows)) if rows else [()] * len(COLUMNS)
+        for name, values in zip(COLUMNS, columns):
+            np.save(os.path.join(version_dir, f"{name}.npy"), TariffSnapshot._to_array(name, values))
+
+        # Bascule atomique : un lecteur voit l'ancienne ou la nouvelle version, jamais un mélange
+        tmp_current = os.path.join(partner_dir, f"{CURRENT_FILE}.{version}")
+        with open(tmp_current, "w") as f:
+            f.write(version)
+        previous = TariffSnapshot._current_version(partner_dir)
+        os.replace(tmp_current, os.path.join(partner_dir, CURRENT_FILE))
+
+        # La version précédente est conservée pour les lectures en cours
+        for name in os.listdir(partner_dir):
+            path = os.path.join(partner_dir, name)
+            if os.path.isdir(path) and name not in (version, previous):
+                shutil.rmtree(path, ignore_errors=True)
+        return len(rows)
+
+    @staticmethod
+    def remove(partner_id: str):
+        """Supprime le snapshot d'un partenaire (tarifs supprimés)."""
+        shutil.rmtree(TariffSnapshot.partner_dir(partner_id), ignore_errors=True)
+
+    @staticmethod
+    def versions() -> Dict[str, str]:
+        """Version courante de chaque partenaire publié ({partner_id: version})."""
+        root = settings.tariff_snapshot_dir
+        if not os.path.isdir(root):
+            return {}
+        versions = {}
+        for partner_id in os.listdir(root):
+            version = TariffSnapshot._current_version(os.path.join(root, partner_id))
+            if version:
+                versions[partner_id] = version
+        return versions
+
+    @staticmethod
+    def iter_rows(versions: Dict[str, str]) -> Iterator[SnapshotRow]:
+        """Relit les lignes des versions données (fichiers mappés en lecture seule, copiés en listes Python)."""
+        for partner_id, version in versions.items():
+            version_dir = os.path.join(TariffSnapshot.partner_dir(partner_id), version)
+            columns = [TariffSnapshot._load_column(version_dir, name) for name in COLUMNS]
+            for values in zip(*columns):
+                yield SnapshotRow(*values, partner_id)
+
+    @staticmethod
+    def _load_column(version_dir: str, name: str) -> List:
+        path = os.path.join(version_dir, f"{name}.npy")
+        if name in NULLABLE_FLOAT_COLUMNS and not os.path.exists(path):
+            # Snapshot publié avant l'ajout de la colonne : NULL partout
+            count = len(np.load(os.path.join(version_dir, "id.npy"), mmap_mode="r"))
+            return [None] * count
+        return TariffSnapshot._from_array(name, np.load(path, mmap_mode="r"))
+
+    @staticmethod
+    def _current_version(partner_dir: str) -> Optional[str]:
+        try:
+            with open(os.path.join(partner_dir, CURRENT_FILE)) as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    @staticmethod
+    def _to_array(name: str, values) -> np.ndarray:
+        if name in FLOAT_COLUMNS:
+            return np.array([float(v) for v in values], dtype=np.float64)
+        if name in NULLABLE_FLOAT_COLUMNS:
+            return np.array([float(v) if v is not None else np.nan for v in values], dtype=np.float64)
+        if name in DATE_COLUMNS:
+            return np.array([v if v is not None else "NaT" for v in values], dtype="datetime64[s]")
+        # Enum (transport_mode) -> valeur ; NULL -> ""
+        texts = [getattr(v, "value", v) or "" for v in values]
+        return np.array(texts, dtype=np.str_) if texts else np.array([], dtype="U1")
+
+    @staticmethod
+    def _from_array(name: str, array: np.ndarray) -> List:
+        values = array.tolist()
+        if name in TEXT_COLUMNS:
+            return [v or None for v in values]
+        if name in NULLABLE_FLOAT_COLUMNS:
+            return [None if math.isnan(v) else v for v in values]
+        return values
@@ -1,12 +1,14 @@
 import pytest
 from typing import Generator
 from fastapi.testclient import TestClient
+from redis.asyncio import Redis
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 
 from app.main import app
 from app.core.config import get_settings
 from app.core.database import get_db
+from app.core.redis import get_async_redis
 
 settings = get_settings()
 
@@ -31,6 +33,11 @@ def db() -> Generator:
 @pytest.fixture(scope="function")
 def client(db) -> Generator:
     app.dependency_overrides[get_db] = lambda: db
+    # Client Redis asynchrone propre à la boucle d'événements de chaque TestClient
+    app.dependency_overrides[get_async_redis] = lambda: Redis(
+        host=settings.redis_host, port=settings.redis_port, password=settings.redis_password,
+        decode_responses=True,
+    )
     with TestClient(app) as c:
         yield c
     app.dependency_overrides.clear()
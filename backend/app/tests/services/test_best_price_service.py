@@ -0,0 +1,118 @@
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from app.models.lane_best_price import LaneBestPrice
+from app.models.partner import Partner
+from app.models.partner_quote import PartnerQuote
+from app.schemas.matching import QuoteSearchRequest
+from app.schemas.partner_quote import PartnerQuoteCreate
+from app.services.best_price_service import BestPriceService
+from app.services.quote_service import QuoteService
+
+
+def seed_partner(db, code, quotes, pricing_type=None):
+    partner = Partner(code=code, name=code)
+    db.add(partner)
+    db.commit()
+    QuoteService.bulk_create_quotes(db, [
+        PartnerQuoteCreate(
+            partner_id=partner.id, transport_mode="ROAD", origin_postal_code="06", origin_city="Nice",
+            origin_country="FR", dest_city="Bestville", dest_country="IT", **quote,
+        )
+        for quote in quotes
+    ])
+    if pricing_type:
+        db.query(PartnerQuote).filter(PartnerQuote.partner_id == partner.id).update({"pricing_type": pricing_type})
+        db.commit()
+    return partner
+
+
+def days(offset: int) -> datetime:
+    return datetime.combine(date.today() + timedelta(days=offset), datetime.min.time())
+
+
+def search(**overrides) -> QuoteSearchRequest:
+    params = dict(
+        origin_country="FR", origin_postal_code="06200", dest_country="IT", dest_city="Bestville", weight=250,
+    )
+    params.update(overrides)
+    return QuoteSearchRequest(**params)
+
+
+def test_refresh_keeps_the_cheapest_candidate_per_bracket(db):
+    first = seed_partner(db, "BEST_A", [
+        dict(weight_min=0, weight_max=300, cost=Decimal("9")),
+        dict(weight_min=301, weight_max=1000, cost=Decimal("6")),
+    ])
+    second = seed_partner(db, "BEST_B", [
+        dict(weight_min=0, weight_max=300, cost=Decimal("7")),
+        dict(weight_min=0, weight_max=300, cost=Decimal("8")),
+    ])
+
+    BestPriceService.refresh_partner(db, first.id)
+    assert BestPriceService.refresh_partner(db, second.id) == 1
+
+    winners = (
+        db.query(LaneBestPrice)
+        .filter(LaneBestPrice.dest_city_key == "BESTVILLE")
+        .order_by(LaneBestPrice.weight_min)
+        .all()
+    )
+    # Tranche 0-300 : un seul candidat (même type, même validité), le moins cher des deux partenaires
+    assert [(w.partner_id, w.weight_max, float(w.cost)) for w in winners] == [
+        (second.id, 300, 7.0), (first.id, 1000, 6.0),
+    ]
+
+
+def test_best_offers_prices_the_winners_of_matching_brackets(db):
+    first = seed_partner(db, "BEST_A", [dict(weight_min=0, weight_max=300, cost=Decimal("9"))])
+    second = seed_partner(db, "BEST_B", [
+        dict(weight_min=0, weight_max=300, cost=Decimal("7")),
+        dict(weight_min=201, weight_max=500, cost=Decimal("5")),
+    ])
+    BestPriceService.refresh_partner(db, first.id)
+    BestPriceService.refresh_partner(db, second.id)
+
+    # 250 kg : gagnants 0-300 (3 x 7) et 201-500 (3 x 5), meilleure offre par partenaire
+    offers = BestPriceService.best_offers(db, search())
+    assert [(o.partner_code, o.weight_max, o.total) for o in offers] == [("BEST_B", 500, 15.0)]
+
+    # 50 kg : seule la tranche 0-300, où BEST_A (9) a perdu face à BEST_B (7)
+    offers = BestPriceService.best_offers(db, search(weight=50))
+    assert [(o.partner_code, o.total) for o in offers] == [("BEST_B", 7.0)]
+
+
+def test_refresh_after_deletion_promotes_the_next_partner(db):
+    first = seed_partner(db, "BEST_A", [dict(weight_min=0, weight_max=300, cost=Decimal("9"))])
+    second = seed_partner(db, "BEST_B", [dict(weight_min=0, weight_max=300, cost=Decimal("7"))])
+    BestPriceService.refresh_partner(db, first.id)
+    BestPriceService.refresh_partner(db, second.id)
+
+    QuoteService.delete_all_by_partner(db, second.id)
+
+    offers = BestPriceService.best_offers(db, search())
+    assert [(o.partner_code, o.unit_price, o.total) for o in offers] == [("BEST_A", 9.0, 27.0)]
+
+
+def test_candidates_keep_other_pricing_types_and_validity_periods(db):
+    lumpsum = seed_partner(db, "BEST_A", [dict(weight_min=0, weight_max=1000, cost=Decimal("100"))], "LUMPSUM")
+    per_100kg = seed_partner(db, "BEST_B", [
+        dict(weight_min=0, weight_max=1000, cost=Decimal("15"), valid_until=days(10)),
+        dict(weight_min=0, weight_max=1000, cost=Decimal("12"), valid_from=days(11)),
+        dict(weight_min=0, weight_max=1000, cost=Decimal("1"), valid_until=days(-1)),
+    ])
+    BestPriceService.refresh_partner(db, lumpsum.id)
+    # Tarif expiré écarté, tarif futur conservé
+    assert BestPriceService.refresh_partner(db, per_100kg.id) == 2
+
+    # Départage au poids demandé : 1 x 15 < 100 à 100 kg, 10 x 15 > 100 à 1000 kg
+    assert [(o.partner_code, o.total) for o in BestPriceService.best_offers(db, search(weight=100, limit=1))] == [
+        ("BEST_B", 15.0),
+    ]
+    assert [(o.partner_code, o.total) for o in BestPriceService.best_offers(db, search(weight=1000, limit=1))] == [
+        ("BEST_A", 100.0),
+    ]
+
+    # Et à la date demandée : le tarif futur prend le relais
+    offers = BestPriceService.best_offers(db, search(weight=100, shipping_date=date.today() + timedelta(days=20)))
+    assert [(o.partner_code, o.unit_price) for o in offers] == [("BEST_B", 12.0)]
@@ -0,0 +1,55 @@
+from types import SimpleNamespace
+
+from app.services.city_index import CityIndex, trigrams
+from app.services.import_logic.data_normalizer import DataNormalizer
+
+
+def make_index(*cities) -> CityIndex:
+    """cities: (city, country, count, zip)."""
+    index = CityIndex()
+    index.load(
+        SimpleNamespace(key=DataNormalizer.city_key(city), country=country, city=city, count=count, zip=zip)
+        for city, country, count, zip in cities
+    )
+    return index
+
+
+def test_city_key_ignores_accents_punctuation_and_abbreviations():
+    keys = {DataNormalizer.city_key(v) for v in ["St Etienne", "SAINT-ETIENNE", "Saint Étienne", " saint  etienne "]}
+    assert keys == {"SAINT ETIENNE"}
+    assert DataNormalizer.city_key("Ste-Foy-lès-Lyon") == "SAINTE FOY LES LYON"
+    assert DataNormalizer.city_key(DataNormalizer.city_key("Köln")) == "KOLN"
+    assert DataNormalizer.city_key("--") is None
+
+
+def test_trigrams_partial_word():
+    assert trigrams("NICE") == {"  N", " NI", "NIC", "ICE", "CE "}
+    assert "CE " not in trigrams("NICE", partial=True)
+
+
+def test_suggest_merges_spellings_and_ranks_prefix_first():
+    index = make_index(
+        ("SAINT-ETIENNE", "FR", 3, "42000"),
+        ("ST ETIENNE", "FR", 5, None),
+        ("ETAMPES", "FR", 10, "91150"),
+        ("MARSEILLE", "FR", 8, "13"),
+        ("ALL", "FR", 50, None),
+    )
+
+    suggestions = index.suggest("Saint Étien")
+    assert suggestions == [{"city": "ST ETIENNE", "country": "FR", "count": 8, "zip": "42000"}]
+
+    # "ET" : début de clé avant début de mot
+    assert [s["city"] for s in index.suggest("et")] == ["ETAMPES", "ST ETIENNE"]
+    # Faute de frappe
+    assert [s["city"] for s in index.suggest("marsielle")] == ["MARSEILLE"]
+    assert index.suggest("zz") == []
+
+
+def test_closest_suggests_a_known_city():
+    index = make_index(("MARSEILLE", "FR", 8, "13"), ("MILANO", "IT", 3, None))
+
+    assert index.closest("FR", "Marseile") == {"city": "MARSEILLE", "country": "FR", "count": 8, "zip": "13"}
+    assert index.closest("IT", "Marseile") is None
+    assert index.closest("FR", "Marseille") is None
+    assert index.closest("FR", "Lyon") is None
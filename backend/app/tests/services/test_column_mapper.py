@@ -0,0 +1,37 @@
+from app.services.import_logic.column_mapper import ColumnMapper
+
+
+ZONE_SHEET = {
+    "layout": "zone_matrix",
+    "columns": {"dest_country": "Country"},
+    "defaults": {"transport_mode": "ROAD", "origin_country": "FR"},
+    "zone_matrix": {
+        "weight_column": "kg",
+        "zone_to_postcodes": {"Z1": ["10", "11"]},
+        "zone_to_postcode_ranges": {"Z2": [["4000", "4199"]]},
+    },
+}
+
+
+def test_zone_matrix_plan_is_compiled_once_per_header():
+    mapper = ColumnMapper()
+    row = {"kg": "0-20", "country": "PT", "z1": 12.5, "z2": "8,5", "unnamed:_4": 99, "z3": None}
+
+    rows = mapper.map_row_with_sheet_config(row, ZONE_SHEET)
+    mapper.map_row_with_sheet_config({**row, "kg": "-50"}, ZONE_SHEET, 20.0)
+
+    assert len(mapper._plans) == 1
+    assert [(r["dest_postal_code"], r["cost"]) for r in rows] == [("10", 12.5), ("11", 12.5), ("40", 8.5), ("41", 8.5)]
+    assert rows[0]["dest_country"] == "PT" and rows[0]["weight_max"] == 20.0 and rows[0]["pricing_type"] == "LUMPSUM"
+
+    # Autres en-têtes : nouveau plan
+    mapper.map_row_with_sheet_config({"kg": "100", "z1": 3}, ZONE_SHEET)
+    assert len(mapper._plans) == 2
+
+
+def test_flat_mapping_resolves_aliases_from_normalized_headers():
+    mapper = ColumnMapper()
+    row = {"Ville Départ": "Nice", "pays_arrivee": "IT", "Prix": "12,50", "inconnue": 1}
+
+    assert mapper.map_row(row) == [{"origin_city": "Nice", "dest_country": "IT", "cost": 12.5}]
+    assert mapper.map_row({**row, "Prix": None}) == []
@@ -0,0 +1,42 @@
+from pathlib import Path
+
+import pytest
+from openpyxl import Workbook
+
+from app.services.parsers.excel_parser import ExcelParser
+
+
+def test_iter_rows_streams_sheet_like_parse(tmp_path):
+    path = tmp_path / "tarifs.xlsx"
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.title = "Tarifs"
+    sheet.append(["Grille 2024"])
+    sheet.append(["Zone", "Dest CP", None, "Zone", 100])
+    sheet.append(["A", "06000", None, "B", 12.0])
+    sheet.append([])
+    sheet.append(["C", "N/A", None, None, 7.5, "hors en-tête"])
+    sheet.append([])
+    workbook.save(path)
+
+    rows = list(ExcelParser().iter_rows(str(path), sheet_name="Tarifs", header_row=1))
+
+    # Ligne vide intérieure conservée, lignes vides finales ignorées
+    assert len(rows) == 3
+    assert rows[0] == {"zone": "A", "dest_cp": "06000", "unnamed:_2": None, "zone.1": "B", "100": 12}
+    assert rows[1] == dict.fromkeys(rows[0])
+    assert rows[2]["dest_cp"] is None
+    # Colonnes fixées par l'en-tête : cellule au-delà ignorée
+    assert all(list(row) == list(rows[0]) for row in rows)
+
+
+def test_iter_rows_reads_legacy_xls_through_pandas():
+    path = Path(__file__).resolve().parents[4] / "file_import" / "Copie de tarifEdition_64_02350_250109_1641.xls"
+    if not path.exists():
+        pytest.skip("fichier exemple .xls absent")
+
+    parser = ExcelParser()
+    rows = list(parser.iter_rows(str(path)))
+
+    assert len(rows) == 44
+    assert rows == parser.parse(str(path))
@@ -0,0 +1,113 @@
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from app.services import import_service
+from app.services.import_logic.row_validator import RowValidator
+from app.services.import_service import ImportService, shutdown_sheet_pool
+
+SHEETS = [{"sheet_name": "S1"}, {"sheet_name": "S2"}, {"sheet_name": "S3"}]
+
+
+def fake_map_sheet(file_path, file_type, partner_id, sheet_conf):
+    if sheet_conf["sheet_name"] == "S2":
+        raise ValueError("feuille illisible")
+    return {"rows": 1, "quotes": [], "errors": [], "sheet": sheet_conf["sheet_name"]}
+
+
+class FakePool:
+    """Pool synchrone : chaque soumission est exécutée (ou casse le pool) immédiatement."""
+
+    def __init__(self, broken=False):
+        self.broken = broken
+        self.submitted = []
+        self.shutdown_calls = []
+
+    def submit(self, fn, *args):
+        self.submitted.append(args[-1]["sheet_name"])
+        future = Future()
+        if self.broken:
+            future.set_exception(BrokenProcessPool("worker mort"))
+            return future
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self.shutdown_calls.append((wait, cancel_futures))
+
+
+@pytest.fixture
+def sheets_env(monkeypatch):
+    monkeypatch.setattr(import_service, "map_sheet", fake_map_sheet)
+    monkeypatch.setattr(import_service, "_sheet_pool", None)
+    yield monkeypatch
+    import_service._sheet_pool = None
+
+
+def test_sequential_sheets_turn_failures_into_errors(sheets_env):
+    sheets_env.setattr(import_service, "_sheet_workers", lambda: 1)
+
+    results = list(ImportService._map_sheets("f.xlsx", "XLSX", "p1", SHEETS))
+
+    assert [r.get("sheet") for r in results] == ["S1", None, "S3"]
+    assert results[1]["rows"] == 0
+    assert results[1]["errors"][0]["sheet"] == "S2"
+    assert "feuille illisible" in results[1]["errors"][0]["error"]
+
+
+def test_pool_yields_each_sheet_before_submitting_the_rest(sheets_env):
+    pool = FakePool()
+    sheets_env.setattr(import_service, "_sheet_workers", lambda: 2)
+    sheets_env.setattr(import_service, "_get_sheet_pool", lambda: pool)
+
+    results = ImportService._map_sheets("f.xlsx", "XLSX", "p1", SHEETS)
+    first = next(results)
+
+    # Au plus une feuille d'avance par process
+    assert first["sheet"] == "S1"
+    assert pool.submitted == ["S1", "S2"]
+    rest = list(results)
+    assert [r.get("sheet") for r in rest] == [None, "S3"]
+    assert "feuille illisible" in rest[0]["errors"][0]["error"]
+    assert pool.submitted == ["S1", "S2", "S3"]
+
+
+def test_broken_pool_is_shut_down_and_sheets_run_sequentially(sheets_env):
+    pool = FakePool(broken=True)
+    sheets_env.setattr(import_service, "_sheet_workers", lambda: 2)
+    sheets_env.setattr(import_service, "_sheet_pool", pool)
+    sheets_env.setattr(import_service, "_get_sheet_pool", lambda: pool)
+
+    results = list(ImportService._map_sheets("f.xlsx", "XLSX", "p1", SHEETS))
+
+    assert [r.get("sheet") for r in results] == ["S1", None, "S3"]
+    assert pool.shutdown_calls == [(False, True)]
+    assert import_service._sheet_pool is None
+
+
+def test_real_pool_reports_failed_sheets(monkeypatch, tmp_path):
+    monkeypatch.setattr(import_service, "_sheet_workers", lambda: 2)
+    missing = str(tmp_path / "absent.xlsx")
+    try:
+        results = list(ImportService._map_sheets(missing, "XLSX", "p1", SHEETS[:2]))
+    finally:
+        shutdown_sheet_pool()
+
+    assert [r["errors"][0]["sheet"] for r in results] == ["S1", "S2"]
+    assert all(r["rows"] == 0 and r["quotes"] == [] for r in results)
+
+
+def test_inverted_weight_bracket_is_rejected():
+    row = {
+        "transport_mode": "ROAD", "origin_city": "Nice", "origin_country": "FR",
+        "dest_city": "Milano", "dest_country": "IT", "cost": 10, "weight_min": 500, "weight_max": 100,
+    }
+    result = RowValidator().validate(row)
+
+    assert not result.is_valid
+    assert [e.field for e in result.errors] == ["weight_max"]
+    assert RowValidator().validate({**row, "weight_min": 100, "weight_max": 100}).is_valid
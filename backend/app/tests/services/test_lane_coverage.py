@@ -0,0 +1,68 @@
+from types import SimpleNamespace
+
+from app.schemas.matching import LaneCriteria
+from app.services.lane_coverage import LaneCoverage
+
+
+def make_coverage(*quotes) -> LaneCoverage:
+    """quotes: (mode, origin_country, dest_country, origin_postal_key, dest_postal_key)."""
+    def rows(side):
+        return [
+            SimpleNamespace(transport_mode=mode, origin_country=oc, dest_country=dc, postal_key=keys[side])
+            for mode, oc, dc, *keys in quotes
+        ]
+
+    coverage = LaneCoverage()
+    coverage.load(rows(0), rows(1))
+    return coverage
+
+
+def lane(**kw) -> LaneCriteria:
+    return LaneCriteria(**{"origin_country": "FR", "origin_city": "Nice", "dest_country": "IT", "dest_city": "Milano", **kw})
+
+
+def test_covers_lane_and_bidirectional_postal_prefix():
+    coverage = make_coverage(("ROAD", "FR", "IT", "06", "20"), ("ROAD", "FR", "IT", "13", "2231"))
+
+    assert coverage.covers(lane())
+    assert coverage.covers(lane(origin_postal_code="06200", dest_postal_code="20100"))
+    # Code du tarif plus long que le code recherché
+    assert coverage.covers(lane(dest_postal_code="22"))
+    assert not coverage.covers(lane(dest_postal_code="30"))
+    assert not coverage.covers(lane(origin_postal_code="75001"))
+    assert not coverage.covers(lane(dest_country="DE"))
+    assert not coverage.covers(lane(transport_mode="AIR"))
+
+
+def test_quote_without_postal_code_covers_whole_side():
+    coverage = make_coverage(("SEA", "FR", "IT", "13", None))
+
+    assert coverage.covers(lane(dest_postal_code="99999", dest_city="Genova"))
+    assert not coverage.covers(lane(origin_postal_code="69"))
+
+
+def test_destinations_from_origin():
+    coverage = make_coverage(
+        ("ROAD", "FR", "IT", "06", "20"),
+        ("RAIL", "FR", "IT", "13", "10"),
+        ("ROAD", "FR", "HR", "06", None),
+        ("ROAD", "IT", "FR", None, "75"),
+    )
+
+    assert coverage.destinations("fr", "06000") == [
+        {"country": "HR", "any_postal_code": True, "postal_codes": []},
+        {"country": "IT", "any_postal_code": False, "postal_codes": ["20"]},
+    ]
+    assert coverage.destinations("FR", transport_mode="RAIL") == [
+        {"country": "IT", "any_postal_code": False, "postal_codes": ["10"]},
+    ]
+    assert coverage.destinations("DE") == []
+
+
+def test_origin_without_destination_rows_is_not_covered():
+    # Voie activée entre la lecture des origines et celle des destinations
+    coverage = LaneCoverage()
+    coverage.load([SimpleNamespace(transport_mode="ROAD", origin_country="FR", dest_country="IT", postal_key="06")], [])
+
+    assert not coverage.covers(lane())
+    assert coverage.destinations("FR") == []
@@ -0,0 +1,66 @@
+from app.schemas.matching import QuoteSearchRequest
+from app.services import match_cache
+from app.services.match_cache import MatchCache
+
+
+class FakeRedis:
+    def __init__(self):
+        self.hashes = {}
+        self.values = {}
+
+    def hgetall(self, name):
+        return dict(self.hashes.get(name, {}))
+
+    def hincrby(self, name, key, amount):
+        h = self.hashes.setdefault(name, {})
+        h[key] = str(int(h.get(key, 0)) + amount)
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def setex(self, key, ttl, value):
+        self.values[key] = value
+
+
+def search(**overrides) -> QuoteSearchRequest:
+    params = dict(origin_country="FR", origin_postal_code="06", dest_country="IT", dest_city="Milano", weight=250)
+    params.update(overrides)
+    return QuoteSearchRequest(**params)
+
+
+def test_key_is_normalized_and_follows_partner_generation(monkeypatch):
+    fake = FakeRedis()
+    monkeypatch.setattr(match_cache, "get_redis", lambda: fake)
+    monkeypatch.setattr(match_cache.settings, "match_cache_enabled", True)
+
+    key = MatchCache.key_for(search())
+    assert key == MatchCache.key_for(search(dest_city=" milano ", origin_country="fr"))
+    assert key != MatchCache.key_for(search(weight=300))
+
+    MatchCache.set(key, [])
+    assert MatchCache.get(key) == []
+
+    MatchCache.bump_partner("partner-1")
+    new_key = MatchCache.key_for(search())
+    assert new_key != key
+    assert MatchCache.get(new_key) is None
+
+
+def test_disabled_cache_has_no_key(monkeypatch):
+    monkeypatch.setattr(match_cache.settings, "match_cache_enabled", False)
+    assert MatchCache.key_for(search()) is None
+    assert MatchCache.get(None) is None
+
+
+def test_key_follows_surcharge_and_city_versions(monkeypatch):
+    fake = FakeRedis()
+    monkeypatch.setattr(match_cache, "get_redis", lambda: fake)
+    monkeypatch.setattr(match_cache.settings, "match_cache_enabled", True)
+
+    key = MatchCache.key_for(search())
+    monkeypatch.setattr(match_cache.surcharge_engine, "version", "autre-fichier")
+    surcharge_key = MatchCache.key_for(search())
+    assert surcharge_key != key
+
+    monkeypatch.setattr(match_cache, "CITY_KEY_VERSION", match_cache.CITY_KEY_VERSION + 1)
+    assert MatchCache.key_for(search()) not in (key, surcharge_key)
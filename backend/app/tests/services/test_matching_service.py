@@ -0,0 +1,135 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+from app.schemas.matching import QuoteSearchRequest
+from app.services import matching_service
+from app.services.matching_service import MatchingService
+
+
+def search(**overrides) -> QuoteSearchRequest:
+    params = dict(origin_country="FR", origin_postal_code="06200", dest_country="IT", dest_city="Milano", weight=250)
+    params.update(overrides)
+    return QuoteSearchRequest(**params)
+
+
+def test_price_vector_applies_pricing_types():
+    costs = np.array([17.0, 0.5, 99.0, 40.0])
+    pricing_types = np.array(["PER_100KG", "PER_KG", "LUMPSUM", None], dtype=object)
+
+    billable, base = MatchingService._price_vector(costs, pricing_types, 250)
+
+    assert billable.tolist() == [300.0, 250.0, 250.0, 250.0]
+    assert base.tolist() == [51.0, 125.0, 99.0, 40.0]
+
+
+def test_build_breakdown_formula():
+    breakdown = MatchingService._build_breakdown(17, "PER_100KG", 250, 300.0, 51.0)
+    assert breakdown.formula == "17.00 × 3 = 51.00 €"
+    assert breakdown.total == 51.0
+
+
+def test_location_match_postal_prefix_and_city():
+    match = MatchingService._is_location_match
+    assert match("06200", None, "06", "NICE")
+    assert not match("13000", None, "06", "NICE")
+    assert match(None, "nice ", "06", "NICE")
+    assert not match("06200", "Cannes", "06", "NICE")
+    assert match(None, "Lyon", None, "ALL")
+    assert match(None, None, None, None)
+
+
+def test_rank_orders_by_total_price_then_paginates():
+    def entry(id, cost, pricing_type):
+        return SimpleNamespace(id=id, cost=cost, pricing_type=pricing_type, partner_id="p1",
+                               origin_city_key="NICE", dest_city_key="MILANO")
+
+    entries = [
+        entry("a", 17.0, "PER_100KG"),  # 51.00
+        entry("b", 99.0, "LUMPSUM"),    # 99.00
+        entry("c", 0.1, "PER_KG"),      # 25.00
+        entry("d", 25.0, "LUMPSUM"),    # 25.00
+    ]
+    ranked = MatchingService._rank(entries, search(limit=3))
+    assert [e.id for e in ranked] == ["c", "d", "a"]
+    assert [e.id for e in MatchingService._rank(entries, search(limit=2, offset=2))] == ["a", "b"]
+    assert [e.id for e in MatchingService._rank(entries, search(sort="price"))] == ["c", "d", "a", "b"]
+
+
+def test_validity_filter_compares_dates_without_time():
+    from datetime import date, datetime
+    from sqlalchemy.dialects import postgresql
+
+    clause = MatchingService._validity_filter(date(2026, 1, 15), date(2026, 1, 20))
+    params = clause.compile(dialect=postgresql.dialect()).params
+    assert set(params.values()) == {datetime(2026, 1, 21), datetime(2026, 1, 15)}
+
+
+def test_build_results_from_plain_rows():
+    from collections import namedtuple
+    from datetime import datetime
+    from decimal import Decimal
+
+    from app.services.matching_service import PARTNER_FIELDS, QUOTE_FIELDS
+
+    keys = ("origin_postal_key", "origin_city_key", "dest_postal_key", "dest_city_key")
+    ResultRow = namedtuple("ResultRow", QUOTE_FIELDS + tuple(f"partner__{name}" for name in PARTNER_FIELDS) + keys)
+    now = datetime(2026, 1, 1)
+    values = dict(
+        transport_mode="ROAD", origin_postal_code="06", origin_city="NICE", origin_country="FR",
+        dest_postal_code=None, dest_city="MILANO", dest_country="IT", weight_min=0.0, weight_max=500.0,
+        volume_min=None, volume_max=None, cost=Decimal("17.00"), pricing_type="PER_100KG", currency="EUR",
+        delivery_time=None, id="q1", partner_id="p1", valid_from=now, valid_until=None, is_active=True,
+        import_job_id=None, created_at=now,
+    )
+    partner = dict(code="BIANCHI", name="Bianchi", email=None, id="p1", rating=0.0, is_active=True,
+                   created_at=now, updated_at=now)
+    row = ResultRow(*[values[name] for name in QUOTE_FIELDS], *[partner[name] for name in PARTNER_FIELDS],
+                    "06", "NICE", None, "MILANO")
+
+    (result,) = MatchingService._build_results([row], search(weight=250))
+    dumped = result.model_dump(mode="json")
+    assert dumped["cost"] == "51.00"
+    assert dumped["partner"]["code"] == "BIANCHI"
+    assert dumped["price_breakdown"]["formula"] == "17.00 × 3 = 51.00 €"
+
+
+def test_rate_curve_request_shares_lane_validation():
+    import pytest
+    from pydantic import ValidationError
+
+    from app.schemas.matching import RateCurveRequest
+
+    lane = dict(origin_country="FR", origin_postal_code="06", dest_country="IT", dest_city="Milano")
+    assert RateCurveRequest(**lane).weights is None
+    with pytest.raises(ValidationError):
+        RateCurveRequest(**lane, weights=[100, -5])
+    with pytest.raises(ValidationError):
+        RateCurveRequest(origin_country="FR", dest_country="IT", dest_city="Milano")
+
+
+def test_taxable_weight_per_mode_prices_each_candidate():
+    from app.models.partner_quote import TransportMode
+
+    criteria = search(weight=50, volume=0.7)
+    assert criteria.taxable_weights()["ROAD"] == 175.0
+    assert criteria.taxable_weights()["SEA"] == 700.0
+    assert search(weight=500, volume=0.7).taxable_weight() == 500
+
+    quotes = [
+        SimpleNamespace(transport_mode=TransportMode.ROAD, cost=17.0, pricing_type="PER_100KG"),
+        SimpleNamespace(transport_mode="SEA", cost=0.1, pricing_type="PER_KG"),
+    ]
+    weights = MatchingService._taxable_weights(quotes, criteria)
+    billable, base = MatchingService._price_quotes(quotes, weights)
+    assert billable.tolist() == [200.0, 700.0]
+    assert base.tolist() == [34.0, 70.0]
+
+
+def test_prepare_criteria_keys_cities_without_substituting(monkeypatch):
+    monkeypatch.setattr(matching_service.surcharge_engine, "ensure_fresh", lambda db: None)
+
+    criteria = MatchingService._prepare_criteria(None, search(origin_city="St Étienne", dest_city="Milan0"))
+
+    # Ville inconnue : clé saisie, jamais la ville proche
+    assert (criteria.origin_city, criteria.dest_city) == ("SAINT ETIENNE", "MILAN0")
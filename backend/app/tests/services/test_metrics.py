@@ -0,0 +1,30 @@
+from app.core.metrics import Histogram, StageTimer
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("demo_seconds", "Demo", (0.1, 1.0), label="stage")
+    histogram.observe(0.05, "sql")
+    histogram.observe(0.5, "sql")
+    histogram.observe(3.0, "sql")
+
+    lines = histogram.render()
+    assert 'demo_seconds_bucket{stage="sql",le="0.1"} 1' in lines
+    assert 'demo_seconds_bucket{stage="sql",le="1.0"} 2' in lines
+    assert 'demo_seconds_bucket{stage="sql",le="+Inf"} 3' in lines
+    assert 'demo_seconds_count{stage="sql"} 3' in lines
+
+
+def test_stage_timer_server_timing_and_disabled_mode():
+    timer = StageTimer()
+    with timer.stage("sql"):
+        pass
+    timer.count("candidates", 12)
+    header = timer.server_timing()
+    assert header.startswith("sql;dur=")
+    assert 'candidates;desc="12"' in header
+
+    disabled = StageTimer(enabled=False)
+    with disabled.stage("sql"):
+        pass
+    disabled.count("candidates", 12)
+    assert disabled.server_timing() == ""
@@ -0,0 +1,77 @@
+from decimal import Decimal
+
+from app.models.import_job import ImportJob, ImportStatus
+from app.models.partner import Partner
+from app.models.partner_quote import PartnerQuote
+from app.schemas.partner_quote import PartnerQuoteCreate
+from app.services import quote_service
+from app.services.quote_service import QuoteService
+from app.services.tariff_index import tariff_index
+
+
+def test_insert_values_apply_column_defaults_like_the_orm():
+    quote_in = PartnerQuoteCreate(
+        partner_id="p1", transport_mode="ROAD", origin_city="St Étienne", origin_country="France",
+        dest_city="Milano", dest_country="IT", cost=Decimal("12.50"),
+    )
+    first, second = QuoteService._insert_values(quote_in), QuoteService._insert_values(quote_in)
+
+    # Identifiant et dates évalués ligne par ligne
+    assert first["id"] != second["id"]
+    assert first["valid_from"] is not None and first["is_active"] is True
+    assert first["pricing_type"] == "PER_100KG"
+    assert first["origin_city_key"] == "SAINT ETIENNE"
+    assert first["valid_until"] is None
+
+
+def test_staging_is_scoped_to_the_import_job(db):
+    partner = Partner(code="STAGING", name="STAGING")
+    db.add(partner)
+    db.commit()
+    jobs = [
+        ImportJob(partner_id=partner.id, filename="tarifs.xlsx", file_type="XLSX", status=ImportStatus.PROCESSING)
+        for _ in range(3)
+    ]
+    db.add_all(jobs)
+    db.commit()
+    quote_in = PartnerQuoteCreate(
+        partner_id=partner.id, transport_mode="ROAD", origin_city="Nice", origin_country="FR",
+        dest_city="Milano", dest_country="IT", cost=Decimal("12.50"),
+    )
+    for job in jobs:
+        QuoteService.bulk_create_quotes(db, [quote_in, quote_in], import_job_id=job.id)
+
+    def staged(job):
+        return db.query(PartnerQuote).filter(PartnerQuote.import_job_id == job.id).count()
+
+    # Import en échec : seuls ses tarifs préparés disparaissent
+    assert QuoteService.discard_staged_quotes(db, jobs[0].id) == 2
+    assert [staged(job) for job in jobs] == [0, 2, 2]
+
+    # Bascule : l'import concurrent garde ses tarifs préparés
+    assert QuoteService.activate_import(db, partner.id, jobs[1].id) == 2
+    assert staged(jobs[2]) == 2 and QuoteService.count_quotes(db, partner.id) == 2
+
+    jobs[2].status = ImportStatus.FAILED
+    db.commit()
+    assert QuoteService.discard_abandoned_staged_quotes(db, partner.id) == 2
+
+
+def test_manual_deletion_republishes_snapshot_and_invalidates_index(db, monkeypatch):
+    published = []
+    monkeypatch.setattr(quote_service.settings, "tariff_snapshot_enabled", True)
+    monkeypatch.setattr(quote_service.TariffSnapshot, "publish", lambda db, partner_id: published.append(partner_id) or 0)
+    partner = Partner(code="MANUAL", name="MANUAL")
+    db.add(partner)
+    db.commit()
+    quote = QuoteService.create_quote(db, PartnerQuoteCreate(
+        partner_id=partner.id, transport_mode="ROAD", origin_city="Nice", origin_country="FR",
+        dest_city="Milano", dest_country="IT", weight_min=0, weight_max=100, cost=Decimal("12.50"),
+    ))
+    monkeypatch.setattr(tariff_index, "_built_at", 0.0)
+
+    assert QuoteService.delete_quote(db, quote.id)
+
+    # Les autres workers relisent le snapshot, ce worker reconstruit son index
+    assert published == [partner.id]
+    assert tariff_index.is_stale
@@ -0,0 +1,122 @@
+import os
+from datetime import date
+from decimal import Decimal
+from types import SimpleNamespace
+
+import numpy as np
+from sqlalchemy.dialects import postgresql
+
+from app.models.partner_quote import PartnerQuote
+from app.schemas.matching import QuoteSearchRequest
+from app.services import matching_service
+from app.services.matching_service import MatchingService
+from app.services.pricing_service import PricingService
+from app.services.surcharge_rules import SurchargeEngine, round_half_up
+
+CONFIG = """
+partners:
+  MONACO_LOG:
+    - type: handling_melzo
+      per_100kg: 1.00
+      when: {origin_city: "Melzo"}
+    - type: handling_local
+      per_100kg: 1.50
+      when: {origin_city: "MELZO", dest_country: "hr"}
+    - type: fuel
+      percent: 8
+      valid_from: 2022-12-01
+  UNKNOWN:
+    - type: fuel
+      percent: 50
+"""
+
+
+def make_engine(tmp_path) -> SurchargeEngine:
+    path = tmp_path / "surcharges.yaml"
+    path.write_text(CONFIG)
+    engine = SurchargeEngine(str(path))
+    engine.compile({"MONACO_LOG": "p1"})
+    return engine
+
+
+def lane(**overrides) -> QuoteSearchRequest:
+    params = dict(origin_country="IT", origin_city="Melzo", dest_country="HR", dest_city="Zagreb",
+                  weight=250, shipping_date=date(2026, 1, 15))
+    params.update(overrides)
+    return QuoteSearchRequest(**params)
+
+
+def test_apply_matches_pricing_service(tmp_path):
+    engine = make_engine(tmp_path)
+    amounts = engine.apply(
+        lane(), 250,
+        np.array(["p1", "p1", "p2"], dtype=object),
+        np.array(["MELZO", "MILANO", "MELZO"], dtype=object),
+        np.array(["ALL", "ALL", "ALL"], dtype=object),
+        np.array([125.60, 125.60, 125.60]),
+    )
+
+    assert amounts.handling_melzo.tolist() == [3.0, 0.0, 0.0]
+    assert amounts.handling_local.tolist() == [4.5, 0.0, 0.0]
+    assert amounts.fuel_pct.tolist() == [8.0, 8.0, 0.0]
+    expected = PricingService.calculate_transport_price(
+        "LUMPSUM", 125.60, 250, fuel_surcharge_percent=8, handling_fee_per_100kg=2.5
+    )
+    assert amounts.total.tolist() == [expected, round(125.60 * 1.08, 2), 125.60]
+
+
+def test_half_cents_round_up_like_postgresql_and_pricing_service():
+    # np.round donnerait [0.12, 1.0, 2.67, 0.12]
+    assert round_half_up([0.125, 1.005, 2.675, -0.125]).tolist() == [0.13, 1.01, 2.68, -0.13]
+
+    # Prix de base : 12.5 € au kg sur 0.01 kg = 0.125 €
+    _, base = MatchingService._price_vector(np.array([12.5]), np.array(["PER_KG"], dtype=object), 0.01)
+    assert base.tolist() == [PricingService.calculate_transport_price("LUMPSUM", 0.125, 0.01)] == [0.13]
+
+
+def test_lane_conditions_and_dates(tmp_path):
+    engine = make_engine(tmp_path)
+    assert [r.kind for r in engine.lane_rules(lane(dest_country="RS"))] == ["handling_melzo", "fuel"]
+    assert [r.kind for r in engine.lane_rules(lane(shipping_date=date(2022, 11, 30)))] == [
+        "handling_melzo", "handling_local",
+    ]
+    # Partenaire non résolu : aucune règle
+    assert all(r.partner_code == "MONACO_LOG" for r in engine.lane_rules(lane()))
+
+
+def test_sql_total_without_rules_is_base_cost(tmp_path):
+    engine = SurchargeEngine(str(tmp_path / "missing.yaml"))
+    assert engine.sql_total(lane(), 3, PartnerQuote.cost) is PartnerQuote.cost
+
+    params = make_engine(tmp_path).sql_total(lane(), 3, PartnerQuote.cost).compile(dialect=postgresql.dialect()).params
+    assert {"p1", Decimal("1.0"), Decimal("1.5"), Decimal("8.0")} <= set(params.values())
+
+
+def test_handling_uses_real_weight_when_volume_raises_taxable_weight(tmp_path, monkeypatch):
+    monkeypatch.setattr(matching_service, "surcharge_engine", make_engine(tmp_path))
+    quote = SimpleNamespace(
+        partner_id="p1", transport_mode="ROAD", origin_city_key="MELZO", dest_city_key="ZAGREB",
+        cost=Decimal("10"), pricing_type="PER_100KG",
+    )
+
+    # 250 kg réels, 3 m3 : 750 kg taxables sur route
+    weight, _, base_costs, amounts = MatchingService._price_totals([quote], lane(volume=3.0))
+
+    assert weight.tolist() == [750.0] and base_costs.tolist() == [80.0]
+    assert amounts.handling_melzo.tolist() == [3.0]
+    assert amounts.handling_local.tolist() == [4.5]
+
+
+def test_rules_reload_when_file_changes(tmp_path):
+    engine = make_engine(tmp_path)
+    path = tmp_path / "surcharges.yaml"
+    version = engine.version
+
+    path.write_text(CONFIG.replace("per_100kg: 1.00", "per_100kg: 2.00"))
+    os.utime(path, (path.stat().st_atime, path.stat().st_mtime + 10))
+    engine.reload_if_changed()
+
+    assert engine.version != version
+    melzo = next(r for r in engine.lane_rules(lane()) if r.kind == "handling_melzo")
+    # Identifiants partenaires déjà résolus conservés
+    assert (melzo.amount, melzo.partner_id) == (2.0, "p1")
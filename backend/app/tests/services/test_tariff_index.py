@@ -0,0 +1,148 @@
+import random
+from datetime import date, datetime
+from types import SimpleNamespace
+
+from app.models.partner_quote import TransportMode
+from app.schemas.matching import QuoteSearchRequest
+from app.services.import_logic.data_normalizer import DataNormalizer
+from app.services.tariff_index import PostalPrefixTrie, TariffIndex, WeightIntervalTree
+
+
+def make_row(id, weight_min=0, weight_max=100, origin_cp="06", origin_city="NICE",
+             dest_cp=None, dest_city="MILANO", valid_from=None, valid_until=None,
+             cost=10, pricing_type="LUMPSUM", volume_min=None, volume_max=None, transport_mode=TransportMode.ROAD):
+    return SimpleNamespace(
+        id=id,
+        partner_id="p1",
+        transport_mode=transport_mode,
+        origin_country_code="FR",
+        dest_country_code="IT",
+        origin_postal_key=DataNormalizer.postal_key(origin_cp),
+        origin_city_key=DataNormalizer.city_key(origin_city),
+        dest_postal_key=DataNormalizer.postal_key(dest_cp),
+        dest_city_key=DataNormalizer.city_key(dest_city),
+        weight_min=weight_min,
+        weight_max=weight_max,
+        volume_min=volume_min,
+        volume_max=volume_max,
+        valid_from=valid_from,
+        valid_until=valid_until,
+        cost=cost,
+        pricing_type=pricing_type,
+    )
+
+
+def build_index(rows) -> TariffIndex:
+    index = TariffIndex()
+    index._lanes, _ = TariffIndex._build_lanes(rows)
+    return index
+
+
+def search(**overrides) -> QuoteSearchRequest:
+    params = dict(
+        origin_country="fr", origin_postal_code="06200",
+        dest_country="IT", dest_city="Milano",
+        weight=50, shipping_date=date(2026, 1, 15),
+    )
+    params.update(overrides)
+    return QuoteSearchRequest(**params)
+
+
+def test_lookup_filters_by_weight_bracket():
+    index = build_index([
+        make_row("a", 0, 100),
+        make_row("b", 101, 500),
+        make_row("c", 501, 1000),
+    ])
+    assert [e.id for e in index.lookup(search(weight=250))] == ["b"]
+    assert [e.id for e in index.lookup(search(weight=1500))] == []
+
+
+def test_lookup_postal_prefix_and_city():
+    index = build_index([
+        make_row("nice", origin_cp="06"),
+        make_row("marseille", origin_cp="13"),
+        make_row("all_dest", dest_city="ALL"),
+        make_row("torino", dest_city="TORINO"),
+    ])
+    ids = {e.id for e in index.lookup(search())}
+    assert ids == {"nice", "all_dest"}
+
+
+def test_lookup_excludes_expired_and_null_weights():
+    index = build_index([
+        make_row("expired", valid_until=datetime(2025, 12, 31)),
+        make_row("future", valid_from=datetime(2026, 2, 1)),
+        make_row("current", valid_from=datetime(2026, 1, 15, 18, 0)),
+        make_row("no_weight", weight_min=None),
+    ])
+    assert [e.id for e in index.lookup(search())] == ["current"]
+
+
+def test_lookup_unknown_lane_or_mode():
+    index = build_index([make_row("a")])
+    assert index.lookup(search(dest_country="ES")) == []
+    assert index.lookup(search(transport_mode=TransportMode.SEA)) == []
+    assert [e.id for e in index.lookup(search(transport_mode=TransportMode.ROAD))] == ["a"]
+
+
+def test_postal_trie_bidirectional_prefix():
+    trie = PostalPrefixTrie()
+    for pos, code in enumerate(["06", "062", "06200", "13", "0"]):
+        trie.insert(code, pos)
+
+    assert sorted(trie.match("06200")) == [0, 1, 2, 4]
+    assert sorted(trie.match("06")) == [0, 1, 2, 4]
+    assert sorted(trie.match("13100")) == [3]
+    assert trie.match("75") == []
+
+
+def test_lookup_with_cp_ignores_city_of_other_postal_codes():
+    index = build_index([
+        make_row("nice", origin_cp="06", origin_city="NICE"),
+        make_row("cannes", origin_cp="07", origin_city="NICE"),
+    ])
+    assert [e.id for e in index.lookup(search())] == ["nice"]
+    assert {e.id for e in index.lookup(search(origin_postal_code=None, origin_city="nice"))} == {"nice", "cannes"}
+
+
+def test_weight_tree_matches_linear_scan():
+    rng = random.Random(42)
+    intervals = []
+    for pos in range(300):
+        low = rng.choice([0, 100, 101, 250, 500, 1000]) + rng.randint(0, 50)
+        intervals.append((low, low + rng.randint(0, 400), pos))
+    tree = WeightIntervalTree(intervals)
+
+    for weight in [0, 50, 100, 100.5, 101, 333, 500, 1450, 2000] + [rng.uniform(0, 1500) for _ in range(50)]:
+        expected = sorted(pos for low, high, pos in intervals if low <= weight <= high)
+        assert sorted(tree.stab(weight)) == expected
+
+
+def test_weight_tree_ignores_inverted_brackets():
+    tree = WeightIntervalTree([(0, 100, 0), (500, 100, 1), (100, 300, 2)])
+    assert sorted(tree.stab(100)) == [0, 2]
+    assert tree.stab(400) == []
+
+
+def test_weight_bracket_anomalies():
+    assert WeightIntervalTree.anomalies([(0, 99, 1), (100, 300, 2), (301, 500, 3), (500, 800, 4)]) == []
+
+    anomalies = WeightIntervalTree.anomalies([(0, 100, "a"), (50, 200, "b"), (500, 1000, "c")])
+    assert [(a["type"], a["refs"]) for a in anomalies] == [("overlap", ["a", "b"]), ("gap", ["b", "c"])]
+
+
+def test_lookup_uses_taxable_weight_per_mode_and_volume_brackets():
+    index = build_index([
+        make_row("road_light", 0, 100),
+        make_row("road_heavy", 101, 1000),
+        make_row("air_heavy", 101, 1000, transport_mode=TransportMode.AIR),
+        make_row("small_volume", 0, 1000, volume_max=1),
+        make_row("big_volume", 0, 1000, volume_min=1.01, volume_max=5),
+    ])
+    # 50 kg / 0,7 m³ : 175 kg taxables en route, 116,9 kg en aérien
+    ids = {e.id for e in index.lookup(search(weight=50, volume=0.7))}
+    assert ids == {"road_heavy", "air_heavy", "small_volume"}
+    assert {e.id for e in index.lookup(search(weight=50, volume=0.5, transport_mode=TransportMode.AIR))} == set()
+    assert {e.id for e in index.lookup(search(weight=50, volume=2))} == {"road_heavy", "air_heavy", "big_volume"}
+    assert {e.id for e in index.lookup(search(weight=50))} == {"road_light", "small_volume", "big_volume"}
@@ -0,0 +1,70 @@
+import os
+from datetime import datetime
+from types import SimpleNamespace
+
+import numpy as np
+
+from app.models.partner_quote import TransportMode
+from app.services import tariff_index, tariff_snapshot
+from app.services.tariff_index import TariffIndex
+from app.services.tariff_snapshot import COLUMNS, TariffSnapshot
+
+
+def write_snapshot(root, partner_id, version, rows):
+    version_dir = os.path.join(root, partner_id, version)
+    os.makedirs(version_dir)
+    for name, values in zip(COLUMNS, zip(*rows)):
+        np.save(os.path.join(version_dir, f"{name}.npy"), TariffSnapshot._to_array(name, values))
+    with open(os.path.join(root, partner_id, "CURRENT"), "w") as f:
+        f.write(version)
+
+
+def test_snapshot_roundtrip_keeps_nulls_and_types(tmp_path, monkeypatch):
+    monkeypatch.setattr(tariff_snapshot.settings, "tariff_snapshot_dir", str(tmp_path))
+    row = (
+        "q1", TransportMode.ROAD, "FR", "IT", "06", "NICE", None, "MILANO", "PER_100KG",
+        0.0, 100.0, 17.5, None, 2.5, datetime(2026, 1, 15, 18, 0), None,
+    )
+    write_snapshot(str(tmp_path), "partner-1", "v1", [row])
+
+    assert TariffSnapshot.versions() == {"partner-1": "v1"}
+    (loaded,) = TariffSnapshot.iter_rows(TariffSnapshot.versions())
+    assert loaded.transport_mode == "ROAD"
+    assert loaded.dest_postal_key is None
+    assert loaded.cost == 17.5
+    assert (loaded.volume_min, loaded.volume_max) == (None, 2.5)
+    assert loaded.partner_id == "partner-1"
+    assert loaded.valid_from == datetime(2026, 1, 15, 18, 0)
+    assert loaded.valid_until is None
+
+
+def test_versions_ignores_partners_without_current(tmp_path, monkeypatch):
+    monkeypatch.setattr(tariff_snapshot.settings, "tariff_snapshot_dir", str(tmp_path))
+    os.makedirs(tmp_path / "partner-2" / "v1")
+    assert TariffSnapshot.versions() == {}
+
+
+def test_rebuild_reads_partners_without_snapshot_from_db(tmp_path, monkeypatch):
+    monkeypatch.setattr(tariff_snapshot.settings, "tariff_snapshot_dir", str(tmp_path))
+    monkeypatch.setattr(tariff_index.settings, "tariff_snapshot_enabled", True)
+    row = (
+        "q1", TransportMode.ROAD, "FR", "IT", "06", "NICE", None, "MILANO", "LUMPSUM",
+        0.0, 100.0, 17.5, None, None, None, None,
+    )
+    write_snapshot(str(tmp_path), "partner-1", "v1", [row])
+    db_row = SimpleNamespace(**dict(zip(COLUMNS, row)), partner_id="partner-2")
+    db_row.id = "q2"
+    queried = []
+    monkeypatch.setattr(TariffIndex, "_unpublished_partners", staticmethod(lambda db, versions: ["partner-2"]))
+    monkeypatch.setattr(
+        TariffIndex, "_query_rows", staticmethod(lambda db, partner_ids=None: queried.append(partner_ids) or [db_row])
+    )
+
+    index = TariffIndex()
+    assert index._rebuild(db=None) == 2
+    assert queried == [["partner-2"]]
+    assert {entry.partner_id for entry in index._lanes[("ROAD", "FR", "IT")].entries} == {"partner-1", "partner-2"}
+    # Index en partie issu de la base : reconstruit à chaque expiration
+    assert index._snapshot_versions is None
+    assert index._rebuild(db=None) == 2
+    assert queried == [["partner-2"], ["partner-2"]]
@@ -188,6 +188,20 @@ export const Imports: React.FC = () => {
                                         </div>
                                     </div>
                                 )}
+
+                                {lastJob.warnings && lastJob.warnings.length > 0 && (
+                                    <div className="mt-6">
+                                        <h4 className="font-medium text-sm text-amber-700 mb-3 flex items-center gap-2">
+                                            <AlertCircle className="w-4 h-4" />
+                                            Avertissements (tranches de poids)
+                                        </h4>
+                                        <div className="bg-gray-900 rounded-lg p-4 overflow-auto max-h-60 shadow-inner">
+                                            <pre className="text-xs text-amber-300 font-mono whitespace-pre-wrap">
+                                                {JSON.stringify(lastJob.warnings, null, 2)}
+                                            </pre>
+                                        </div>
+                                    </div>
+                                )}
                             </div>
                         ) : (
                             <div className="text-center py-12">
@@ -5,7 +5,7 @@ import { QuoteService } from '../services/quoteService';
 import { CityService } from '../services/cityService';
 import { CityAutocomplete } from '../components/ui/CityAutocomplete';
 import { COUNTRY_NAMES } from '../constants/countries';
-import type { SearchCriteria } from '../types';
+import type { LaneDestination, SearchCriteria } from '../types';
 
 export const Search: React.FC = () => {
     const navigate = useNavigate();
@@ -31,6 +31,34 @@ export const Search: React.FC = () => {
         shipping_date: new Date().toISOString().split('T')[0]
     });
 
+    // Destinations desservies depuis l'origine (null : inconnues, rien n'est grisé)
+    const [coverage, setCoverage] = useState<LaneDestination[] | null>(null);
+
+    useEffect(() => {
+        const timer = setTimeout(() => {
+            QuoteService.getCoverage({
+                origin_country: formData.origin_country,
+                origin_postal_code: formData.origin_postal_code || undefined,
+                transport_mode: formData.transport_mode || undefined
+            })
+                .then(response => setCoverage(response.destinations))
+                .catch(() => setCoverage(null));
+        }, 300);
+        return () => clearTimeout(timer);
+    }, [formData.origin_country, formData.origin_postal_code, formData.transport_mode]);
+
+    const isDestCountryCovered = (country: string) =>
+        coverage === null || coverage.some(d => d.country === country);
+
+    const isDestPostalCodeCovered = () => {
+        const cp = (formData.dest_postal_code || '').trim().toUpperCase();
+        if (!cp || coverage === null) return true;
+        const destination = coverage.find(d => d.country === formData.dest_country);
+        if (!destination) return false;
+        // Même prefix match que le matching : "06" couvre "06200", "2231" couvre "22"
+        return destination.any_postal_code || destination.postal_codes.some(code => cp.startsWith(code) || code.startsWith(cp));
+    };
+
     const handleChange = (e: React.ChangeEvent<HTMLInputElement | HTMLSelectElement>) => {
         const { name, value } = e.target;
         setFormData((prev: SearchCriteria) => ({
@@ -165,7 +193,9 @@ export const Search: React.FC = () => {
                                         className="w-full rounded-lg border-gray-300 shadow-sm focus:border-blue-500 focus:ring-blue-500"
                                     >
                                         {countries.dest_countries.map(code => (
-                                            <option key={code} value={code}>{COUNTRY_NAMES[code] || code}</option>
+                                            <option key={code} value={code} disabled={!isDestCountryCovered(code)}>
+                                                {COUNTRY_NAMES[code] || code}{isDestCountryCovered(code) ? '' : ' (non desservi)'}
+                                            </option>
                                         ))}
                                     </select>
                                 </div>
@@ -180,6 +210,9 @@ export const Search: React.FC = () => {
                                         className="w-full rounded-lg border-gray-300 shadow-sm focus:border-blue-500 focus:ring-blue-500"
                                         placeholder="69000"
                                     />
+                                    {!isDestPostalCodeCovered() && (
+                                        <p className="mt-1 text-xs text-amber-600">Aucun tarif pour cette destination</p>
+                                    )}
                                 </div>
                                 <div className="col-span-2">
                                     <label className="block text-sm font-medium text-gray-700 mb-1">Ville</label>
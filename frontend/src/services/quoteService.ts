@@ -1,5 +1,5 @@
 import api from './api';
-import type { Quote } from '../types';
+import type { LaneCoverage, Quote } from '../types';
 
 export const QuoteService = {
     getAll: async (params?: { partner_id?: string; transport_mode?: string }) => {
@@ -24,5 +24,11 @@ export const QuoteService = {
     search: async (criteria: any) => {
         const response = await api.post<Quote[]>('/match/', criteria);
         return response.data;
+    },
+
+    // Destinations desservies depuis une origine (pays et codes postaux)
+    getCoverage: async (params: { origin_country: string; origin_postal_code?: string; transport_mode?: string }) => {
+        const response = await api.get<LaneCoverage>('/match/coverage', { params });
+        return response.data;
     }
 };
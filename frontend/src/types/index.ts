@@ -18,6 +18,7 @@ export interface ImportJob {
     success_count: number;
     error_count: number;
     errors: any[];
+    warnings?: any[] | null;
     created_at: string;
 }
 
@@ -32,6 +33,7 @@ export interface PriceBreakdown {
     unit_price: number;
     actual_weight: number;
     billable_weight: number;
+    taxable_weight?: number | null;
     base_cost: number;
     handling_melzo: number;
     handling_local: number;
@@ -91,3 +93,14 @@ export interface SearchCriteria {
     transport_mode?: 'ROAD' | 'RAIL' | 'AIR' | 'SEA';
     shipping_date?: string;
 }
+
+export interface LaneDestination {
+    country: string;
+    any_postal_code: boolean;
+    postal_codes: string[];
+}
+
+export interface LaneCoverage {
+    origin_country: string;
+    destinations: LaneDestination[];
+}